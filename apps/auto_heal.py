@@ -1,10 +1,17 @@
 import json
 import os
+import shlex
+import socket
 import subprocess
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional
 
 import modal
 
+from runbooks import backend
+from utils import metrics, spawnsrv
+from utils.healstate import HealState
+
 OPS_APP = os.getenv("OPS_APP", "ops-agent")
 
 # This file itself is a small Modal app containing two functions:
@@ -15,36 +22,85 @@ app = modal.App("ops-agent-autoheal")
 # Config (can be overridden per run/deploy via env)
 DISK_THRESHOLD = int(os.getenv("DISK_THRESHOLD", "85")
                      )     # % usage to trigger cleanup
+# also clean up when the fill-rate forecast says the disk is full within this many seconds
+DISK_TTF_HORIZON_S = int(os.getenv("DISK_TTF_HORIZON_S", "900"))
 WATCH_SERVICES: List[str] = [s.strip() for s in os.getenv(
     "WATCH_SERVICES", "nginx").split(",") if s.strip()]
 DRY_RUN = os.getenv("DRY_RUN", "false").lower() in ("1", "true", "yes")
+# where heals run: "modal" (the deployed OPS_APP) or "local" (this host, see apps/local_watch.py)
+HEAL_BACKEND = os.getenv("HEAL_BACKEND", "modal")
+# one watcher at a time runs heals; the lease outlives a crashed holder by at most this long
+LEASE_TTL_S = float(os.getenv("HEAL_LEASE_TTL_S", "120"))
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+# Modal containers are ephemeral: keep the heal history / rate limits / lease on a Volume so the
+# cron's 5-minute passes see each other's attempts instead of starting from a fresh SQLite file.
+HEAL_STATE_DIR = "/heal-state"
+heal_volume = modal.Volume.from_name("ops-agent-heal-state", create_if_missing=True)
 
 image = (
     modal.Image.debian_slim()
     .apt_install("procps")
+    .env({"LINOPS_HEAL_DB": f"{HEAL_STATE_DIR}/healstate.sqlite"})
+    .add_local_python_source("utils", "runbooks")
 )
 
 # helpers
 
 
 def _shell(cmd: str) -> subprocess.CompletedProcess[str]:
-    """Run a shell command, capture output; never raise on non-zero exit."""
-    return subprocess.run(["bash", "-lc", cmd], text=True, capture_output=True, check=False)
+    """Run a shell command under the default budget, capture output; never raise on non-zero rc."""
+    metrics.SPAWNS.labels(runner="auto_heal").inc()
+    return spawnsrv.run(["bash", "-lc", cmd])
 
 
 def _call_ops(fn_name: str, **kwargs):
     """
-    Call a function that lives in another deployed Modal app (OPS_APP).
-    We use Function.from_name(...).remote(...) which works in Modal 1.x.
+    Run an ops runbook (runbooks/ops.py) on HEAL_BACKEND: in the deployed Modal app OPS_APP, or
+    in-process on this host with HEAL_BACKEND=local.
     """
-    fn = modal.Function.from_name(OPS_APP, fn_name)
-    return fn.remote(**kwargs)
+    return backend.call(fn_name, backend=HEAL_BACKEND, app=OPS_APP, **kwargs)
+
+
+_STATE: Optional[HealState] = None
+
+
+def _state() -> HealState:
+    """Shared heal history / rate limits / leases (SQLite at LINOPS_HEAL_DB), opened lazily."""
+    global _STATE
+    if _STATE is None:
+        _STATE = HealState()
+    return _STATE
+
+
+def _suppressed(kind: str, target: str) -> Optional[str]:
+    """None if a heal of target may run now (and takes its token), else why it is suppressed."""
+    allowed, reason = _state().allow(f"{kind}:{target}")
+    if not allowed:
+        metrics.HEALS_SUPPRESSED.labels(kind=kind, target=target).inc()
+    return reason
 
 
-def _disk_used_percent() -> int:
-    """Return root (/) disk usage percent as int (real reading inside this container)."""
+def _heal(kind: str, target: str, fn_name: str, **kwargs):
+    """_call_ops + heal counters/latency/history; a raised error counts as attempted, not ok."""
+    metrics.HEALS_ATTEMPTED.labels(kind=kind, target=target).inc()
+    t0 = time.perf_counter()
+    ok = False
+    try:
+        res = _call_ops(fn_name, **kwargs)
+        ok = not (isinstance(res, dict) and res.get("ok") is False)
+    finally:
+        metrics.HEAL_LATENCY.labels(kind=kind).observe(time.perf_counter() - t0)
+        _state().record(f"{kind}:{target}", ok, detail=fn_name)
+    if ok:
+        metrics.HEALS_SUCCEEDED.labels(kind=kind, target=target).inc()
+    return res
+
+
+def _disk_used_percent(mount: str = "/") -> int:
+    """Disk usage percent of `mount` (default /) as int (a real reading inside this container)."""
     out = _shell(
-        r"df -P / | tail -1 | awk '{print $5}' | tr -d '%'").stdout.strip()
+        r"df -P %s | tail -1 | awk '{print $5}' | tr -d '%%'" % shlex.quote(mount)).stdout.strip()
     return int(out or "0")
 
 
@@ -53,60 +109,109 @@ def _service_running_exact(name: str) -> bool:
     return _shell(f"pgrep -x {name} >/dev/null 2>&1 && echo RUNNING || true").stdout.strip() == "RUNNING"
 
 
-def _check_disk_and_maybe_heal() -> Dict[str, Any]:
-    pct = _disk_used_percent()
+def _check_disk_and_maybe_heal(mount: str = "/",
+                               forecast: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Threshold check for `mount`; with a fill-rate `forecast` (from apps/local_watch.py) it also
+    heals when time_to_full_s is within DISK_TTF_HORIZON_S, before the threshold is crossed.
+    """
+    if forecast:
+        mount = forecast.get("mount", mount)
+    pct = _disk_used_percent(mount)
+    ttf = (forecast or {}).get("time_to_full_s")
+    predicted = ttf is not None and ttf <= DISK_TTF_HORIZON_S
     action = None
     healed = False
+    suppressed = None
 
-    if pct >= DISK_THRESHOLD:
+    if pct >= DISK_THRESHOLD or predicted:
         action = f"free_disk(aggressive=True, dry_run={DRY_RUN})"
+        if pct < DISK_THRESHOLD:
+            action += f" [predicted full in {ttf:.0f}s]"
         if not DRY_RUN:
-            _call_ops("free_disk", aggressive=True, dry_run=False)
-            healed = True
+            suppressed = _suppressed("disk", mount)
+            if suppressed is None:
+                _heal("disk", mount, "free_disk", aggressive=True, dry_run=False)
+                healed = True
 
-    return {
+    out = {
         "metric": "disk_used_percent",
+        "mount": mount,
         "value": pct,
         "threshold": DISK_THRESHOLD,
         "action": action,
         "healed": healed,
     }
+    if suppressed:
+        out["suppressed"] = suppressed
+    if forecast is not None:
+        out["forecast"] = {**forecast, "horizon_s": DISK_TTF_HORIZON_S, "predicted_full": predicted}
+    return out
 
 
-def _check_services_and_maybe_heal() -> List[Dict[str, Any]]:
+def _check_services_and_maybe_heal(services: Optional[List[str]] = None) -> List[Dict[str, Any]]:
     results: List[Dict[str, Any]] = []
-    for svc in WATCH_SERVICES:
+    for svc in services if services is not None else WATCH_SERVICES:
         running = _service_running_exact(svc)
         action = None
         healed = False
+        suppressed = None
 
         if not running:
             action = f"restart_service(name={svc})"
             if not DRY_RUN:
-                res = _call_ops("restart_service", name=svc)
+                suppressed = _suppressed("service", svc)
+            if not DRY_RUN and suppressed is None:
+                res = _heal("service", svc, "restart_service", name=svc)
                 healed = True
                 # if the runbook returned a short string/json, attach a tiny preview
                 if isinstance(res, str) and res:
                     action += f" -> {res[:120]}"
 
-        results.append({
+        result = {
             "service": svc,
             "running": running,
             "action": action,
             "healed": healed
-        })
+        }
+        if suppressed:
+            result["suppressed"] = suppressed
+            last = _state().attempts(f"service:{svc}", limit=1)
+            result["last_attempt"] = last[0] if last else None
+        results.append(result)
     return results
 
 
 def _watch_impl() -> Dict[str, Any]:
-    disk = _check_disk_and_maybe_heal()
-    services = _check_services_and_maybe_heal()
+    metrics.start_from_env()
+    held, holder = _state().acquire_lease("auto_heal", OWNER, LEASE_TTL_S)
+    if not held:
+        return {"skipped": True, "suppressed": f"lease held by {holder}", "dry_run": DRY_RUN}
+    try:
+        disk = _check_disk_and_maybe_heal()
+        services = _check_services_and_maybe_heal()
+    finally:
+        _state().release_lease("auto_heal", OWNER)
     return {"disk": disk, "services": services, "dry_run": DRY_RUN}
 
+
+def _watch_on_volume() -> Dict[str, Any]:
+    """_watch_impl against the heal_volume copy of HealState: pick up the last pass's writes,
+    and close the database before committing so the next container sees this one's."""
+    global _STATE
+    heal_volume.reload()
+    try:
+        return _watch_impl()
+    finally:
+        if _STATE is not None:
+            _STATE.close()
+            _STATE = None
+        heal_volume.commit()
+
 # Modal functions
 
 
-@app.function(image=image, timeout=120)
+@app.function(image=image, timeout=120, volumes={HEAL_STATE_DIR: heal_volume})
 def watch_once() -> Dict[str, Any]:
     """
     One pass of auto-heal:
@@ -114,16 +219,17 @@ def watch_once() -> Dict[str, Any]:
       - for each WATCH_SERVICES entry, if not running, trigger restart_service (unless DRY_RUN)
     Returns a JSON summary and prints it so you see it in the Modal run logs.
     """
-    summary = _watch_impl()
+    summary = _watch_on_volume()
     print(json.dumps(summary, indent=2))
     return summary
 
 # Every 5 minutes via cron on Modal
 
 
-@app.function(image=image, timeout=120, schedule=modal.Cron("*/5 * * * *"))
+@app.function(image=image, timeout=120, schedule=modal.Cron("*/5 * * * *"),
+              volumes={HEAL_STATE_DIR: heal_volume})
 def watch_scheduled() -> Dict[str, Any]:
-    summary = _watch_impl()
+    summary = _watch_on_volume()
     print(json.dumps(summary, indent=2))
     return summary
 
@@ -0,0 +1,267 @@
+# Local long-running auto-heal watcher: the event-driven alternative to watch_scheduled's cron.
+#
+#   python -m apps.local_watch --services nginx --interval 2
+#
+# Service death is learned from pidfds (os.pidfd_open, Linux >= 5.3): every watched process gets
+# an fd that becomes readable the moment it exits, so a crash wakes the loop immediately instead
+# of waiting up to five minutes for the next cron pass. Where pidfds are unavailable, or a service
+# has no process to watch yet, a /proc scan each tick is the fallback (no subprocess per check).
+# Disk usage of each mount is sampled with statvfs into a fixed-size ring; a least-squares fit over
+# that window gives the fill rate and a predicted time-to-full, so free_disk can run before the
+# static threshold is crossed (DISK_TTF_HORIZON_S).
+# Detection is new; the checks and heals are auto_heal's _check_* functions, unchanged.
+
+import argparse
+import collections
+import os
+import selectors
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+from apps import auto_heal
+from utils import metrics, probe, serialize
+
+DEFAULT_INTERVAL_S = 2.0       # fallback poll / disk sample period
+DEFAULT_HEAL_INTERVAL_S = 30.0  # min gap between poll- or disk-triggered heals of one target
+RING_SIZE = 60                 # disk samples kept per mount (2 minutes at the default interval)
+MIN_FORECAST_SAMPLES = 5       # don't extrapolate from a couple of noisy points
+
+
+class DiskRing:
+    """Fixed-size ring of (t, used_bytes) samples for one mount (bounded memory per mount)."""
+
+    __slots__ = ("mount", "samples", "capacity")
+
+    def __init__(self, mount: str = "/", size: int = RING_SIZE):
+        self.mount = mount
+        self.samples: Deque[Tuple[float, int]] = collections.deque(maxlen=size)
+        self.capacity = 0
+
+    def add(self, t: float, used: int, capacity: int) -> None:
+        self.samples.append((t, used))
+        self.capacity = capacity
+
+    def sample(self, now: Optional[float] = None) -> None:
+        st = os.statvfs(self.mount)
+        used = (st.f_blocks - st.f_bfree) * st.f_frsize
+        # df's Capacity column: used / (used + available to non-root), root reserve excluded
+        self.add(time.monotonic() if now is None else now, used, used + st.f_bavail * st.f_frsize)
+
+    def used_percent(self) -> float:
+        if not self.samples or not self.capacity:
+            return 0.0
+        return 100.0 * self.samples[-1][1] / self.capacity
+
+    def fill_rate(self) -> float:
+        """Least-squares slope of used bytes over the window, bytes/s (negative while freeing)."""
+        n = len(self.samples)
+        if n < 2:
+            return 0.0
+        mt = sum(t for t, _ in self.samples) / n
+        mu = sum(u for _, u in self.samples) / n
+        den = sum((t - mt) ** 2 for t, _ in self.samples)
+        if not den:
+            return 0.0
+        return sum((t - mt) * (u - mu) for t, u in self.samples) / den
+
+    def time_to_full_s(self) -> Optional[float]:
+        """Seconds until the mount fills at the fitted rate; None if not filling/under-sampled."""
+        if len(self.samples) < MIN_FORECAST_SAMPLES or not self.capacity:
+            return None
+        rate = self.fill_rate()
+        if rate <= 0:
+            return None
+        return max(0.0, (self.capacity - self.samples[-1][1]) / rate)
+
+    def summary(self) -> Dict[str, Any]:
+        ttf = self.time_to_full_s()
+        return {
+            "mount": self.mount,
+            "used_percent": round(self.used_percent(), 2),
+            "fill_rate_bytes_per_s": round(self.fill_rate(), 1),
+            "time_to_full_s": None if ttf is None else round(ttf, 1),
+            "samples": len(self.samples),
+        }
+
+
+def _print_event(event: Dict[str, Any]) -> None:
+    print(serialize.dumps(event), flush=True)
+
+
+class LocalWatcher:
+    def __init__(self, services: Optional[List[str]] = None, mounts: Sequence[str] = ("/",),
+                 interval_s: float = DEFAULT_INTERVAL_S,
+                 heal_interval_s: float = DEFAULT_HEAL_INTERVAL_S):
+        self.services = list(services if services is not None else auto_heal.WATCH_SERVICES)
+        self.interval_s = interval_s
+        self.heal_interval_s = heal_interval_s
+        self.disks = {m: DiskRing(m) for m in mounts}
+        self.pidfd = hasattr(os, "pidfd_open")
+        self._sel = selectors.DefaultSelector()
+        self._armed: Dict[str, Dict[int, int]] = {s: {} for s in self.services}  # svc -> {pid: fd}
+        self._last_heal: Dict[str, float] = {}
+        self.lease_ttl_s = max(auto_heal.LEASE_TTL_S, 3 * interval_s)
+
+    # --- process events -------------------------------------------------------
+    def arm(self, svc: str) -> int:
+        """Open a pidfd for every live process of svc not already watched; returns how many."""
+        if not self.pidfd:
+            return 0
+        fds = self._armed[svc]
+        for pid in probe.find_pids(svc):
+            if pid in fds:
+                continue
+            try:
+                fd = os.pidfd_open(pid)
+            except ProcessLookupError:
+                continue
+            except OSError:
+                self.pidfd = False  # e.g. ENOSYS under an old kernel/seccomp: poll from now on
+                return 0
+            self._sel.register(fd, selectors.EVENT_READ, (svc, pid))
+            fds[pid] = fd
+        return len(fds)
+
+    def _disarm(self, fd: int, svc: str, pid: int) -> None:
+        self._sel.unregister(fd)
+        os.close(fd)
+        self._armed[svc].pop(pid, None)
+
+    def _lease(self) -> Optional[str]:
+        """Take/renew the watcher lease; None when held, else who holds it (we stay on standby)."""
+        held, holder = auto_heal._state().acquire_lease("auto_heal", auto_heal.OWNER,
+                                                        self.lease_ttl_s)
+        return None if held else f"lease held by {holder}"
+
+    def _due(self, target: str, now: float) -> bool:
+        return now - self._last_heal.get(target, float("-inf")) >= self.heal_interval_s
+
+    # --- one loop iteration -------------------------------------------------------
+    def step(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Wait for a process exit (or the tick), then heal what needs it; None if all is well."""
+        wait = self.interval_s if timeout is None else timeout
+        if self._sel.get_map():
+            events = self._sel.select(wait)
+        else:
+            time.sleep(wait)  # nothing armed (poll mode, or every service is down)
+            events = []
+        now = time.monotonic()
+        standby = self._lease()
+
+        died: Set[str] = set()
+        for key, _ in events:
+            svc, pid = key.data
+            self._disarm(key.fd, svc, pid)
+            died.add(svc)
+
+        polled: List[str] = []
+        for svc in self.services:
+            if svc in died or self._armed[svc]:
+                continue
+            if self.arm(svc) or probe.find_pids(svc):
+                continue
+            if self._due(svc, now):
+                polled.append(svc)
+
+        disk_due: List[Dict[str, Any]] = []
+        for mount, ring in self.disks.items():
+            try:
+                ring.sample(now)
+            except OSError:
+                continue  # unmounted since start
+            fc = ring.summary()
+            ttf = fc["time_to_full_s"]
+            predicted = ttf is not None and ttf <= auto_heal.DISK_TTF_HORIZON_S
+            over = fc["used_percent"] >= auto_heal.DISK_THRESHOLD
+            if (over or predicted) and self._due(f"disk:{mount}", now):
+                disk_due.append(fc)
+        if not (died or polled or disk_due):
+            return None
+
+        trigger = "pidfd" if died else "poll" if polled else "disk"
+        event: Dict[str, Any] = {"ts": time.time(), "trigger": trigger}
+        if standby:
+            # another watcher owns healing; keep watching so we can take over when its lease lapses
+            for svc in died:
+                self.arm(svc)
+            event.update(suppressed=standby, services_down=sorted(died) + polled,
+                         disk_trend=[ring.summary() for ring in self.disks.values()])
+            return event
+        if died or polled:
+            targets = sorted(died) + polled
+            for svc in targets:
+                self._last_heal[svc] = now
+            event["services"] = auto_heal._check_services_and_maybe_heal(targets)
+            for svc in targets:
+                self.arm(svc)  # restarted processes have new pids
+        if disk_due:
+            event["disk"] = []
+            for fc in disk_due:
+                self._last_heal[f"disk:{fc['mount']}"] = now
+                event["disk"].append(auto_heal._check_disk_and_maybe_heal(forecast=fc))
+        event["disk_trend"] = [ring.summary() for ring in self.disks.values()]
+        event["dry_run"] = auto_heal.DRY_RUN
+        return event
+
+    def run(self, max_seconds: Optional[float] = None,
+            emit: Callable[[Dict[str, Any]], None] = _print_event) -> None:
+        metrics.start_from_env()
+        now = time.monotonic()
+        standby = self._lease()
+        for svc in self.services:
+            if not self.arm(svc) and not probe.find_pids(svc):
+                self._last_heal[svc] = now  # the startup check below already covers it
+        if standby:
+            emit({"ts": time.time(), "trigger": "startup", "suppressed": standby,
+                  "mode": "pidfd" if self.pidfd else "poll"})
+        else:
+            emit({"ts": time.time(), "trigger": "startup",
+                  "disk": [auto_heal._check_disk_and_maybe_heal(mount=m) for m in self.disks],
+                  "services": auto_heal._check_services_and_maybe_heal(self.services),
+                  "dry_run": auto_heal.DRY_RUN, "mode": "pidfd" if self.pidfd else "poll"})
+        deadline = None if max_seconds is None else time.monotonic() + max_seconds
+        while deadline is None or time.monotonic() < deadline:
+            ev = self.step()
+            if ev is not None:
+                emit(ev)
+
+    def close(self) -> None:
+        if auto_heal._STATE is not None:
+            auto_heal._STATE.release_lease("auto_heal", auto_heal.OWNER)
+        for svc, fds in self._armed.items():
+            for pid, fd in list(fds.items()):
+                self._disarm(fd, svc, pid)
+        self._sel.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="event-driven local auto-heal watcher")
+    ap.add_argument("--services", help="comma-separated (default: WATCH_SERVICES)")
+    ap.add_argument("--mount", action="append", dest="mounts",
+                    help="mount to watch and forecast; repeatable (default: /)")
+    ap.add_argument("--interval", type=float, default=DEFAULT_INTERVAL_S,
+                    help="poll/sample period (s)")
+    ap.add_argument("--heal-interval", type=float, default=DEFAULT_HEAL_INTERVAL_S,
+                    help="min seconds between poll/disk-triggered heals of the same target")
+    ap.add_argument("--backend", choices=("local", "modal"), default="local",
+                    help="where heals run")
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--max-seconds", type=float, help="stop after this long (default: run forever)")
+    args = ap.parse_args()
+
+    auto_heal.HEAL_BACKEND = args.backend
+    if args.dry_run:
+        auto_heal.DRY_RUN = True
+    services = [s.strip() for s in args.services.split(",") if s.strip()] if args.services else None
+    w = LocalWatcher(services, mounts=args.mounts or ["/"], interval_s=args.interval,
+                     heal_interval_s=args.heal_interval)
+    try:
+        w.run(max_seconds=args.max_seconds)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        w.close()
+
+
+if __name__ == "__main__":
+    main()
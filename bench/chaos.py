@@ -0,0 +1,398 @@
+# Chaos / MTTR harness: kill fake services and fill a disk quota on a random schedule while a
+# watcher detects and heals, then report time-to-detect / time-to-heal and the agent's overhead.
+#   python -m bench.chaos                                    # 3 services, 30s, both watcher designs
+#   python -m bench.chaos --services 8 --kill-every-s 0.5 --fill-mb-s 4 --watcher pidfd --out r.json
+#
+# Services are fakesvc http.servers on free ports, started and healed by the heal_fakesvc_8080
+# runbook through auto_heal's heal path (rate limiter, heal history, metrics; a permissive
+# HealState in a temp dir so the limiter doesn't hide MTTR). A separate chaos process, so its
+# CPU isn't billed to the agent:
+#   - SIGKILLs a random live service at exponential intervals (mean --kill-every-s)
+#   - appends to a fill file under --fill-dir at --fill-mb-s against a --fill-quota-mb "disk"
+# Watcher designs (--watcher, comma-separated; each gets its own run):
+#   - pidfd: a pidfd per service wakes the loop the moment it dies (apps/local_watch.py's design)
+#   - poll:  a TCP probe of every port each --interval
+# Both sample the fill file each --interval into a DiskRing and run free_disk (the demo-safe
+# registry runbook, which removes only the fill file) at auto_heal.DISK_THRESHOLD percent of the
+# quota, or earlier when the fitted time-to-full is within --disk-horizon-s.
+#
+# Service incidents run from the kill to detection (ttd) and to the restarted port answering
+# (tth); a kill is credited only with heals started by its own detections, never with one that
+# was already running for an earlier kill. Heals run inline, as in the real watcher, so a slow
+# heal (a service killed again before the heal's verify sees its port) delays detection of
+# everything else; heal_failures counts them. Kills after the watcher's last sweep began are
+# reported as in_flight_at_end, not as undetected.
+# Disk episodes report how many crossed the threshold before being freed and, for those,
+# the time from crossing to detection and to the file being gone. The agent's audit records go
+# to --audit-dir (default: a temp dir removed with the run), never to audit/audit.jsonl.
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import resource
+import selectors
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from apps import auto_heal
+from apps.local_watch import DiskRing
+from runbooks import fakesvc  # noqa: F401  (registers heal_fakesvc_8080)
+from runbooks.system import free_disk
+from utils import audit
+from utils.healstate import HealState
+
+WATCHERS = ("pidfd", "poll")
+FILL_TICK_S = 0.1
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _port_open(port: int) -> bool:
+    with socket.socket() as s:
+        s.settimeout(0.25)
+        return s.connect_ex(("127.0.0.1", port)) == 0
+
+
+def _read_pid(pidfile: str) -> Optional[int]:
+    try:
+        with open(pidfile, encoding="utf-8") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+
+
+def _pct(sorted_vals: List[float], q: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    return sorted_vals[min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))]
+
+
+def _stats(vals: List[float]) -> Dict[str, Any]:
+    vals = sorted(vals)
+    r = lambda v: None if v is None else round(v, 4)  # noqa: E731
+    return {"n": len(vals), "mean_s": r(sum(vals) / len(vals)) if vals else None,
+            "p50_s": r(_pct(vals, 0.50)), "p99_s": r(_pct(vals, 0.99)),
+            "max_s": r(vals[-1] if vals else None)}
+
+
+# --- chaos process --------------------------------------------------------------------
+def _chaos(services: List[Tuple[int, str]], q: "mp.Queue", stop: Any, seed: int,
+           kill_every_s: float, fill_file: Optional[str], fill_mb_s: float,
+           threshold_bytes: int) -> None:
+    rnd = random.Random(seed)
+    next_kill = time.monotonic() + rnd.expovariate(1.0 / kill_every_s) if kill_every_s else None
+    chunk = b"\0" * int(fill_mb_s * 2**20 * FILL_TICK_S)
+    size = 0
+    while not stop.is_set():
+        now = time.monotonic()
+        if next_kill is not None and now >= next_kill:
+            live = [(port, pidfile) for port, pidfile in services if _port_open(port)]
+            if live:
+                port, pidfile = rnd.choice(live)
+                pid = _read_pid(pidfile)
+                if pid:
+                    try:
+                        t_kill = time.monotonic()  # before the signal: detection can't precede it
+                        os.kill(pid, signal.SIGKILL)
+                        q.put(("kill", port, t_kill))
+                    except ProcessLookupError:
+                        pass
+            next_kill = now + rnd.expovariate(1.0 / kill_every_s)
+        if fill_file and chunk:
+            try:
+                before = os.stat(fill_file).st_size
+            except FileNotFoundError:
+                before = 0
+            if before < size:
+                size = before  # freed by the agent: a new episode starts
+            with open(fill_file, "ab") as f:
+                f.write(chunk)
+            if size < threshold_bytes <= size + len(chunk):
+                q.put(("disk_cross", None, time.monotonic()))
+            size += len(chunk)
+        wait = FILL_TICK_S if fill_file and chunk else 0.05
+        if next_kill is not None:
+            wait = min(wait, max(0.0, next_kill - time.monotonic()))
+        stop.wait(wait)
+
+
+# --- agent ----------------------------------------------------------------------------
+class ChaosWatcher:
+    def __init__(self, services: List[Tuple[int, str]], design: str, interval_s: float,
+                 fill_file: Optional[str], quota_bytes: int, horizon_s: float):
+        self.services = services
+        self.design = design
+        self.interval_s = interval_s
+        self.fill_file, self.quota_bytes, self.horizon_s = fill_file, quota_bytes, horizon_s
+        self.ring = DiskRing(fill_file or "/")
+        self.pidfd = design == "pidfd" and hasattr(os, "pidfd_open")
+        self._sel = selectors.DefaultSelector()
+        self._armed: Dict[int, int] = {}  # port -> pidfd
+        # (kind, port, monotonic time, incident): a heal carries the incident of the detection
+        # that started it
+        self.events: List[Tuple[str, Optional[int], float, Optional[int]]] = []
+        self._incidents = 0
+        self.last_sweep = float("-inf")
+        self.suppressed = 0
+        self.peak_disk_percent = 0.0
+
+    def _arm(self, port: int, pidfile: str) -> None:
+        if not self.pidfd or port in self._armed:
+            return
+        pid = _read_pid(pidfile)
+        try:
+            fd = os.pidfd_open(pid) if pid else None
+        except OSError:
+            fd = None
+        if fd is not None:
+            self._sel.register(fd, selectors.EVENT_READ, port)
+            self._armed[port] = fd
+
+    def _disarm(self, port: int) -> None:
+        fd = self._armed.pop(port, None)
+        if fd is not None:
+            self._sel.unregister(fd)
+            os.close(fd)
+
+    def _heal_service(self, port: int, pidfile: str, incident: int) -> None:
+        target = f"fakesvc:{port}"
+        if auto_heal._suppressed("service", target) is not None:
+            self.suppressed += 1
+            return
+        res = auto_heal._heal("service", target, "heal_fakesvc_8080", dry_run=False, port=port,
+                              pidfile=pidfile)
+        outcome = "healed" if res.get("ok") else "heal_failed"
+        self.events.append((outcome, port, time.monotonic(), incident))
+        if res.get("ok"):
+            self._arm(port, pidfile)
+
+    def _check_disk(self, now: float) -> None:
+        try:
+            used = os.stat(self.fill_file).st_size
+        except FileNotFoundError:
+            used = 0
+        self.ring.add(now, used, self.quota_bytes)
+        fc = self.ring.summary()
+        self.peak_disk_percent = max(self.peak_disk_percent, fc["used_percent"])
+        ttf = fc["time_to_full_s"]
+        if fc["used_percent"] < auto_heal.DISK_THRESHOLD and (ttf is None or ttf > self.horizon_s):
+            return
+        self.events.append(("disk_detect", None, now, None))
+        free_disk(dry_run=False, fillfile=self.fill_file)
+        self.events.append(("disk_freed", None, time.monotonic(), None))
+        self.ring.samples.clear()  # the old slope says nothing about the next episode
+
+    def step(self) -> None:
+        down: Dict[int, float] = {}  # port -> when it was seen down
+        if self._sel.get_map():
+            ready = self._sel.select(self.interval_s)
+            now = time.monotonic()
+            for key, _ in ready:
+                down[key.data] = now
+        else:
+            time.sleep(self.interval_s)
+        self.last_sweep = time.monotonic()  # kills after this can't be seen by this step
+        for port in down:
+            self._disarm(port)
+        for port, pidfile in self.services:
+            if port not in down and port not in self._armed and not _port_open(port):
+                down[port] = time.monotonic()  # stamped after the probe, so never before the kill
+        incidents: Dict[int, int] = {}
+        for port, seen in down.items():
+            self._incidents += 1
+            incidents[port] = self._incidents
+            self.events.append(("detect", port, seen, self._incidents))
+        for port, pidfile in self.services:
+            if port in down:
+                self._heal_service(port, pidfile, incidents[port])
+        if self.fill_file:
+            self._check_disk(time.monotonic())
+
+    def run(self, until: float) -> None:
+        for port, pidfile in self.services:
+            self._arm(port, pidfile)
+        while time.monotonic() < until:
+            self.step()
+
+    def close(self) -> None:
+        for port in list(self._armed):
+            self._disarm(port)
+        self._sel.close()
+
+
+def _pair(kills: List[Tuple[int, float]],
+          events: List[Tuple[str, Optional[int], float, Optional[int]]],
+          ) -> Tuple[List[float], int, List[float], int]:
+    """
+    Per kill on a port: seconds to the first detection after it, and to the first successful heal
+    started by a detection between it and the port's next kill.
+    Returns (ttd, undetected, tth, unhealed).
+    """
+    healed = {i: t for k, _, t, i in events if k == "healed"}
+    ttd, tth, undetected, unhealed = [], [], 0, 0
+    for port, t_kill in kills:
+        t_next = min((t for p, t in kills if p == port and t > t_kill), default=float("inf"))
+        detects = sorted((t, i) for k, p, t, i in events
+                         if k == "detect" and p == port and t >= t_kill)
+        if not detects:
+            undetected += 1
+            unhealed += 1
+            continue
+        ttd.append(detects[0][0] - t_kill)
+        heals = [healed[i] for t, i in detects if t < t_next and i in healed]
+        if heals:
+            tth.append(min(heals) - t_kill)
+        else:
+            unhealed += 1
+    return ttd, undetected, tth, unhealed
+
+
+def run_once(design: str, n_services: int = 3, duration_s: float = 30.0, kill_every_s: float = 2.0,
+             fill_mb_s: float = 2.0, fill_quota_mb: float = 64.0, fill_dir: str = "/tmp",
+             interval_s: float = 0.5, horizon_s: Optional[float] = None, seed: int = 1,
+             audit_dir: Optional[str] = None) -> Dict[str, Any]:
+    """One chaos run with watcher `design`; returns its report. Audit records go to audit_dir."""
+    work = tempfile.mkdtemp(prefix="linops-chaos-", dir=fill_dir)
+    with audit.redirect(audit_dir or os.path.join(work, "audit")):
+        return _run(work, design, n_services, duration_s, kill_every_s, fill_mb_s, fill_quota_mb,
+                    interval_s, horizon_s, seed)
+
+
+def _run(work: str, design: str, n_services: int, duration_s: float, kill_every_s: float,
+         fill_mb_s: float, fill_quota_mb: float, interval_s: float, horizon_s: Optional[float],
+         seed: int) -> Dict[str, Any]:
+    auto_heal._STATE = HealState(os.path.join(work, "healstate.sqlite"), burst=1e9, cooldown_s=0)
+    auto_heal.DRY_RUN = False
+    auto_heal.HEAL_BACKEND = "local"
+    horizon_s = auto_heal.DISK_TTF_HORIZON_S if horizon_s is None else horizon_s
+    services = [(_free_port(), os.path.join(work, f"fakesvc{i}.pid")) for i in range(n_services)]
+    fill_file = os.path.join(work, "fillfile") if fill_mb_s > 0 else None
+    quota = int(fill_quota_mb * 2**20)
+
+    for port, pidfile in services:
+        fakesvc.heal_fakesvc_8080(dry_run=False, port=port, pidfile=pidfile)
+    watcher = ChaosWatcher(services, design, interval_s, fill_file, quota, horizon_s)
+    ctx = mp.get_context("spawn")  # a clean process, not a fork of the agent
+    q, stop = ctx.Queue(), ctx.Event()
+    threshold_bytes = int(quota * auto_heal.DISK_THRESHOLD / 100)
+    chaos = ctx.Process(target=_chaos, args=(services, q, stop, seed, kill_every_s, fill_file,
+                                             fill_mb_s, threshold_bytes), daemon=True)
+    rss0 = _rss_mb()
+    ru0 = resource.getrusage(resource.RUSAGE_SELF)
+    t0 = time.monotonic()
+    chaos.start()
+    try:
+        watcher.run(until=t0 + duration_s)
+    finally:
+        stop.set()
+        chaos.join(10)
+        wall = time.monotonic() - t0
+        ru1 = resource.getrusage(resource.RUSAGE_SELF)
+        rss1 = _rss_mb()
+        watcher.close()
+        chaos_events = []
+        while not q.empty():
+            chaos_events.append(q.get())
+        for port, pidfile in services:
+            pid = _read_pid(pidfile)
+            if pid:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        shutil.rmtree(work, ignore_errors=True)
+
+    # a kill after the watcher's last sweep began had no chance to be seen: report it apart
+    kills = [(port, t) for kind, port, t in chaos_events
+             if kind == "kill" and t <= watcher.last_sweep]
+    in_flight = sum(1 for kind, _, t in chaos_events if kind == "kill" and t > watcher.last_sweep)
+    ttd, undetected, tth, unhealed = _pair(kills, watcher.events)
+    crosses = sorted(t for kind, _, t in chaos_events if kind == "disk_cross")
+    detects = [t for k, _, t, _ in watcher.events if k == "disk_detect"]
+    freed = [t for k, _, t, _ in watcher.events if k == "disk_freed"]
+    disk_ttd, disk_tth, crossed, prev = [], [], 0, float("-inf")
+    for d, f in zip(detects, freed):
+        c = [t for t in crosses if prev < t <= f]
+        if c:
+            crossed += 1
+            disk_ttd.append(max(0.0, d - c[0]))
+            disk_tth.append(f - c[0])
+        prev = f
+    cpu_s = (ru1.ru_utime - ru0.ru_utime) + (ru1.ru_stime - ru0.ru_stime)
+    return {
+        "watcher": design if design != "pidfd" or watcher.pidfd else "poll (no pidfd)",
+        "config": {"services": n_services, "duration_s": duration_s, "kill_every_s": kill_every_s,
+                   "interval_s": interval_s, "fill_mb_s": fill_mb_s, "fill_quota_mb": fill_quota_mb,
+                   "disk_threshold_percent": auto_heal.DISK_THRESHOLD, "disk_horizon_s": horizon_s,
+                   "seed": seed},
+        "services": {"kills": len(kills), "in_flight_at_end": in_flight,
+                     "undetected": undetected, "unhealed": unhealed,
+                     "heal_failures": sum(1 for k, _, _, _ in watcher.events if k == "heal_failed"),
+                     "suppressed": watcher.suppressed,
+                     "time_to_detect": _stats(ttd), "time_to_heal": _stats(tth)},
+        "disk": {"episodes": len(freed), "crossed_threshold": crossed,
+                 "peak_used_percent": round(watcher.peak_disk_percent, 1),
+                 "time_to_detect": _stats(disk_ttd), "time_to_heal": _stats(disk_tth)},
+        "agent": {"wall_s": round(wall, 3), "cpu_s": round(cpu_s, 3),
+                  "cpu_percent": round(100 * cpu_s / wall, 2) if wall else None,
+                  "rss_start_mb": rss0, "rss_end_mb": rss1,
+                  "max_rss_mb": round(ru1.ru_maxrss / 1024, 1)},
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="chaos / MTTR harness for the auto-heal watcher")
+    ap.add_argument("--watcher", default=",".join(WATCHERS),
+                    help=f"comma-separated: {','.join(WATCHERS)}")
+    ap.add_argument("--services", type=int, default=3)
+    ap.add_argument("--duration-s", type=float, default=30.0)
+    ap.add_argument("--kill-every-s", type=float, default=2.0,
+                    help="mean seconds between kills (0: none)")
+    ap.add_argument("--fill-mb-s", type=float, default=2.0, help="fill rate (0: no disk chaos)")
+    ap.add_argument("--fill-quota-mb", type=float, default=64.0, help="size of the simulated disk")
+    ap.add_argument("--fill-dir", default="/tmp")
+    ap.add_argument("--interval", type=float, default=0.5, help="poll / disk sample period (s)")
+    ap.add_argument("--disk-horizon-s", type=float,
+                    help="heal when predicted full within (default: DISK_TTF_HORIZON_S)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--audit-dir",
+                    help="where the agent's audit records go (default: a temp dir per run)")
+    ap.add_argument("--out", help="write JSON here (default: stdout)")
+    args = ap.parse_args()
+
+    designs = [w.strip() for w in args.watcher.split(",") if w.strip()]
+    bad = [w for w in designs if w not in WATCHERS]
+    if bad:
+        sys.exit(f"unknown watcher(s): {', '.join(bad)} (choose: {', '.join(WATCHERS)})")
+    report = {w: run_once(w, n_services=args.services, duration_s=args.duration_s,
+                          kill_every_s=args.kill_every_s, fill_mb_s=args.fill_mb_s,
+                          fill_quota_mb=args.fill_quota_mb, fill_dir=args.fill_dir,
+                          interval_s=args.interval, horizon_s=args.disk_horizon_s, seed=args.seed,
+                          audit_dir=args.audit_dir)
+              for w in designs}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
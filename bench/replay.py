@@ -0,0 +1,248 @@
+# Replay recorded plan/do traffic from an audit log against the current planner and executor.
+#   python -m bench.replay                          # audit/audit.jsonl, as fast as possible
+#   python -m bench.replay --audit prod.jsonl --speedup 10 --workers 16
+#   python -m bench.replay --audit /var/lib/linops/audit --target do --procs 4 --loops 5 \
+#       --out r.json
+#
+# Every `plan` and `do` record becomes one request (a `plan_batch` record, one per query it
+# grouped), re-issued with the recorded query: `plan` through plan_actions, `do` through the
+# CLI's dry-run path (cli.main.run_query). --speedup N keeps the recorded arrival gaps divided
+# by N (open loop: requests are submitted on schedule whether or not earlier ones have
+# finished, so lag shows saturation); without it requests go out back to back. Workers are
+# threads (--workers) or processes (--procs).
+#
+# The JSON report has throughput, latency and lag percentiles per target, errors, and every
+# query whose replayed plan differs from the recorded one. The replay's own audit records go to
+# --audit-dir (default: a throwaway directory), never into the log being replayed: the workers'
+# utils.audit is redirected in-process, since LINOPS_AUDIT_DIR is only read when it is imported.
+
+import argparse
+import concurrent.futures as cf
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils import audit, auditbin, serialize
+
+# the log the agent writes to, resolved before replay() redirects its own writes
+DEFAULT_AUDIT = audit.AUDIT_PATH
+
+TARGETS = ("plan", "do")
+
+
+# --- loading ------------------------------------------------------------------------
+def _records(path: str) -> Iterator[Dict[str, Any]]:
+    """Records from a JSONL audit file, or from binary segments if path is a directory."""
+    if os.path.isdir(path):
+        yield from auditbin.iter_records(path, events=TARGETS + ("plan_batch",))
+        return
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield serialize.loads(line)
+            except ValueError:
+                continue  # torn/foreign line: replay what we can
+
+
+def _steps(rec: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """The recorded plan as [{name, kwargs}] (a `do` record only has its results' step names)."""
+    if rec["event"] == "plan":
+        return [{"name": s.get("name"), "kwargs": s.get("kwargs") or {}}
+                for s in rec.get("plan") or []]
+    results = rec.get("results")
+    if not isinstance(results, list):
+        return None
+    return [{"name": r.get("step"), "kwargs": None} for r in results]
+
+
+def load(path: str, targets: tuple = TARGETS) -> List[Dict[str, Any]]:
+    """Replayable requests {target, query, ts, recorded}, in recorded time order."""
+    out = []
+    for rec in _records(path):
+        if rec.get("event") == "plan_batch" and "plan" in targets:
+            # `plan --batch`: one grouped record, replayed as its individual queries
+            for g in rec.get("plans") or []:
+                out += [{"target": "plan", "query": g["query"], "ts": float(rec.get("ts") or 0),
+                         "recorded": _steps({"event": "plan", **g})}] * int(g.get("count") or 1)
+            continue
+        if rec.get("event") in targets and isinstance(rec.get("query"), str):
+            out.append({"target": rec["event"], "query": rec["query"],
+                        "ts": float(rec.get("ts") or 0), "recorded": _steps(rec)})
+    out.sort(key=lambda r: r["ts"])
+    return out
+
+
+def schedule(reqs: List[Dict[str, Any]], speedup: Optional[float], loops: int = 1) -> List[float]:
+    """Offset (s from start) of each request over `loops` passes; all 0 without a speedup."""
+    if not reqs:
+        return []
+    if not speedup:
+        return [0.0] * (len(reqs) * loops)
+    t0 = reqs[0]["ts"]
+    span = (reqs[-1]["ts"] - t0) / speedup
+    gap = span / max(1, len(reqs) - 1)  # loops follow each other at the mean gap
+    return [k * (span + gap) + (r["ts"] - t0) / speedup for k in range(loops) for r in reqs]
+
+
+# --- one request (runs in a worker thread or process) ----------------------------------
+def _replay_one(target: str, query: str, due: float) -> Dict[str, Any]:
+    from planner.plan import plan_actions
+    start = time.monotonic()
+    out: Dict[str, Any] = {"lag_s": max(0.0, start - due)}
+    try:
+        if target == "plan":
+            steps = plan_actions(query)
+            out["plan"] = [{"name": s.name, "kwargs": s.kwargs} for s in steps]
+            out["ok"] = True
+        else:
+            import cli.main
+            results, _ = cli.main.run_query(query, dry_run=True)
+            out["plan"] = [{"name": r.get("step"), "kwargs": None} for r in results]
+            out["ok"] = all(r.get("ok", True) for r in results)
+    except Exception as e:  # report, keep replaying
+        out["error"] = f"{type(e).__name__}: {e}"
+    out["latency_s"] = time.monotonic() - start
+    return out
+
+
+def _warm(audit_dir: Optional[str] = None) -> None:
+    # registries populated and modules imported before the clock starts (per worker process)
+    import cli.main  # noqa: F401
+    if audit_dir:  # a worker process: its records go where the parent's do, for its lifetime
+        audit.AUDIT_DIR, audit.AUDIT_PATH = audit_dir, os.path.join(audit_dir, "audit.jsonl")
+
+
+def _differs(recorded: Optional[List[Dict[str, Any]]], replayed: List[Dict[str, Any]]) -> bool:
+    if recorded is None:
+        return False
+    if len(recorded) != len(replayed):
+        return True
+    # `do` records carry step names only: compare kwargs where both sides have them
+    return any(a["name"] != b["name"] or (a["kwargs"] is not None and b["kwargs"] is not None
+                                          and a["kwargs"] != b["kwargs"])
+               for a, b in zip(recorded, replayed))
+
+
+# --- driver -------------------------------------------------------------------------
+def _pct(sorted_vals: List[float], q: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    return sorted_vals[min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))]
+
+
+def _stats(vals: List[float]) -> Dict[str, Optional[float]]:
+    vals = sorted(vals)
+    ms = lambda v: None if v is None else round(v * 1000, 3)  # noqa: E731
+    return {"mean_ms": ms(sum(vals) / len(vals)) if vals else None, "p50_ms": ms(_pct(vals, 0.50)),
+            "p90_ms": ms(_pct(vals, 0.90)), "p99_ms": ms(_pct(vals, 0.99)),
+            "max_ms": ms(vals[-1] if vals else None)}
+
+
+def replay(reqs: List[Dict[str, Any]], speedup: Optional[float] = None, workers: int = 8,
+           procs: int = 0, loops: int = 1, max_diffs: int = 50,
+           audit_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Replay reqs; return the report dict. Its own audit records go to audit_dir (default: a
+    temp dir)."""
+    with tempfile.TemporaryDirectory(prefix="linops-replay-") as tmp:
+        audit_dir = audit_dir or tmp
+        with audit.redirect(audit_dir):
+            return _replay(reqs, speedup, workers, procs, loops, max_diffs, audit_dir)
+
+
+def _replay(reqs: List[Dict[str, Any]], speedup: Optional[float], workers: int, procs: int,
+            loops: int, max_diffs: int, audit_dir: str) -> Dict[str, Any]:
+    _warm()
+    offsets = schedule(reqs, speedup, loops)
+    pool: cf.Executor = (cf.ProcessPoolExecutor(procs, initializer=_warm, initargs=(audit_dir,))
+                         if procs else cf.ThreadPoolExecutor(workers))
+    done: List[Any] = []
+    with pool:
+        if procs:  # start the workers (and their imports) before the clock starts
+            list(pool.map(time.sleep, [0] * procs))
+        t0 = time.monotonic()
+        for i, off in enumerate(offsets):
+            req = reqs[i % len(reqs)]
+            due = t0 + off
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            done.append((req, pool.submit(_replay_one, req["target"], req["query"], due)))
+        results = [(req, fut.result()) for req, fut in done]
+        wall = time.monotonic() - t0
+
+    report: Dict[str, Any] = {
+        "requests": len(results), "wall_s": round(wall, 3),
+        "throughput_rps": round(len(results) / wall, 1) if wall > 0 else None,
+        "speedup": speedup, "workers": procs or workers,
+        "mode": "processes" if procs else "threads", "loops": loops, "targets": {},
+    }
+    errors: Counter = Counter()
+    diffs: Dict[tuple, Dict[str, Any]] = {}
+    for target in TARGETS:
+        mine = [res for req, res in results if req["target"] == target]
+        if not mine:
+            continue
+        report["targets"][target] = {
+            "requests": len(mine),
+            "failed": sum(1 for r in mine if not r.get("ok")),
+            "latency": _stats([r["latency_s"] for r in mine]),
+            "lag": _stats([r["lag_s"] for r in mine]),
+        }
+    for req, res in results:
+        if "error" in res:
+            errors[res["error"]] += 1
+            continue
+        if _differs(req["recorded"], res["plan"]):
+            key = (req["target"], req["query"], json.dumps(req["recorded"], sort_keys=True))
+            d = diffs.setdefault(key, {"target": req["target"], "query": req["query"],
+                                       "recorded": req["recorded"], "replayed": res["plan"],
+                                       "count": 0})
+            d["count"] += 1
+    report["errors"] = dict(errors.most_common())
+    examples = sorted(diffs.values(), key=lambda d: -d["count"])[:max_diffs]
+    report["plan_diffs"] = {"count": sum(d["count"] for d in diffs.values()),
+                            "distinct": len(diffs), "examples": examples}
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(
+        description="replay audited plan/do queries against the current code")
+    ap.add_argument("--audit", default=DEFAULT_AUDIT,
+                    help="audit JSONL file, or a dir of binary segments")
+    ap.add_argument("--target", choices=("plan", "do", "both"), default="both")
+    ap.add_argument("--speedup", type=float,
+                    help="recorded gaps / N (default: back to back, max throughput)")
+    ap.add_argument("--workers", type=int, default=8, help="worker threads")
+    ap.add_argument("--procs", type=int, default=0, help="worker processes instead of threads")
+    ap.add_argument("--loops", type=int, default=1,
+                    help="replay the recorded traffic this many times")
+    ap.add_argument("--audit-dir",
+                    help="where the replay's own audit records go (default: a temp dir)")
+    ap.add_argument("--out", help="write JSON here (default: stdout)")
+    args = ap.parse_args()
+
+    targets = TARGETS if args.target == "both" else (args.target,)
+    reqs = load(args.audit, targets)
+    if not reqs:
+        sys.exit(f"no replayable {'/'.join(targets)} records in {args.audit}")
+    report = {"source": args.audit, **replay(reqs, speedup=args.speedup, workers=args.workers,
+                                             procs=args.procs, loops=args.loops,
+                                             audit_dir=args.audit_dir)}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
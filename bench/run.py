@@ -0,0 +1,464 @@
+# Offline benchmark suite for the agent's hot paths. Writes machine-readable JSON.
+#   python -m bench.run --out bench_results.json
+#   python -m bench.run --quick --only plan,safety
+#   python -m bench.run --compare old.json --out new.json     # flags regressions
+#
+# Nothing here touches the network: Modal lookups are stubbed, the LLM planner is disabled,
+# and audit records (including the CLI subprocesses') go to a throwaway directory.
+
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+os.environ["LINOPS_LLM"] = "0"
+os.environ["LINOPS_AUDIT_DIR"] = tempfile.mkdtemp(prefix="linops-bench-")
+
+import runbooks.fakesvc  # noqa: E402,F401  (populate registry)
+import runbooks.system  # noqa: E402,F401
+import utils.audit as audit  # noqa: E402
+from executor import modal_client  # noqa: E402
+from planner.plan import plan_actions, plan_many  # noqa: E402
+from runbooks.catalog import RUNBOOKS  # noqa: E402
+from runbooks.fakesvc import heal_fakesvc_8080  # noqa: E402
+from utils import shell  # noqa: E402
+
+REGRESSION_RATIO = 1.25   # --compare flags a bench whose mean grew by more than this
+
+COMMAND_CORPUS = [
+    "uptime", "df -h /", "free -h || head -n 10 /proc/meminfo", "pgrep -x nginx",
+    "tail -n 50 /var/log/nginx/error.log", "journalctl -u nginx --since '10 min ago' | tail -100",
+    "ps aux --sort=-%cpu | head -n 6", "du -x -b -d1 / 2>/dev/null | sort -nr | head -n 10",
+    "echo hello > /tmp/out.txt", "cat /etc/passwd | grep root > /etc/shadow",
+    "rm -rf / --no-preserve-root", "dd if=/dev/zero of=/dev/sda bs=1M", "mkfs.ext4 /dev/sdb1",
+    "systemctl restart nginx || service nginx restart || true",
+    "curl -s -o /dev/null -w '%{http_code}' http://127.0.0.1/",
+]
+
+QUERY_CORPUS = [
+    "free disk and check cpu/mem", "web server crashed, restart and verify", "check_cpu_mem please",
+    "nonsense phrase", "free_disk now", "nginx is down again, restart it",
+]
+
+
+def _stub_modal() -> None:
+    def _offline(app_name: str, fn_name: str, **kwargs):
+        return {"ok": True, "stub": True, "app": app_name, "fn": fn_name, "kwargs": kwargs}
+    modal_client.call_modal = _offline
+
+
+def measure(fn: Callable[[], Any], n: int, warmup: int = 3) -> Dict[str, Any]:
+    """Call fn n times; return latency stats in microseconds plus ops/s."""
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    t_all = time.perf_counter()
+    for _ in range(n):
+        t0 = time.perf_counter_ns()
+        fn()
+        samples.append((time.perf_counter_ns() - t0) / 1000.0)
+    total = time.perf_counter() - t_all
+    samples.sort()
+    return {
+        "n": n,
+        "mean_us": round(statistics.fmean(samples), 2),
+        "p50_us": round(samples[len(samples) // 2], 2),
+        "p95_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+        "max_us": round(samples[-1], 2),
+        "ops_per_s": round(n / total, 1) if total > 0 else None,
+    }
+
+
+def bench_plan(quick: bool) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    saved = dict(RUNBOOKS)
+    try:
+        for size in (len(saved), 100, 1000):
+            RUNBOOKS.clear()
+            RUNBOOKS.update(saved)
+            for i in range(size - len(saved)):
+                RUNBOOKS[f"synthetic_runbook_{i}"] = lambda dry_run=True: {"ok": True}
+            queries = iter(QUERY_CORPUS * 10_000)
+            out[f"plan_actions[catalog={size}]"] = measure(lambda: plan_actions(next(queries)),
+                                                           n=200 if quick else 5000)
+    finally:
+        RUNBOOKS.clear()
+        RUNBOOKS.update(saved)
+    # an alert burst: plan + audit per query, vs plan_many + one grouped record
+    corpus = QUERY_CORPUS * (50 if quick else 200)
+    alerts = [q.upper() if i % 3 else q for i, q in enumerate(corpus)]
+
+    def _loop() -> None:
+        for q in alerts:
+            audit.audit_log(event="plan", query=q, plan=plan_actions(q))
+
+    def _batch() -> None:
+        plans = plan_many(alerts)
+        audit.audit_log(event="plan_batch", queries=len(alerts),
+                        plans=[{"query": q, "plan": p}
+                               for q, p in dict(zip(alerts, plans)).items()])
+    out[f"plan_burst[{len(alerts)}_alerts,loop]"] = measure(_loop, n=3, warmup=1)
+    out[f"plan_burst[{len(alerts)}_alerts,plan_many]"] = measure(_batch, n=3, warmup=1)
+    return out
+
+
+def bench_safety(quick: bool) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    n = 200 if quick else 5000
+    cmds = COMMAND_CORPUS
+
+    def corpus(check: Callable[[str], Any]) -> Callable[[], None]:
+        def _run() -> None:
+            for c in cmds:
+                check(c)
+        return _run
+
+    out["is_safe_command[utils.shell]"] = {**measure(corpus(shell.is_safe_command), n=n),
+                                           "cmds_per_call": len(cmds)}
+    from runbooks import ops  # the Modal app's filter (apps/modal_app.py wraps these runbooks)
+    out["is_safe_command[runbooks.ops]"] = {**measure(corpus(ops.is_safe_command), n=n),
+                                            "cmds_per_call": len(cmds)}
+    return out
+
+
+def bench_audit(quick: bool) -> Dict[str, Any]:
+    rec = {"query": "free disk and check cpu/mem", "dry_run": True,
+           "results": [{"step": "free_disk", "ok": True,
+                        "actions": [{"ok": True, "cmd": "df -h /"}]}] * 4}
+    n = 500 if quick else 20000
+    with tempfile.TemporaryDirectory() as d:
+        saved = audit.AUDIT_PATH
+        audit.AUDIT_PATH = os.path.join(d, "audit.jsonl")
+        try:
+            res = measure(lambda: audit.audit_log(event="do", **rec), n=n)
+            res["bytes_written"] = os.path.getsize(audit.AUDIT_PATH)
+        finally:
+            audit.AUDIT_PATH = saved
+    return {"audit_log": res}
+
+
+def bench_shell(quick: bool) -> Dict[str, Any]:
+    return {
+        "run_shell_safe[dry_run]": measure(lambda: shell.run_shell_safe("df -h /", dry_run=True),
+                                           n=200 if quick else 5000),
+        "run_shell_safe[exec]": measure(lambda: shell.run_shell_safe("true", dry_run=False),
+                                        n=20 if quick else 300),
+    }
+
+
+SIMPLE_CMDS = ["uptime", "df -h /", "pgrep -x nginx", "free -m", "uname -a"]
+
+
+def bench_spawn(quick: bool) -> Dict[str, Any]:
+    """Spawn latency for simple diagnostic commands: direct argv exec vs sh -c vs bash -lc."""
+    from utils import shparse
+    n = 10 if quick else 100
+    argvs = [shparse.direct_argv(c) for c in SIMPLE_CMDS]
+    assert all(argvs), "SIMPLE_CMDS must all take the direct path"
+
+    def _cycle(run: Callable[[int], Any]) -> Callable[[], None]:
+        k = iter(range(10 ** 9))
+        return lambda: run(next(k) % len(SIMPLE_CMDS))
+
+    def _run(args: Any, **kw: Any) -> None:
+        subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False,
+                       **kw)
+
+    out = {
+        "spawn[direct]": measure(_cycle(lambda i: _run(argvs[i])), n=n),
+        "spawn[sh -c]": measure(_cycle(lambda i: _run(SIMPLE_CMDS[i], shell=True)), n=n),
+        # login profiles can take seconds on some hosts: a few samples are plenty
+        "spawn[bash -lc]": measure(_cycle(lambda i: _run(["bash", "-lc", SIMPLE_CMDS[i]])),
+                                   n=min(n, 5), warmup=1),
+    }
+    saved = shell.DIRECT_EXEC
+    try:
+        for direct in (True, False):
+            shell.DIRECT_EXEC = direct
+            out[f"run_shell_safe[exec,direct={direct}]"] = measure(
+                _cycle(lambda i: shell.run_shell_safe(SIMPLE_CMDS[i], dry_run=False)), n=n)
+    finally:
+        shell.DIRECT_EXEC = saved
+    return out
+
+
+def bench_spawnsrv(quick: bool) -> Dict[str, Any]:
+    """Spawn latency from a large agent process: subprocess.run vs the spawn-server helper."""
+    from utils import spawnsrv
+    n = 20 if quick else 300
+    out: Dict[str, Any] = {}
+    ballast = []
+    try:
+        for mb in (0, 256 if quick else 1024):
+            if mb:
+                ballast.append(bytearray(os.urandom(1024)) * (mb * 1024))  # touched pages, real RSS
+            out[f"subprocess.run[rss+{mb}MB]"] = measure(
+                lambda: subprocess.run(["true"], capture_output=True, text=True), n=n)
+            # preexec_fn (rlimits, nice...) rules out vfork: a real fork copies the page tables
+            out[f"subprocess.run[preexec_fn,rss+{mb}MB]"] = measure(
+                lambda: subprocess.run(["true"], capture_output=True, text=True,
+                                       preexec_fn=os.setpgrp), n=n)
+            server = spawnsrv.SpawnServer()
+            limited = spawnsrv.Budget(cpu_s=60, mem_mb=512, nice=5)
+            try:
+                out[f"spawn_server[rss+{mb}MB]"] = measure(lambda: server.run(["true"]), n=n)
+                out[f"spawn_server[budget,rss+{mb}MB]"] = measure(
+                    lambda: server.run(["true"], budget=limited), n=n)
+                out[f"spawnsrv.run[local,budget,rss+{mb}MB]"] = measure(
+                    lambda: spawnsrv._execute(["true"], None, None, limited, 1024), n=n)
+            finally:
+                server.close()
+    finally:
+        ballast.clear()
+    return out
+
+
+def bench_pkgqueue(quick: bool) -> Dict[str, Any]:
+    """Five concurrent installs against the fake apt (0.2s per dpkg run): per-call vs queued."""
+    import threading
+    from utils.fakeapt import FakeApt
+    from utils.pkgqueue import PackageQueue
+    pkgs = ["jq", "htop", "curl", "git", "vim"]
+    out: Dict[str, Any] = {}
+    for mode in ("per_call", "queued"):
+        apt = FakeApt(tempfile.mkdtemp(prefix="fakeapt-"), available=pkgs, install_delay_s=0.2)
+        q = PackageQueue(run=apt.run, exec_argv=apt.exec_argv, lists_dir=apt.lists_dir,
+                         stamp=apt.stamp, max_index_age_s=0 if mode == "per_call" else 3600)
+        lock = threading.Lock()  # per-call installs serialise on the dpkg lock
+
+        def one(pkg: str) -> None:
+            if mode == "queued":
+                q.install([pkg])
+                return
+            with lock:
+                apt.run("apt-get update -y")
+                apt.run(f"apt-get install -y {pkg}")
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=one, args=(p,)) for p in pkgs]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        calls = apt.calls()
+        out[f"install_5_packages[{mode}]"] = {
+            "one_shot_s": round(time.perf_counter() - t0, 3),
+            "apt_updates": sum(c[:2] == ["apt-get", "update"] for c in calls),
+            "apt_transactions": sum(c[:2] == ["apt-get", "install"] for c in calls),
+        }
+    return out
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def bench_heal(quick: bool) -> Dict[str, Any]:
+    samples: List[float] = []
+    for i in range(2 if quick else 10):
+        port = _free_port()
+        pidfile = os.path.join(os.environ["LINOPS_AUDIT_DIR"], f"fakesvc{i}.pid")
+        t0 = time.perf_counter()
+        res = heal_fakesvc_8080(dry_run=False, port=port, pidfile=pidfile)
+        samples.append(time.perf_counter() - t0)
+        pid = (res.get("start") or {}).get("pid")
+        if pid:
+            try:
+                os.kill(pid, 9)
+            except OSError:
+                pass
+    return {"heal_fakesvc_8080[time_to_heal]": {
+        "n": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+    }}
+
+
+def bench_cli(quick: bool) -> Dict[str, Any]:
+    samples: List[float] = []
+    for _ in range(2 if quick else 10):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "cli.main", "list"],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        samples.append(time.perf_counter() - t0)
+    return {"cli_cold_start[list]": {
+        "n": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 1),
+        "min_ms": round(min(samples) * 1000, 1),
+    }}
+
+
+def bench_redact(quick: bool) -> Dict[str, Any]:
+    from bench.bench_redact import run as run_redact
+    return {"redact": run_redact(mb=1 if quick else 16)}
+
+
+def bench_serialize(quick: bool) -> Dict[str, Any]:
+    from bench.bench_serialize import run as run_serialize
+    return {"serialize[audit_records]": run_serialize(records=200 if quick else 5000)}
+
+
+def bench_auditbin(quick: bool) -> Dict[str, Any]:
+    """JSONL vs binary segments: bytes on disk, full replay, and an indexed `since` query."""
+    from bench.bench_serialize import audit_records
+    from utils import auditbin, serialize
+    recs = audit_records(300 if quick else 20000)
+    with tempfile.TemporaryDirectory() as d:
+        jsonl = os.path.join(d, "audit.jsonl")
+        with open(jsonl, "wb") as f:
+            for r in recs:
+                f.write(serialize.dumps_bytes(r, newline=True))
+        w = auditbin.BinaryAuditWriter(d)
+        for r in recs:
+            w.append(r)
+        bin_bytes = sum(os.path.getsize(p) for p in auditbin._segments(d))
+        since = recs[int(len(recs) * 0.9)]["ts"]
+
+        def _replay_jsonl() -> None:
+            with open(jsonl, "rb") as f:
+                for line in f:
+                    serialize.loads(line)
+
+        def _replay_binary() -> None:
+            for _ in auditbin.iter_records(d):
+                pass
+
+        def _query_jsonl() -> None:
+            with open(jsonl, "rb") as f:
+                [r for r in map(serialize.loads, f) if r["ts"] >= since and r["event"] == "do"]
+
+        return {"auditbin": {
+            "records": len(recs),
+            "jsonl_bytes": os.path.getsize(jsonl),
+            "binary_bytes": bin_bytes,
+            "replay_jsonl": measure(_replay_jsonl, n=3, warmup=1),
+            "replay_binary": measure(_replay_binary, n=3, warmup=1),
+            "query_last10pct_jsonl": measure(_query_jsonl, n=3, warmup=1),
+            "query_last10pct_binary": measure(
+                lambda: list(auditbin.iter_records(d, since=since, events=["do"])), n=3, warmup=1),
+        }}
+
+
+def bench_ui(quick: bool) -> Dict[str, Any]:
+    """show_results on growing result sets: time to first output, total time, peak traced memory."""
+    import contextlib
+    import tracemalloc
+    from cli import ui
+
+    class _Sink:
+        first: Optional[float] = None
+
+        def write(self, s: str) -> int:
+            if self.first is None:
+                self.first = time.perf_counter()
+            return len(s)
+
+        def flush(self) -> None:
+            pass
+
+    out: Dict[str, Any] = {}
+    for n in ((1000, 10000) if quick else (1000, 10000, 100000)):
+        results = ({"step": f"cmd{i}", "ok": i % 13 != 0, "stdout": "x" * (i % 90)}
+                   for i in range(n))
+        sink = _Sink()
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(sink):  # type: ignore[type-var]
+            ui.show_results(results, dry_run=False)
+        total = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        out[f"ui_show_results[{n}_rows]"] = {
+            "one_shot_s": round(total, 3),
+            "first_output_ms": round((sink.first - t0) * 1000, 1) if sink.first else None,
+            "peak_kb": round(peak / 1024, 1),
+        }
+    return out
+
+
+SUITES: Dict[str, Callable[[bool], Dict[str, Any]]] = {
+    "plan": bench_plan,
+    "safety": bench_safety,
+    "audit": bench_audit,
+    "shell": bench_shell,
+    "spawn": bench_spawn,
+    "spawnsrv": bench_spawnsrv,
+    "heal": bench_heal,
+    "cli": bench_cli,
+    "redact": bench_redact,
+    "serialize": bench_serialize,
+    "auditbin": bench_auditbin,
+    "pkgqueue": bench_pkgqueue,
+    "ui": bench_ui,
+}
+
+
+def run(only: Optional[List[str]] = None, quick: bool = False) -> Dict[str, Any]:
+    _stub_modal()
+    results: Dict[str, Any] = {}
+    for name in only or list(SUITES):
+        results.update(SUITES[name](quick))
+    return {
+        "meta": {
+            "ts": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+def _headline(res: Dict[str, Any]) -> Optional[float]:
+    for key in ("mean_us", "mean_ms", "one_shot_s"):
+        if key in res:
+            return float(res[key])
+    return None
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any],
+            ratio: float = REGRESSION_RATIO) -> Dict[str, Any]:
+    """Per-bench new/old ratio of the headline latency; > ratio is a regression."""
+    out: Dict[str, Any] = {}
+    for name, res in new["results"].items():
+        a, b = _headline(old["results"].get(name, {})), _headline(res)
+        if a and b:
+            r = round(b / a, 3)
+            out[name] = {"ratio": r, "regression": r > ratio}
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="linops hot-path benchmarks")
+    ap.add_argument("--out", help="write JSON here (default: stdout)")
+    ap.add_argument("--only", help=f"comma-separated subset of: {','.join(SUITES)}")
+    ap.add_argument("--quick", action="store_true", help="few iterations (smoke run)")
+    ap.add_argument("--compare", help="previous results JSON to diff against")
+    args = ap.parse_args()
+
+    only = [s.strip() for s in args.only.split(",")] if args.only else None
+    data = run(only=only, quick=args.quick)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            data["compare"] = compare(json.load(f), data)
+    text = json.dumps(data, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if any(c["regression"] for c in data.get("compare", {}).values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
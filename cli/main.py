@@ -1,7 +1,7 @@
 from __future__ import annotations
 
-import json
-from typing import Any, Dict, List
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import typer
 
@@ -9,40 +9,135 @@ import typer
 import runbooks.system  # noqa: F401
 import runbooks.fakesvc  # noqa: F401
 
-from planner.plan import Step, plan_actions
+from executor import fleet
+from planner.plan import Step, plan_actions, plan_many
 from runbooks.catalog import RUNBOOKS, list_actions
-from utils.audit import audit_log
+from utils import auditbin, metrics, serialize, trace
+from utils.audit import AUDIT_DIR, audit_log
 from utils.shell import run_shell_safe
 
 # NEW: import UI
-from cli.ui import show_plan, show_results, show_refusal
+from cli.ui import show_fleet, show_plan, show_plans, show_results, show_refusal, show_step_event
 
 app = typer.Typer(help="Grep CLI")
+audit_app = typer.Typer(help="Audit log tools.")
+app.add_typer(audit_app, name="audit")
 
 
-def _steps_to_dict(steps: List[Step]) -> List[Dict[str, Any]]:
-    return [{"name": s.name, "kwargs": s.kwargs} for s in steps]
+def _timings(**spans: Any) -> Dict[str, Any]:
+    """{"timings": {name: {wall_ms, cpu_ms}}} when tracing is on, else {} (output unchanged)."""
+    t = {k: sp.timing() for k, sp in spans.items() if sp.timing()}
+    return {"timings": t} if t else {}
+
+
+def _run_steps(steps: List[Step], dry_run: bool,
+               emit: Callable[[Dict[str, Any]], None]) -> List[Dict[str, Any]]:
+    """Run steps in order; emit step_start/step_finish events as they happen."""
+    results: List[Dict[str, Any]] = []
+    for i, s in enumerate(steps, start=1):
+        emit({"event": "step_start", "index": i, "of": len(steps), "step": s.name,
+              "ts": time.time()})
+        fn = RUNBOOKS.get(s.name)
+        t0 = time.perf_counter()
+        if not fn:
+            res: Dict[str, Any] = {"step": s.name, "ok": False, "error": "unknown_action"}
+        else:
+            with trace.span("step", step=s.name) as sp_step:
+                out = fn(dry_run=dry_run, **s.kwargs)
+            metrics.STEP_LATENCY.labels(step=s.name).observe(time.perf_counter() - t0)
+            out = out if isinstance(out, dict) else {"ok": True}
+            res = trace.attach({"step": s.name, **out}, sp_step)
+        results.append(res)
+        emit({"event": "step_finish", "index": i, "of": len(steps), "step": s.name,
+              "ok": res.get("ok", True), "elapsed_s": round(time.perf_counter() - t0, 3),
+              "result": res})
+    return results
+
+
+def run_query(query: str, dry_run: bool, emit: Callable[[Dict[str, Any]], None] = lambda ev: None
+              ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """`do` on this host: plan, run, audit. Returns (results, {plan, audit, total} spans)."""
+    with trace.span("do", query=query, dry_run=dry_run) as sp_do:
+        with trace.span("plan") as sp_plan:
+            steps = plan_actions(query)
+        emit({"event": "plan", "query": query, "dry_run": dry_run, "plan": steps})
+        results = _run_steps(steps, dry_run, emit)
+        with trace.span("audit") as sp_audit:
+            audit_log(event="do", query=query, dry_run=dry_run, results=results,
+                      **_timings(plan=sp_plan))
+    return results, {"plan": sp_plan, "audit": sp_audit, "total": sp_do}
 
 
 @app.command("list")
 def cmd_list() -> None:
     data = {"actions": list_actions()}
-    typer.echo(json.dumps(data, indent=2))
+    typer.echo(serialize.dumps(data, pretty=True))
+
+
+def _read_batch(path: str) -> List[str]:
+    """Queries from NDJSON (`-`: stdin), one JSON string or {"query": ...} object per line."""
+    queries: List[str] = []
+    f = typer.get_text_stream("stdin") if path == "-" else open(path, "r", encoding="utf-8")
+    with f:
+        for n, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = serialize.loads(line)
+            except ValueError:
+                item = None
+            q = item.get("query") if isinstance(item, dict) else item
+            if not isinstance(q, str):
+                raise typer.BadParameter(
+                    f"{path}:{n}: expected a JSON string or an object with a \"query\" string")
+            queries.append(q)
+    return queries
 
 
 @app.command("plan")
 def cmd_plan(
-    query: str,
+    query: Optional[str] = typer.Argument(None),
     pretty: bool = typer.Option(False, "--pretty/--no-pretty"),
     json_out: bool = typer.Option(True, "--json/--no-json"),
+    compact: bool = typer.Option(False, "--compact",
+                                 help="Single-line JSON (for machine consumers)."),
+    batch: Optional[str] = typer.Option(
+        None, "--batch",
+        help="NDJSON file of queries (- for stdin): plan them all, one JSON line each."),
 ) -> None:
-    steps = plan_actions(query)
-    plan_dict = _steps_to_dict(steps)
-    audit_log(event="plan", query=query, plan=plan_dict)
+    if batch:
+        _plan_batch(batch, pretty, json_out)
+        return
+    if query is None:
+        raise typer.BadParameter("give a QUERY or --batch FILE")
+    with trace.span("plan_cmd", query=query):
+        with trace.span("plan") as sp_plan:
+            steps = plan_actions(query)
+        # Step dataclasses go straight to the encoder as {"name", "kwargs"} objects
+        audit_log(event="plan", query=query, plan=steps, **_timings(plan=sp_plan))
     if pretty:
-        show_plan(plan_dict)
+        show_plan(steps)
     if json_out and not pretty:
-        typer.echo(json.dumps({"plan": plan_dict}, indent=2))
+        typer.echo(serialize.dumps({"plan": steps}, pretty=not compact))
+
+
+def _plan_batch(path: str, pretty: bool, json_out: bool) -> None:
+    """Batch mode: plan_many over the file, one grouped audit record, one JSON line per query."""
+    queries = _read_batch(path)
+    with trace.span("plan_cmd", batch=path, queries=len(queries)):
+        with trace.span("plan") as sp_plan:
+            plans = plan_many(queries)
+        grouped: Dict[str, Dict[str, Any]] = {}
+        for q, steps in zip(queries, plans):
+            g = grouped.setdefault(q, {"query": q, "count": 0, "plan": steps})
+            g["count"] += 1
+        audit_log(event="plan_batch", source=path, queries=len(queries),
+                  plans=list(grouped.values()), **_timings(plan=sp_plan))
+    if pretty:
+        show_plans(queries, plans)
+    if json_out and not pretty and queries:
+        typer.echo("\n".join(serialize.dumps({"query": q, "plan": steps})
+                              for q, steps in zip(queries, plans)))
 
 
 @app.command("do")
@@ -52,25 +147,68 @@ def cmd_do(
         False, "--yes", help="Execute (otherwise dry-run)."),
     pretty: bool = typer.Option(False, "--pretty/--no-pretty"),
     json_out: bool = typer.Option(True, "--json/--no-json"),
+    targets: Optional[str] = typer.Option(
+        None, "--targets", help="File with one host per line: run the query on each."),
+    transport: str = typer.Option("local", "--transport", help="Fleet transport: local|ssh."),
+    concurrency: int = typer.Option(
+        fleet.DEFAULT_CONCURRENCY, "--concurrency", help="Max hosts in flight."),
+    stream: bool = typer.Option(
+        False, "--stream", help="Emit one NDJSON event per step start/finish as it happens."),
+    compact: bool = typer.Option(False, "--compact",
+                                 help="Single-line JSON (for machine consumers)."),
 ) -> None:
     dry_run = not yes
-    steps = plan_actions(query)
-    results: List[Dict[str, Any]] = []
-    for s in steps:
-        fn = RUNBOOKS.get(s.name)
-        if not fn:
-            results.append({"step": s.name, "ok": False,
-                           "error": "unknown_action"})
-            continue
-        out = fn(dry_run=dry_run, **s.kwargs)
-        results.append(
-            {"step": s.name, **(out if isinstance(out, dict) else {"ok": True})})
-    audit_log(event="do", query=query, dry_run=dry_run, results=results)
+    if targets:
+        _do_fleet(query, dry_run, targets, transport, concurrency, pretty, json_out)
+        return
+    ndjson = stream and json_out and not pretty
+
+    def _emit(ev: Dict[str, Any]) -> None:
+        if ndjson:
+            typer.echo(serialize.dumps(ev))
+        elif pretty:
+            show_step_event(ev, dry_run=dry_run)
+
+    results, spans = run_query(query, dry_run, _emit)
+    sp_plan, sp_audit, sp_do = spans["plan"], spans["audit"], spans["total"]
+    if ndjson:
+        _emit({"event": "done", "dry_run": dry_run, "ok": all(r.get("ok", True) for r in results),
+               "failed": [r["step"] for r in results if not r.get("ok", True)],
+               **_timings(plan=sp_plan, audit=sp_audit, total=sp_do)})
+        return
+    payload: Dict[str, Any] = {"dry_run": dry_run, "results": results}
+    payload.update(_timings(plan=sp_plan, audit=sp_audit, total=sp_do))
     if pretty:
         show_results(results, dry_run=dry_run)
     if json_out and not pretty:
-        typer.echo(json.dumps(
-            {"dry_run": dry_run, "results": results}, indent=2))
+        typer.echo(serialize.dumps(payload, pretty=not compact))
+
+
+def _do_fleet(query: str, dry_run: bool, targets: str, transport: str, concurrency: int,
+              pretty: bool, json_out: bool) -> None:
+    """Fleet mode: one compact JSON line per host as it finishes, then a summary line."""
+    if transport not in fleet.TRANSPORTS:
+        raise typer.BadParameter(
+            f"unknown transport '{transport}' (choose: {', '.join(fleet.TRANSPORTS)})")
+    hosts = fleet.read_targets(targets)
+
+    def _emit(res: Dict[str, Any]) -> None:
+        if json_out and not pretty:
+            typer.echo(serialize.dumps(res))
+        elif pretty:
+            status = "ok" if res.get("ok") else "FAILED"
+            typer.echo(f"{res['host']}: {status} ({res['latency_s']:.2f}s)")
+
+    host_results = fleet.run_fleet(hosts, query, dry_run=dry_run,
+                                   transport=fleet.TRANSPORTS[transport](),
+                                   concurrency=concurrency, on_result=_emit)
+    summary = fleet.aggregate(host_results)
+    audit_log(event="fleet_do", query=query, dry_run=dry_run, transport=transport,
+              concurrency=concurrency, summary=summary)
+    if pretty:
+        show_fleet(host_results, summary)
+    if json_out and not pretty:
+        typer.echo(serialize.dumps({"dry_run": dry_run, "summary": summary}))
 
 
 @app.command("call")
@@ -86,4 +224,29 @@ def cmd_call(
         show_refusal(cmd, res.get("reason", "unsafe"))
         return
     if json_out and not pretty:
-        typer.echo(json.dumps(res, indent=2))
+        typer.echo(serialize.dumps(res, pretty=True))
+
+
+@audit_app.command("export")
+def cmd_audit_export(
+    audit_dir: str = typer.Option(AUDIT_DIR, "--dir",
+                                  help="Directory holding audit-*.lab segments."),
+    since: Optional[float] = typer.Option(None, "--since", help="Unix ts: only records at/after."),
+    until: Optional[float] = typer.Option(None, "--until", help="Unix ts: only records at/before."),
+    event: Optional[List[str]] = typer.Option(None, "--event",
+                                              help="Only these events (repeatable)."),
+    out: Optional[str] = typer.Option(None, "--out", help="Write here instead of stdout."),
+) -> None:
+    """Convert binary audit segments back to JSONL records for existing tooling."""
+    if out:
+        with open(out, "wb") as f:
+            n = auditbin.export_jsonl(audit_dir, f, since=since, until=until, events=event)
+        typer.echo(f"exported {n} records to {out}", err=True)
+    else:
+        stream = typer.get_binary_stream("stdout")
+        auditbin.export_jsonl(audit_dir, stream, since=since, until=until, events=event)
+        stream.flush()
+
+
+if __name__ == "__main__":
+    app()
@@ -1,6 +1,8 @@
 # cli/ui.py
 from __future__ import annotations
-from typing import Any, Dict, List
+import os
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sized, Tuple
 
 # --- feature detection --------------------------------------------------------
 _USE_RICH = False
@@ -13,26 +15,91 @@ except Exception:
     _USE_RICH = False
 
 
-# --- ASCII fallback -----------------------------------------------------------
-def _ascii_table(title: str, headers: List[str], rows: List[List[str]]) -> str:
+# --- table policies -----------------------------------------------------------
+# Tables stream: column widths come from the header and a bounded prefix of rows, rows are
+# printed in chunks as they arrive, and later cells wider than their column are cut. A table
+# that fits in the prefix renders in one piece, exactly as before, with no MAX_CELL cap.
+SAMPLE_ROWS = int(os.getenv("LINOPS_UI_SAMPLE_ROWS", "200"))  # rows sampled for column widths
+CHUNK_ROWS = int(os.getenv("LINOPS_UI_CHUNK_ROWS", "100"))    # rows per flush after the prefix
+MAX_ROWS = int(os.getenv("LINOPS_UI_MAX_ROWS", "0"))          # 0: all; else the first N + a count
+PAGE_ROWS = int(os.getenv("LINOPS_UI_PAGE_ROWS", "0"))        # 0: one header; else one per N rows
+MAX_CELL = int(os.getenv("LINOPS_UI_MAX_CELL", "120"))        # widest column once streamed/paged
+
+
+def _fit(cell: str, width: int) -> str:
+    return cell if len(cell) <= width else cell[:max(0, width - 3)] + "..."
+
+
+def _limited(rows: Iterable[List[Any]], max_rows: int, omitted: List[int]) -> Iterator[List[str]]:
+    """Rows as strings, stopping after max_rows (0: no limit); counts the rest into omitted[0]."""
+    it = iter(rows)
+    for n, r in enumerate(it):
+        if max_rows and n >= max_rows:
+            omitted[0] = 1 + sum(1 for _ in it)
+            return
+        yield [str(x) for x in r]
+
+
+def _pages(rows: Iterator[List[str]], page_rows: int) -> Iterator[Tuple[bool, List[List[str]]]]:
+    """(new_page, chunk): the sampled prefix, then CHUNK_ROWS at a time, split at page breaks."""
+    n = 0
+    size = SAMPLE_ROWS
+    while True:
+        if page_rows:
+            size = min(size, page_rows - n % page_rows)
+        chunk = list(islice(rows, max(1, size)))
+        if not chunk:
+            return
+        yield n == 0 or bool(page_rows and n % page_rows == 0), chunk
+        n += len(chunk)
+        size = CHUNK_ROWS
+
+
+def _widths(headers: List[str], sample: List[List[str]], total: Optional[int] = None,
+            cap: bool = True) -> List[int]:
+    """Column widths from the sampled rows; all-digit columns (row numbers) also fit
+    len(str(total)). With cap, no column is wider than MAX_CELL (or its header)."""
     cols = [len(h) for h in headers]
-    for r in rows:
+    for r in sample:
         for i, c in enumerate(r):
-            cols[i] = max(cols[i], len(str(c)))
-    bar = "+".join("-" * (w + 2) for w in cols)
+            cols[i] = max(cols[i], len(c))
+    if total and sample:
+        for i in range(len(cols)):
+            if all(r[i].isdigit() for r in sample):
+                cols[i] = max(cols[i], len(str(total)))
+    if not cap:
+        return cols
+    return [min(w, max(MAX_CELL, len(h))) for w, h in zip(cols, headers)]
+
+
+# --- ASCII fallback -----------------------------------------------------------
+def _ascii_chunks(title: str, headers: List[str], pages: Iterator[Tuple[bool, List[List[str]]]],
+                  total: Optional[int] = None) -> Iterator[str]:
+    cols: List[int] = []
+    bar = ""
 
     def fmt(cells: List[str]) -> str:
-        return "|".join(" " + str(cells[i]).ljust(cols[i]) + " " for i in range(len(cols)))
-    out: List[str] = []
-    if title:
-        out.append(f"\n{title}")
-    out.append(bar)
-    out.append(fmt(headers))
-    out.append(bar)
-    for r in rows:
-        out.append(fmt([str(x) for x in r]))
-    out.append(bar)
-    return "\n".join(out) + "\n"
+        return "|".join(" " + _fit(cells[i], cols[i]).ljust(cols[i]) + " "
+                        for i in range(len(cols)))
+    # look one chunk ahead: only a table that doesn't fit in the sampled prefix gets MAX_CELL
+    head = list(islice(pages, 2))
+    streamed = len(head) > 1
+    for new_page, chunk in chain(head, pages):
+        out: List[str] = []
+        if not cols:
+            cols = _widths(headers, chunk, total, cap=streamed)
+            bar = "+".join("-" * (w + 2) for w in cols)
+            if title:
+                out.append(f"\n{title}")
+        if new_page:
+            out += [bar, fmt(headers), bar]
+        out += [fmt(r) for r in chunk]
+        yield "\n".join(out) + "\n"
+    if not cols:  # no rows at all
+        cols = _widths(headers, [])
+        bar = "+".join("-" * (w + 2) for w in cols)
+        yield "\n".join(([f"\n{title}"] if title else []) + [bar, fmt(headers), bar]) + "\n"
+    yield bar + "\n"
 
 
 # --- Rich render (captured to plain text so it always shows) ------------------
@@ -40,18 +107,47 @@ _console: Any = None
 if _USE_RICH:
     _console = Console(force_terminal=True, soft_wrap=True)
 
+_ROW_RULE = str.maketrans({"┌": "├", "┬": "┼", "┐": "┤"})
 
-def _rich_table(title: str, headers: List[str], rows: List[List[str]]) -> str:
-    table = Table(title=title, show_header=True, show_lines=True)
-    for h in headers:
-        table.add_column(h)
+
+def _rich_table(title: str, headers: List[str], rows: List[List[str]],
+                widths: Optional[List[int]] = None, header: bool = True) -> str:
+    table = Table(title=title or None, show_header=header, show_lines=True)
+    for i, h in enumerate(headers):
+        if widths:
+            table.add_column(h, width=widths[i], no_wrap=True, overflow="ellipsis")
+        else:
+            table.add_column(h)
     for r in rows:
-        table.add_row(*[str(x) for x in r])
+        table.add_row(*r)
     with _console.capture() as cap:  # type: ignore[attr-defined]
         _console.print(table)        # type: ignore[attr-defined]
     return cap.get()
 
 
+def _rich_chunks(title: str, headers: List[str], pages: Iterator[Tuple[bool, List[List[str]]]],
+                 total: Optional[int] = None) -> Iterator[str]:
+    first = next(pages, None)
+    rest = next(pages, None)
+    if first is None or rest is None:  # fits in the sampled prefix: one table, sized by rich
+        yield _rich_table(title, headers, first[1] if first else [])
+        return
+    # one fixed-width table per chunk, stitched: a continuation chunk's top border becomes a
+    # row rule, and each chunk's bottom border is held back until we know it's the last
+    widths = _widths(headers, first[1], total)
+    held = ""
+    for k, (new_page, chunk) in enumerate(chain([first, rest], pages)):
+        text = _rich_table("" if k else title, headers, chunk, widths, header=new_page)
+        lines = text.splitlines(True)
+        if held and not new_page:
+            lines[0] = lines[0].translate(_ROW_RULE)
+        else:
+            lines.insert(0, held)
+        held = lines.pop()
+        yield "".join(lines)
+    yield held
+
+
 def _rich_panel(text: str) -> str:
     panel = Panel.fit(text)
     with _console.capture() as cap:  # type: ignore[attr-defined]
@@ -60,11 +156,19 @@ def _rich_panel(text: str) -> str:
 
 
 # --- unified printers ---------------------------------------------------------
-def _print_table(title: str, headers: List[str], rows: List[List[str]]) -> None:
-    if _USE_RICH:
-        print(_rich_table(title, headers, rows), end="", flush=True)
-    else:
-        print(_ascii_table(title, headers, rows), end="", flush=True)
+def _print_table(title: str, headers: List[str], rows: Iterable[List[Any]],
+                 total: Optional[int] = None, max_rows: Optional[int] = None,
+                 page_rows: Optional[int] = None) -> None:
+    """Print rows as they come (total: row count, if known); max_rows/page_rows default to
+    MAX_ROWS/PAGE_ROWS."""
+    omitted = [0]
+    pages = _pages(_limited(rows, MAX_ROWS if max_rows is None else max_rows, omitted),
+                   PAGE_ROWS if page_rows is None else page_rows)
+    for text in (_rich_chunks if _USE_RICH else _ascii_chunks)(title, headers, pages, total):
+        print(text, end="", flush=True)
+    if omitted[0]:
+        print(f"... {omitted[0]} more row(s) not shown (LINOPS_UI_MAX_ROWS=0 shows all)",
+              flush=True)
 
 
 def _print_panel(text: str) -> None:
@@ -74,26 +178,68 @@ def _print_panel(text: str) -> None:
         print("\n" + text + "\n", end="", flush=True)
 
 
+def _len(items: Iterable[Any]) -> Optional[int]:
+    return len(items) if isinstance(items, Sized) else None
+
+
 # --- public helpers -----------------------------------------------------------
-def show_plan(plan: List[Dict[str, Any]]) -> None:
-    rows: List[List[str]] = []
-    for i, s in enumerate(plan, start=1):
-        rows.append([str(i), s.get("name", ""),
-                    repr(s.get("kwargs", {}) or {})])
-    _print_table("Planned Runbook", ["#", "Step", "Args"], rows)
+def show_plan(plan: Iterable[Any]) -> None:
+    def rows() -> Iterator[List[str]]:
+        for i, s in enumerate(plan, start=1):
+            if not isinstance(s, dict):  # planner Step
+                s = {"name": s.name, "kwargs": s.kwargs}
+            yield [str(i), s.get("name", ""), repr(s.get("kwargs", {}) or {})]
+    _print_table("Planned Runbook", ["#", "Step", "Args"], rows(), total=_len(plan))
+
 
+def show_plans(queries: List[str], plans: List[List[Any]]) -> None:
+    """A batch of plans (plan --batch): one row per query."""
+    def rows() -> Iterator[List[str]]:
+        for i, (q, steps) in enumerate(zip(queries, plans), start=1):
+            names = (s.get("name", "") if isinstance(s, dict) else s.name for s in steps)
+            yield [str(i), q, ", ".join(names)]
+    _print_table("Planned Runbooks (batch)", ["#", "Query", "Steps"], rows(), total=len(queries))
 
-def show_results(results: List[Dict[str, Any]], dry_run: bool) -> None:
+
+def show_results(results: Iterable[Dict[str, Any]], dry_run: bool) -> None:
     title = "Execution (dry-run)" if dry_run else "Execution (applied)"
-    rows: List[List[str]] = []
-    for i, r in enumerate(results, start=1):
-        step = r.get("step", "")
-        ok = "true" if r.get("ok", True) else "false"
-        mode = "preview" if dry_run or r.get("dry_run") else "exec"
-        note = r.get("msg") or r.get("error") or r.get(
-            "stderr", "") or r.get("stdout", "")
-        rows.append([str(i), step, ok, mode, (note or "")[-120:]])
-    _print_table(title, ["#", "Step", "OK", "Mode", "Note"], rows)
+
+    def rows() -> Iterator[List[str]]:
+        for i, r in enumerate(results, start=1):
+            step = r.get("step", "")
+            ok = "true" if r.get("ok", True) else "false"
+            mode = "preview" if dry_run or r.get("dry_run") else "exec"
+            note = r.get("msg") or r.get("error") or r.get(
+                "stderr", "") or r.get("stdout", "")
+            yield [str(i), step, ok, mode, (note or "")[-120:]]
+    _print_table(title, ["#", "Step", "OK", "Mode", "Note"], rows(), total=_len(results))
+
+
+def show_step_event(ev: Dict[str, Any], dry_run: bool) -> None:
+    """One progress line per step start/finish, printed as it happens (before the final table)."""
+    kind = ev.get("event")
+    if kind == "step_start":
+        print(f"[{ev['index']}/{ev['of']}] {ev['step']} ...", flush=True)
+    elif kind == "step_finish":
+        status = "ok" if ev.get("ok", True) else "FAILED"
+        res = ev.get("result", {})
+        mode = "preview" if dry_run or res.get("dry_run") else "exec"
+        note = res.get("error") or res.get("msg") or ""
+        line = f"[{ev['index']}/{ev['of']}] {ev['step']} {status} ({mode}, {ev['elapsed_s']:.2f}s)"
+        print(f"{line} {note[-80:]}".rstrip(), flush=True)
+
+
+def show_fleet(host_results: List[Dict[str, Any]], summary: Dict[str, Any]) -> None:
+    def rows() -> Iterator[List[str]]:
+        for r in sorted(host_results, key=lambda r: r.get("host", "")):
+            failed = [s.get("step", "") for s in r.get("results", []) if not s.get("ok", True)]
+            note = ", ".join(failed) or r.get("error") or ""
+            yield [r.get("host", ""), "true" if r.get("ok") else "false",
+                   f"{r.get('latency_s', 0):.2f}s", note[-120:]]
+    lat = summary.get("latency_s", {})
+    title = (f"Fleet: {summary.get('ok', 0)}/{summary.get('hosts', 0)} ok  "
+             f"p50={lat.get('p50')}s p99={lat.get('p99')}s")
+    _print_table(title, ["Host", "OK", "Latency", "Failed steps / error"], rows())
 
 
 def show_refusal(cmd: str, reason: str) -> None:
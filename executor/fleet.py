@@ -0,0 +1,173 @@
+# Fleet execution: run the same `do` query on many hosts, bounded concurrency, streamed results.
+#
+#   python -m cli.main do "check_cpu_mem" --targets hosts.txt --transport ssh --concurrency 32
+#
+# A transport turns (host, query, dry_run) into one per-host result by running `cli.main do`
+# there and parsing its JSON. "local" runs it in a subprocess on this machine (a stand-in host;
+# LINOPS_HOST tells it which one), "ssh" runs it over `ssh <host>`. Results are handed to a
+# callback as each host finishes, then aggregated: which hosts failed which steps, latency pcts.
+
+import os
+import shlex
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from utils import metrics, serialize, trace
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_HOST_TIMEOUT_S = 300.0
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read_targets(path: str) -> List[str]:
+    """One host per line; blank lines and # comments ignored, duplicates dropped (order kept)."""
+    hosts: List[str] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            h = line.split("#", 1)[0].strip()
+            if h and h not in hosts:
+                hosts.append(h)
+    return hosts
+
+
+def _do_argv(query: str, dry_run: bool) -> List[str]:
+    return ["-m", "cli.main", "do", query, "--json", "--no-pretty"] + ([] if dry_run else ["--yes"])
+
+
+def _tail_line(text: str, limit: int = 200) -> str:
+    """Last non-blank line of text (where ssh and tracebacks put the cause), capped."""
+    lines = [ln.strip() for ln in (text or "").splitlines() if ln.strip()]
+    return lines[-1][-limit:] if lines else ""
+
+
+class Transport:
+    name = ""
+    cwd: Optional[str] = None
+
+    def command(self, host: str, query: str, dry_run: bool) -> List[str]:
+        raise NotImplementedError
+
+    def env(self, host: str) -> Optional[Dict[str, str]]:
+        return None
+
+    def run(self, host: str, query: str, dry_run: bool,
+            timeout_s: float = DEFAULT_HOST_TIMEOUT_S) -> Dict[str, Any]:
+        """Run `do` on host; {host, ok, rc, latency_s, results | error}. Never raises."""
+        t0 = time.perf_counter()
+        metrics.SPAWNS.labels(runner=f"fleet_{self.name}").inc()
+        try:
+            p = subprocess.run(self.command(host, query, dry_run), env=self.env(host), cwd=self.cwd,
+                               text=True, capture_output=True, timeout=timeout_s, check=False)
+        except subprocess.TimeoutExpired:
+            return {"host": host, "ok": False, "rc": None, "error": f"timeout after {timeout_s}s",
+                    "latency_s": round(time.perf_counter() - t0, 3)}
+        except OSError as e:
+            return {"host": host, "ok": False, "rc": None, "error": repr(e),
+                    "latency_s": round(time.perf_counter() - t0, 3)}
+        out: Dict[str, Any] = {"host": host, "rc": p.returncode,
+                               "latency_s": round(time.perf_counter() - t0, 3)}
+        try:
+            payload = serialize.loads(p.stdout) if p.stdout.strip() else None
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            # no JSON from `do`: if the command failed (ssh unreachable, agent missing ...) say so
+            if p.returncode != 0 or not p.stdout.strip():
+                error = f"rc={p.returncode}: {_tail_line(p.stderr) or 'no output'}"
+            else:
+                error = "unparseable output"
+            out.update(ok=False, error=error, stderr=p.stderr[-500:])
+            return out
+        results = payload.get("results", [])
+        out["results"] = results
+        out["ok"] = p.returncode == 0 and all(r.get("ok", True) for r in results)
+        return out
+
+
+class LocalTransport(Transport):
+    """Stand-in host: run cli.main in a local subprocess (what a remote agent would run)."""
+    name = "local"
+
+    def __init__(self, python: str = sys.executable, cwd: str = REPO_ROOT):
+        self.python, self.cwd = python, cwd
+
+    def command(self, host: str, query: str, dry_run: bool) -> List[str]:
+        return [self.python] + _do_argv(query, dry_run)
+
+    def env(self, host: str) -> Optional[Dict[str, str]]:
+        return {**os.environ, "LINOPS_HOST": host}
+
+
+class SSHTransport(Transport):
+    """Run cli.main on the host over ssh (BatchMode: never prompt; fail fast instead)."""
+    name = "ssh"
+
+    def __init__(self,
+                 ssh: Sequence[str] = ("ssh", "-o", "BatchMode=yes", "-o", "ConnectTimeout=10"),
+                 remote_dir: Optional[str] = None, python: Optional[str] = None):
+        self.ssh = list(ssh)
+        self.remote_dir = remote_dir or os.getenv("LINOPS_REMOTE_DIR", "ai-ops-agent")
+        self.python = python or os.getenv("LINOPS_REMOTE_PYTHON", "python3")
+
+    def command(self, host: str, query: str, dry_run: bool) -> List[str]:
+        remote = " ".join(shlex.quote(a) for a in [self.python] + _do_argv(query, dry_run))
+        return self.ssh + [host, f"cd {shlex.quote(self.remote_dir)} && {remote}"]
+
+
+TRANSPORTS: Dict[str, Callable[[], Transport]] = {
+    "local": LocalTransport,
+    "ssh": SSHTransport,
+}
+
+
+def run_fleet(hosts: Iterable[str], query: str, dry_run: bool = True,
+              transport: Optional[Transport] = None, concurrency: int = DEFAULT_CONCURRENCY,
+              timeout_s: float = DEFAULT_HOST_TIMEOUT_S,
+              on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+    """
+    Run `query` on every host with at most `concurrency` in flight. on_result(res) is called
+    from this thread as each host finishes (completion order); returns all results.
+    """
+    transport = transport or LocalTransport()
+    hosts = list(hosts)
+    done: List[Dict[str, Any]] = []
+    with trace.span("fleet", query=query, hosts=len(hosts), transport=transport.name):
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(hosts) or 1))) as pool:
+            futs = [pool.submit(transport.run, h, query, dry_run, timeout_s) for h in hosts]
+            for fut in as_completed(futs):
+                res = fut.result()
+                done.append(res)
+                if on_result is not None:
+                    on_result(res)
+    return done
+
+
+def _pct(sorted_vals: List[float], q: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    return sorted_vals[min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))]
+
+
+def aggregate(host_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fleet summary: failed hosts, {step: [hosts where it failed]}, latency percentiles."""
+    failed_steps: Dict[str, List[str]] = {}
+    failed_hosts: Dict[str, str] = {}
+    for r in host_results:
+        if not r.get("ok"):
+            failed_hosts[r["host"]] = r.get("error") or "step failed"
+        for s in r.get("results", []):
+            if not s.get("ok", True):
+                failed_steps.setdefault(s.get("step", "?"), []).append(r["host"])
+    lat = sorted(r["latency_s"] for r in host_results if r.get("latency_s") is not None)
+    return {
+        "hosts": len(host_results),
+        "ok": len(host_results) - len(failed_hosts),
+        "failed": len(failed_hosts),
+        "failed_hosts": dict(sorted(failed_hosts.items())),
+        "failed_steps": {k: sorted(v) for k, v in sorted(failed_steps.items())},
+        "latency_s": {"p50": _pct(lat, 0.50), "p90": _pct(lat, 0.90), "p99": _pct(lat, 0.99),
+                      "max": lat[-1] if lat else None},
+    }
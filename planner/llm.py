@@ -7,6 +7,7 @@ from runbooks.catalog import RUNBOOKS
 from utils.audit import audit_log
 
 MAX_LLM_STEPS = 5
+LLM_BATCH_SIZE = int(os.getenv("LINOPS_LLM_BATCH_SIZE", "20"))  # queries per batched prompt
 
 
 def llm_enabled() -> bool:
@@ -33,3 +34,17 @@ def llm_plan(query: str) -> Optional[List[Dict[str, Any]]]:
         return None
     audit_log(event="llm_plan_skipped_placeholder", query=query)
     return None
+
+
+def llm_plan_many(queries: List[str]) -> Dict[str, Optional[List[Dict[str, Any]]]]:
+    """llm_plan for many queries: one prompt (and one audit record) per LLM_BATCH_SIZE queries."""
+    out: Dict[str, Optional[List[Dict[str, Any]]]] = {q: None for q in queries}
+    if not queries:
+        return out
+    if not llm_enabled():
+        audit_log(event="llm_plan_unconfigured", queries=list(queries))
+        return out
+    size = max(1, LLM_BATCH_SIZE)
+    for i in range(0, len(queries), size):
+        audit_log(event="llm_plan_skipped_placeholder", queries=list(queries[i:i + size]))
+    return out
@@ -1,10 +1,10 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Sequence
 
 from runbooks.catalog import RUNBOOKS
-from planner.llm import llm_plan
+from planner.llm import llm_plan, llm_plan_many
 
 
 @dataclass(frozen=True)
@@ -13,13 +13,17 @@ class Step:
     kwargs: Dict[str, Any]
 
 
-def _rules_plan(q: str) -> List[Step]:
+def _normalize(query: Optional[str]) -> str:
+    return " ".join((query or "").lower().split())
+
+
+def _rules_plan(q: str, names: Optional[Sequence[str]] = None) -> List[Step]:
     if "web" in q and any(tok in q for tok in ("crash", "down", "restart", "verify")):
         return [Step("heal_fakesvc_8080", {})]
     if "free" in q and "disk" in q and ("cpu" in q or "mem" in q):
         return [Step("free_disk", {}), Step("check_cpu_mem", {})]
     steps: List[Step] = []
-    for name in RUNBOOKS.keys():
+    for name in RUNBOOKS.keys() if names is None else names:
         if name in q:
             steps.append(Step(name, {}))
     return steps
@@ -30,7 +34,7 @@ def _safe_default() -> List[Step]:
 
 
 def plan_actions(query: str, mode: str = "auto") -> List[Step]:
-    q = (query or "").lower().strip()
+    q = _normalize(query)
 
     if mode in {"rules", "auto"}:
         ruled = _rules_plan(q)
@@ -46,6 +50,30 @@ def plan_actions(query: str, mode: str = "auto") -> List[Step]:
     return fallback if fallback else _safe_default()
 
 
+def plan_many(queries: Sequence[str], mode: str = "auto") -> List[List[Step]]:
+    """plan_actions for a burst of queries, in input order.
+
+    Identical normalized queries are planned once, the rules run over the distinct queries in
+    one pass, and whatever they leave unresolved goes to the LLM in batched prompts.
+    """
+    normalized = [_normalize(q) for q in queries]
+    distinct = list(dict.fromkeys(normalized))
+    names = tuple(RUNBOOKS.keys())
+    ruled = {q: _rules_plan(q, names) for q in distinct}
+    plans: Dict[str, List[Step]] = {}
+    if mode in {"rules", "auto"}:
+        plans = {q: steps for q, steps in ruled.items() if steps}
+    if mode in {"llm", "auto"}:
+        proposed = llm_plan_many([q for q in distinct if q not in plans])
+        for q, steps in proposed.items():
+            if steps:
+                plans[q] = [Step(x["name"], x.get("kwargs", {})) for x in steps]
+    for q in distinct:
+        if q not in plans:
+            plans[q] = ruled[q] or _safe_default()
+    return [list(plans[q]) for q in normalized]
+
+
 def plan(query: str, mode: str = "auto") -> Dict[str, Any]:
     steps = plan_actions(query, mode=mode)
     primary = steps[0] if steps else None
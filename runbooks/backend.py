@@ -0,0 +1,43 @@
+# Where ops runbooks execute: "local" runs runbooks/ops.py in this process (the agent is on the
+# host it fixes: no container cold start, no network), "modal" calls the same function deployed
+# in the Modal app (apps/modal_app.py). Both take the same kwargs and return the same dicts.
+
+import os
+
+from runbooks.catalog import OPS_RUNBOOKS, RUNBOOKS
+from utils import trace
+
+BACKENDS = ("local", "modal")
+BACKEND = os.getenv("LINOPS_OPS_BACKEND", "modal")
+OPS_APP = os.getenv("OPS_APP", "ops-agent")
+
+
+def call_local(fn_name: str, **kwargs):
+    """Run fn_name in-process: an ops runbook, else a registry runbook."""
+    import runbooks.ops  # noqa: F401  (populate OPS_RUNBOOKS)
+    fn = OPS_RUNBOOKS.get(fn_name)
+    if fn is None:
+        import runbooks.system  # noqa: F401  (populate registry)
+        fn = RUNBOOKS[fn_name]
+    with trace.span("op_local", fn=fn_name):
+        return fn(**kwargs)
+
+
+def call_modal(fn_name: str, app: str = OPS_APP, **kwargs):
+    """
+    Call the function deployed in the Modal app `app`.
+    We use Function.from_name(...).remote(...) which works in Modal 1.x.
+    """
+    import modal
+    with trace.span("remote", app=app, fn=fn_name):
+        return modal.Function.from_name(app, fn_name).remote(**kwargs)
+
+
+def call(fn_name: str, backend: str | None = None, app: str = OPS_APP, **kwargs):
+    """Run an ops runbook on `backend` (default LINOPS_OPS_BACKEND)."""
+    backend = backend or BACKEND
+    if backend == "local":
+        return call_local(fn_name, **kwargs)
+    if backend == "modal":
+        return call_modal(fn_name, app=app, **kwargs)
+    raise ValueError(f"unknown backend '{backend}' (choose: {', '.join(BACKENDS)})")
@@ -6,6 +6,10 @@ from typing import Callable, Dict, Any
 # global map: action name -> function
 RUNBOOKS: Dict[str, Callable[..., Any]] = {}
 
+# host ops runbooks (runbooks/ops.py): run in-process or in the Modal app, see runbooks/backend.py.
+# Kept apart from RUNBOOKS because the planner matches those names and CLI steps pass dry_run.
+OPS_RUNBOOKS: Dict[str, Callable[..., Any]] = {}
+
 
 def register(name: str | None = None):
     """
@@ -20,6 +24,14 @@ def register(name: str | None = None):
     return _wrap
 
 
+def register_op(name: str | None = None):
+    """Like register, for the host ops runbooks (OPS_RUNBOOKS)."""
+    def _wrap(fn: Callable[..., Any]):
+        OPS_RUNBOOKS[name or fn.__name__] = fn
+        return fn
+    return _wrap
+
+
 def list_actions() -> list[str]:
     """Helper to list actions in a stable (sorted) order."""
     return sorted(RUNBOOKS.keys())
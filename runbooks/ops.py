@@ -0,0 +1,567 @@
+# Host ops runbooks: the disk/service/package/log/shell actions the auto-healer and the Modal
+# app run. Plain functions registered in OPS_RUNBOOKS (runbooks/catalog.py), so they run the same
+# in-process on the host being fixed (runbooks/backend.py, backend "local") or inside the Modal
+# container (apps/modal_app.py wraps each one in an @app.function).
+
+import json
+import os
+import platform
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from runbooks.catalog import register_op
+from utils import db, initsys, logmine, logtail, metrics, pkgqueue, probe, shparse, spawnsrv
+from utils.redact import redact
+from utils.shparse import Segment
+
+# shell helpers
+
+# Exec plain argv-only commands directly instead of through a login bash (see shparse.direct_argv)
+DIRECT_EXEC = os.getenv("LINOPS_DIRECT_EXEC", "1") != "0"
+
+
+def sh(cmd: str) -> dict:
+    """
+    Run a shell command under the default LINOPS_CMD_* budget; return {rc, out_tail, timed_out,
+    rusage} for logs/UI. Simple commands skip bash.
+    """
+    env = os.environ.copy()
+    env.update(
+        {
+            "LC_ALL": "C",
+            "LANG": "C",
+            "HOME": "/root",
+            "PATH": "/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin",
+            "UMASK": "077",
+        }
+    )
+    metrics.SPAWNS.labels(runner="sh").inc()
+    argv = shparse.direct_argv(cmd, path=env["PATH"]) if DIRECT_EXEC else None
+    p = spawnsrv.run(argv or ["bash", "-lc", cmd], env=env)
+    out = redact((p.stdout or "") + (("\n" + p.stderr) if p.stderr else ""))
+    tail = out[-2000:] if out else ""
+    return {"rc": p.returncode, "out_tail": tail, "timed_out": p.timed_out, "rusage": p.rusage}
+
+
+def with_cmd(cmd: str, res: Dict[str, Any]) -> Dict[str, Any]:
+    """Attach the command to its result for consistent logs."""
+    return {"cmd": cmd, **res}
+
+
+# Existing basics
+
+
+@register_op()
+def hello() -> str:
+    return f"Hello from {platform.node() or 'this host'} 👋 ({platform.system()})."
+
+
+@register_op()
+def install_sql() -> str:
+    PKG_QUEUE.install(["postgresql", "postgresql-contrib"])
+    return "PostgreSQL installed.\n" + json.dumps(sh("psql --version || true"), indent=2)
+
+
+@register_op()
+def free_disk(dry_run: bool = True, aggressive: bool = False) -> dict:
+    """Free disk space; return bytes reclaimed estimate (best effort)."""
+    before = sh("df -P --output=used / | tail -1").get("out_tail", "0").strip()
+    ops = []
+    ops.append("apt-get clean")
+    ops.append("rm -rf /var/cache/apt/archives/* || true")
+    ops.append("journalctl --vacuum-time=1d || true")
+    ops.append("find /var/log -type f -name '*.log' -size +5M -delete || true")
+    if aggressive:
+        ops.append(
+            "find /tmp -mindepth 1 -maxdepth 1 -type f -mtime +1 -delete || true")
+        ops.append(
+            "find /var/tmp -mindepth 1 -maxdepth 1 -type f -mtime +1 -delete || true")
+    if dry_run:
+        return {"dry_run": True, "would_run": ops}
+    for c in ops:
+        sh(c)
+    after = sh("df -P --output=used / | tail -1").get("out_tail", "0").strip()
+    return {"dry_run": False, "steps": ops, "before_used": before, "after_used": after}
+
+
+# how long restart_service keeps polling before declaring the service down
+RESTART_VERIFY_TIMEOUT_S = float(os.getenv("RESTART_VERIFY_TIMEOUT_S", "10"))
+
+
+@register_op()
+def restart_service(name: str) -> dict:
+    """
+    Restart via the detected init system only (stop at the first command that succeeds),
+    then poll the process (and HTTP 200 on localhost for nginx) with backoff.
+    Falls back to an explicit start, then a direct launch, if it is still down.
+    """
+    steps: List[Dict[str, Any]] = []
+    timings: Dict[str, float] = {}
+
+    def runstep(cmd: str):
+        res = sh(cmd)
+        steps.append(with_cmd(cmd, res))
+        return res
+
+    def run_first_ok(cmds: List[str]) -> bool:
+        return any(runstep(c)["rc"] == 0 for c in cmds)
+
+    def phase(key: str, t0: float) -> None:
+        timings[key] = round(time.perf_counter() - t0, 3)
+
+    t = time.perf_counter()
+    init = initsys.detect_init_system()
+    phase("detect_s", t)
+
+    # 1) Restart through the one mechanism this host actually has
+    t = time.perf_counter()
+    restarted = run_first_ok(initsys.service_cmds(init, name, "restart"))
+    phase("restart_s", t)
+
+    # 2) Verify process; if still down, try explicit start, then a direct launcher.
+    #    A failed restart gets a single check: there is nothing to wait for.
+    t = time.perf_counter()
+    verify = probe.wait_until(lambda: probe.process_running(name),
+                              timeout_s=RESTART_VERIFY_TIMEOUT_S if restarted else 0)
+    phase("verify_process_s", t)
+
+    if not verify["ok"]:
+        t = time.perf_counter()
+        if not run_first_ok(initsys.service_cmds(init, name, "start")):
+            runstep(initsys.direct_launch_cmd(name))
+        phase("start_s", t)
+        t = time.perf_counter()
+        verify = probe.wait_until(lambda: probe.process_running(name),
+                                  timeout_s=RESTART_VERIFY_TIMEOUT_S)
+        phase("reverify_process_s", t)
+    is_running = verify["ok"]
+
+    http_ok = False
+    if name == "nginx" and is_running:
+        t = time.perf_counter()
+        http = probe.wait_until(lambda: probe.http_status("http://127.0.0.1/") == 200,
+                                timeout_s=RESTART_VERIFY_TIMEOUT_S)
+        http_ok = http["ok"]
+        phase("verify_http_s", t)
+
+    ok = is_running and (http_ok if name == "nginx" else True)
+    return {
+        "ok": ok,
+        "verified_running": is_running,
+        "http_ok": http_ok if name == "nginx" else None,
+        "init_system": init,
+        "timings": timings,
+        "steps": steps,
+    }
+
+
+# runbooks
+
+# minimal allowlist for safety
+PKG_ALLOW = {
+    "nginx", "postgresql", "postgresql-contrib",
+    "redis", "htop", "curl", "vim", "jq", "python3", "git",
+    "mysql-server", "mariadb-server"
+}
+# installs in this process share one queue: concurrent calls become one apt transaction and
+# the index is refreshed at most every LINOPS_APT_INDEX_MAX_AGE_S (see utils/pkgqueue.py)
+PKG_QUEUE = pkgqueue.PackageQueue(run=sh, allow=PKG_ALLOW)
+
+
+@register_op()
+def install_package(pkg: str) -> dict:
+    """Generic apt install with minimal allowlist for safety."""
+    if pkg not in PKG_ALLOW:
+        return {"ok": False, "reason": f"'{pkg}' not in allowlist", "allow": sorted(PKG_ALLOW)}
+    res = PKG_QUEUE.install([pkg])
+    steps = res["steps"] + [with_cmd(f"{pkg} --version || which {pkg} || true",
+                                     sh(f"{pkg} --version || which {pkg} || true"))]
+    return {"ok": res["ok"], "pkg": pkg, "status": res["packages"][pkg], "batch": res["batch"],
+            "steps": steps}
+
+
+@register_op()
+def install_packages(pkgs: List[str]) -> dict:
+    """Install several allowlisted packages in one apt transaction; per-package status."""
+    return PKG_QUEUE.install(pkgs)
+
+
+@register_op()
+def tail_logs(path: str, lines: int = 50, cursor: Optional[str] = None,
+              summarize: bool = False) -> dict:
+    """
+    Return last N lines from a file in safe paths, plus an opaque cursor.
+    Pass the cursor back to get only the lines appended since (handles rotation/truncation).
+    summarize=True adds ranked log templates (counts, first/last ts, samples) for the window.
+    """
+    SAFE_PREFIXES = ("/var/log", "/tmp", "/var/tmp")
+    if not any(path.startswith(p) for p in SAFE_PREFIXES):
+        return {"ok": False, "reason": "path not allowed", "safe_prefixes": SAFE_PREFIXES}
+    try:
+        res = logtail.follow(path, cursor=cursor, lines=int(lines))
+    except OSError as e:
+        return {"ok": False, "path": path, "reason": f"read failed: {e.strerror or e!r}"}
+    out = {
+        "ok": True,
+        "path": path,
+        "lines": lines,
+        "content_tail": res["content"],
+        "cursor": res["cursor"],
+        "rotated": res.get("rotated", False),
+        "truncated": res.get("truncated", False),
+    }
+    if summarize:
+        out["summary"] = logmine.mine_text(res["content"])
+    return out
+
+
+@register_op()
+def check_cpu_mem(top_n: int = 5) -> dict:
+    """
+    Robust CPU/mem snapshot for short-lived containers:
+    - CPU: sample /proc/stat twice and compute delta usage %
+    - Mem: parse /proc/meminfo (kB) -> MB integers
+    - Top: ps aux (top N by CPU)
+    """
+    def read_proc_stat():
+        out = sh("cat /proc/stat | head -n 1")["out_tail"].strip()
+        parts = out.split()
+        if len(parts) < 8 or parts[0] != "cpu":
+            return None
+        try:
+            vals = list(map(int, parts[1:8]))
+            idle = vals[3] + vals[4]
+            total = sum(vals)
+            return total, idle
+        except Exception:
+            return None
+
+    s1 = read_proc_stat()
+    sh("sleep 0.2")  # keep tiny for Modal speed
+    s2 = read_proc_stat()
+
+    cpu_percent = 0
+    if s1 and s2:
+        total1, idle1 = s1
+        total2, idle2 = s2
+        d_total = max(1, total2 - total1)
+        d_idle = max(0, idle2 - idle1)
+        used = max(0, d_total - d_idle)
+        cpu_percent = int((used * 100) / d_total)
+
+    meminfo = sh("cat /proc/meminfo | sed -n '1,5p'")["out_tail"]
+    mem_total_kb = 0
+    mem_available_kb = 0
+    for line in meminfo.splitlines():
+        if line.startswith("MemTotal:"):
+            try:
+                mem_total_kb = int(line.split()[1])
+            except Exception:
+                pass
+        elif line.startswith("MemAvailable:"):
+            try:
+                mem_available_kb = int(line.split()[1])
+            except Exception:
+                pass
+    mem_used_mb = 0
+    mem_total_mb = 0
+    if mem_total_kb > 0:
+        mem_total_mb = mem_total_kb // 1024
+        mem_used_mb = max(0, (mem_total_kb - mem_available_kb) // 1024)
+
+    top_n = max(1, int(top_n))
+    top_out = sh(f"ps aux --sort=-%cpu | head -n {top_n + 1}")["out_tail"]
+
+    return {
+        "cpu_percent": int(cpu_percent),
+        "mem_used_mb": int(mem_used_mb),
+        "mem_total_mb": int(mem_total_mb),
+        "top": top_out,
+    }
+
+
+@register_op()
+def fix_apt_lock() -> dict:
+    """Common apt/dpkg lock fix sequence."""
+    steps = [
+        with_cmd("fuser -vki /var/lib/dpkg/lock-frontend || true",
+                 sh("fuser -vki /var/lib/dpkg/lock-frontend || true")),
+        with_cmd("dpkg --configure -a || true",
+                 sh("dpkg --configure -a || true")),
+        with_cmd("apt-get -f install -y || true",
+                 sh("apt-get -f install -y || true")),
+        with_cmd("rm -f /var/lib/dpkg/lock-frontend /var/lib/dpkg/lock || true",
+                 sh("rm -f /var/lib/dpkg/lock-frontend /var/lib/dpkg/lock || true")),
+        PKG_QUEUE.update_index(),  # skipped while the index is fresh
+    ]
+    return {"ok": True, "steps": steps}
+
+
+NGINX_ERROR_LOG = "/var/log/nginx/error.log"
+NGINX_LOG_WINDOW_BYTES = 64 * 1024 * 1024   # how much of the error log to mine per diagnosis
+
+
+def _error_log_summary(path: str) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """Mine the tail window of an error log; return (step for logs/UI, ranked templates)."""
+    cmd = f"logmine {path} (last {NGINX_LOG_WINDOW_BYTES // (1024 * 1024)}MB)"
+    try:
+        summary = logmine.mine_file(path, tail_bytes=NGINX_LOG_WINDOW_BYTES)
+    except OSError as e:
+        return {"cmd": cmd, "rc": 1, "out_tail": f"read failed: {e.strerror or e!r}"}, None
+    return {"cmd": cmd, "rc": 0, "out_tail": logmine.format_summary(summary)[-2000:]}, summary
+
+
+@register_op()
+def fix_nginx() -> dict:
+    """Diagnose nginx: config test, error log templates, restart, verify port 80."""
+    log_step, log_summary = _error_log_summary(NGINX_ERROR_LOG)
+    diag = [
+        with_cmd("nginx -t || true", sh("nginx -t || true")),
+        log_step,
+        with_cmd("systemctl restart nginx || service nginx restart || true",
+                 sh("systemctl restart nginx || service nginx restart || true")),
+        with_cmd("curl -s -o /dev/null -w '%{http_code}' http://127.0.0.1/ || true",
+                 sh("curl -s -o /dev/null -w '%{http_code}' http://127.0.0.1/ || true")),
+    ]
+    syntax_ok = any("syntax is ok" in d["out_tail"].lower() for d in diag)
+    http_ok = "200" in diag[-1]["out_tail"]
+    return {"ok": bool(syntax_ok and http_ok), "http_ok": http_ok,
+            "error_log": log_summary, "steps": diag}
+
+# Disk health diagnostics
+
+
+@register_op()
+def check_disk_health(max_paths: int = 10) -> Dict[str, Any]:
+    """
+    Summarizes disk usage:
+      - partition usage (mountpoint + percent used)
+      - top N heavyweight paths on root filesystem (bytes, path)
+    """
+    steps: List[Dict[str, Any]] = []
+
+    part = with_cmd(r"df -P | awk 'NR>1 {gsub(\"%\", \"\", $5); print $6\" \"$5}'", sh(
+        r"df -P | awk 'NR>1 {gsub(\"%\", \"\", $5); print $6\" \"$5}'"))
+    steps.append(part)
+    partitions: List[Dict[str, Any]] = []
+    if part["rc"] == 0:
+        for line in (part["out_tail"] or "").splitlines():
+            try:
+                mount, pct = line.rsplit(" ", 1)
+                partitions.append(
+                    {"mount": mount.strip(), "used_percent": int(pct)})
+            except Exception:
+                pass
+
+    heavy = with_cmd(f"du -x -b -d1 / 2>/dev/null | sort -nr | head -n {int(max_paths)}",
+                     sh(f"du -x -b -d1 / 2>/dev/null | sort -nr | head -n {int(max_paths)}"))
+    steps.append(heavy)
+    top_paths: List[Dict[str, Any]] = []
+    if heavy["rc"] == 0:
+        for line in (heavy["out_tail"] or "").splitlines():
+            try:
+                size_str, path = line.strip().split("\t", 1)
+                top_paths.append({"bytes": int(size_str), "path": path})
+            except Exception:
+                pass
+
+    return {"ok": True, "partitions": partitions, "top_paths": top_paths, "steps": steps,
+            "notes": "check_disk_health"}
+
+# Restart database with verification
+
+
+@register_op()
+def restart_database(name: str = "postgres", port: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Restart a database via the detected init system, then wait (with backoff) until it
+    accepts connections at the protocol level; reports time_to_accept_s.
+    name may be: "postgres", "postgresql", "mysql", "mariadb".
+    """
+    res = db.restart_database(name, run=sh, port=port, ready_timeout_s=180)
+    return {**res, "notes": f"restart_database({name})"}
+
+# Safety: generic safe shell (single & multi)
+
+
+# Stronger blocklist for obviously dangerous operations. Rules test parsed commands
+# (utils/shparse.py), so wrappers, `sh -c`, substitutions and flag order can't hide them and
+# arguments/quoted text can't trip them; the label is what the refusal reports.
+def _rm_root(s: Segment) -> bool:
+    return s.has_flag("r", "R", "recursive") and any(shparse.is_system_path(a) for a in s.operands)
+
+
+def _perms_root(s: Segment) -> bool:
+    return s.has_flag("r", "R", "recursive") and any(shparse.is_root_level(a) for a in s.operands)
+
+
+def _to_disk(path: str) -> bool:
+    return path.startswith(("/dev/sd", "/dev/nvme", "/dev/mmcblk", "/dev/vd", "/dev/xvd"))
+
+
+BLOCK_PATTERNS = shparse.RuleSet([
+    ("rm -rf", ("rm",), lambda s: s.has_flag("r", "R", "recursive")
+        and s.has_flag("f", "force")),                                    # destructive delete
+    ("rm -r /", ("rm",), _rm_root),
+    ("mkfs", None, lambda s: s.name.startswith(("mkfs", "mke2fs"))),      # reformat
+    ("dd if=", ("dd",), lambda s: any(a.startswith("if=") for a in s.args)),
+    ("of=/dev/sd", None, lambda s: any(a.startswith("of=") and _to_disk(a[3:]) for a in s.args)),
+    ("wipefs", ("wipefs",), lambda s: True),                              # disk wipe/encrypt
+    ("cryptsetup", ("cryptsetup",), lambda s: True),
+    ("fdisk", ("fdisk", "sfdisk", "cfdisk"), lambda s: True),            # partition editors
+    ("parted", ("parted",), lambda s: True),
+    (":(){ :|:& };:", None, lambda s: s.func is not None and s.name == s.func),  # fork bomb
+    ("shutdown", ("shutdown", "poweroff", "halt"), lambda s: True),       # power control
+    ("reboot", ("reboot",), lambda s: True),
+    ("init 0", ("init", "telinit"), lambda s: "0" in s.args),
+    ("init 6", ("init", "telinit"), lambda s: "6" in s.args),
+    ("chown -R /", ("chown", "chmod", "chgrp"), _perms_root),             # perms on root
+    (">/dev/sd", None, lambda s: any(_to_disk(t) for t in s.write_targets)),  # redirects to disks
+    *shparse.SHARED_RULES,                                                # what the parse can't see
+])
+
+# Writes are allowed only into these prefixes
+SAFE_WRITE_PREFIXES = ("/tmp", "/var/tmp", "/var/log")
+
+# Some commands we consider read-only (best-effort heuristic)
+READONLY_BIN = shparse.READONLY_BIN
+
+
+def _safe_write_targets(parsed: shparse.Parsed) -> Optional[str]:
+    """
+    Every file the command writes (>, >>, &>, tee ...) must live under SAFE_WRITE_PREFIXES.
+    Return reason if unsafe, else None.
+    """
+    for target in parsed.write_targets:
+        if shparse.is_harmless_sink(target):
+            continue
+        # ~ expands to $HOME; other relative paths are allowed (treated as cwd)
+        if target.startswith("~"):
+            return f"write outside safe paths: {target}"
+        if target.startswith("/"):
+            path = os.path.normpath(target)
+            if not any(path == p or path.startswith(p + "/") for p in SAFE_WRITE_PREFIXES):
+                return f"write outside safe paths: {target}"
+    return None
+
+
+def _seems_readonly(cmd: str) -> bool:
+    return shparse.parse(cmd).readonly
+
+
+def _screen(cmd: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (rule, reason) for a refused command, else (None, None). The command is parsed once; every
+    check reuses the cached parse. `rule` is the metrics label (never command text): "empty",
+    "parse_error", a BLOCK_PATTERNS label or "unsafe_write".
+    """
+    if not cmd or not cmd.strip():
+        return "empty", "empty command"
+    parsed = shparse.parse(cmd)
+    if parsed.error:
+        return "parse_error", f"unparseable command: {parsed.error}"
+    label = BLOCK_PATTERNS.first_hit(parsed)
+    if label:
+        return label, f"blocked by pattern: {label}"
+    if parsed.readonly:
+        return None, None  # nothing written: skip the write-target check
+    redir_reason = _safe_write_targets(parsed)
+    if redir_reason:
+        return "unsafe_write", redir_reason
+    return None, None
+
+
+def is_safe_command(cmd: str) -> (bool, Optional[str]):
+    """
+    Heuristic safety:
+      - deny if bash couldn't parse it either
+      - deny if any command hits BLOCK_PATTERNS (read-only ones included)
+      - deny if a write target (redirect, tee, awk print >, sed w) is outside SAFE_WRITE_PREFIXES
+      - allow read-only commands liberally
+      - otherwise allow (since we also run inside container)
+    """
+    _, reason = _screen(cmd)
+    return reason is None, reason
+
+
+@register_op()
+def run_shell_safe(command: str, dry_run: bool = True) -> dict:
+    """
+    Execute a *single* shell command if it passes a simple safety filter.
+    Backstop for LLM-routed unknown requests.
+    """
+    rule, reason = _screen(command)
+    if reason:
+        metrics.REFUSALS.labels(rule=rule).inc()
+        return {"ok": False, "reason": reason, "command": command}
+    if dry_run:
+        return {"ok": True, "dry_run": True, "command": command,
+                "readonly": _seems_readonly(command)}
+    res = sh(command)
+    return {"ok": res["rc"] == 0, "dry_run": False, "command": command, "result": res}
+
+
+@register_op()
+def run_shell_script(commands: List[str], dry_run: bool = True, stop_on_error: bool = True) -> dict:
+    """
+    Execute a short list of shell commands with basic safety checks per line.
+    - If *any* command is unsafe, default behavior is to stop before executing (dry-run or real),
+      returning the blocked reason. If stop_on_error=False, we will skip only the unsafe ones.
+    """
+    if not isinstance(commands, list) or not all(isinstance(c, str) for c in commands):
+        return {"ok": False, "reason": "commands must be a list[str]"}
+
+    plan: List[Dict[str, Any]] = []
+    unsafe_found = False
+
+    # Safety & planning pass
+    for idx, cmd in enumerate(commands, start=1):
+        rule, reason = _screen(cmd)
+        plan.append({"index": idx, "cmd": cmd,
+                    "safe": reason is None, "blocked_reason": reason})
+        if reason:
+            metrics.REFUSALS.labels(rule=rule).inc()
+            unsafe_found = True
+            if stop_on_error:
+                break
+
+    if unsafe_found and stop_on_error:
+        return {
+            "ok": False,
+            "dry_run": True,  # nothing executed
+            "stopped_at": len(plan),
+            "plan": plan,
+            "reason": "unsafe command present; execution halted",
+        }
+
+    # Execute (or dry-run)
+    results: List[Dict[str, Any]] = []
+    executed_any = False
+    if dry_run:
+        for p in plan:
+            if p["safe"]:
+                results.append(
+                    {"index": p["index"], "cmd": p["cmd"], "dry_run": True})
+            else:
+                results.append({"index": p["index"], "cmd": p["cmd"],
+                               "skipped": True, "blocked_reason": p["blocked_reason"]})
+        return {"ok": not unsafe_found, "dry_run": True, "plan": plan, "results": results}
+
+    # real execution
+    for p in plan:
+        if not p["safe"]:
+            results.append({"index": p["index"], "cmd": p["cmd"],
+                           "skipped": True, "blocked_reason": p["blocked_reason"]})
+            if stop_on_error:
+                break
+            continue
+        executed_any = True
+        res = sh(p["cmd"])
+        results.append({"index": p["index"], "cmd": p["cmd"],
+                       "rc": res["rc"], "out_tail": res["out_tail"]})
+        if res["rc"] != 0 and stop_on_error:
+            break
+
+    ok = (not unsafe_found) and all(r.get("rc", 0)
+                                    == 0 or r.get("skipped") for r in results)
+    return {"ok": ok, "dry_run": False, "plan": plan, "results": results}
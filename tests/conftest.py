@@ -0,0 +1,14 @@
+import pytest
+
+import utils.audit
+
+
+@pytest.fixture(autouse=True)
+def _audit_to_tmp(tmp_path, monkeypatch):
+    # utils.audit reads LINOPS_AUDIT_DIR once, at import: patch the module so no test appends to
+    # the tracked audit/audit.jsonl, and set the env var for the CLI subprocesses some tests start
+    audit_dir = tmp_path / "audit"
+    audit_dir.mkdir()
+    monkeypatch.setattr(utils.audit, "AUDIT_DIR", str(audit_dir))
+    monkeypatch.setattr(utils.audit, "AUDIT_PATH", str(audit_dir / "audit.jsonl"))
+    monkeypatch.setenv("LINOPS_AUDIT_DIR", str(audit_dir))
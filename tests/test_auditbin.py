@@ -0,0 +1,57 @@
+import io
+import json
+import os
+import uuid
+
+from typer.testing import CliRunner
+
+import cli.main as cli
+from planner.plan import Step
+from utils import auditbin, serialize
+
+
+def _rec(i, event="shell_exec", **extra):
+    return {"id": str(uuid.uuid4()), "event": event, "ts": 1000.0 + i,
+            "iso": "ignored", "cmd": "df -h /", "rc": 0, "stdout": "ok\n" * 20, **extra}
+
+
+def test_roundtrip_is_smaller_and_preserves_records(tmp_path):
+    w = auditbin.BinaryAuditWriter(str(tmp_path))
+    recs = [_rec(i) for i in range(50)]
+    recs.append(_rec(50, event="custom_event", plan=[Step("free_disk", {})]))
+    recs.append(_rec(51, stdout="Filesystem  Size  Used Avail Use% Mounted on\n" * 100))
+    for r in recs:
+        w.append(r)
+    back = list(auditbin.iter_records(str(tmp_path)))
+    assert [r["id"] for r in back] == [r["id"] for r in recs]
+    assert back[0]["stdout"] == recs[0]["stdout"] and back[0]["iso"].endswith("Z")
+    assert back[-2]["event"] == "custom_event"
+    assert back[-2]["plan"] == [{"name": "free_disk", "kwargs": {}}]
+    assert auditbin.encode(recs[-1])[4 + auditbin._HEAD.size - 1] & auditbin.CODEC_ZLIB
+    assert back[-1]["stdout"] == recs[-1]["stdout"]
+    jsonl_bytes = sum(len(serialize.dumps_bytes(r, newline=True)) for r in recs)
+    (seg,) = [p for p in os.listdir(tmp_path) if p.endswith(".lab")]
+    assert os.path.getsize(tmp_path / seg) < jsonl_bytes
+
+
+def test_since_uses_index_and_segments_rotate(tmp_path):
+    w = auditbin.BinaryAuditWriter(str(tmp_path), segment_bytes=2000)
+    for i in range(40):
+        w.append(_rec(i, event="do" if i % 2 else "plan"))
+    assert len([p for p in os.listdir(tmp_path) if p.endswith(".lab")]) > 1
+    got = list(auditbin.iter_records(str(tmp_path), since=1030.0, events=["do"]))
+    assert [r["ts"] for r in got] == [1031.0, 1033.0, 1035.0, 1037.0, 1039.0]
+    assert auditbin._start_offset(auditbin._segments(str(tmp_path))[0], since=5000.0) == -1
+
+
+def test_cli_export_jsonl(tmp_path):
+    w = auditbin.BinaryAuditWriter(str(tmp_path))
+    for i in range(3):
+        w.append(_rec(i))
+    out = tmp_path / "out.jsonl"
+    r = CliRunner().invoke(cli.app, ["audit", "export", "--dir", str(tmp_path), "--out", str(out)])
+    assert r.exit_code == 0
+    lines = out.read_text().splitlines()
+    assert len(lines) == 3 and json.loads(lines[0])["cmd"] == "df -h /"
+    buf = io.BytesIO()
+    assert auditbin.export_jsonl(str(tmp_path), buf, since=1001.5) == 1
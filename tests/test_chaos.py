@@ -0,0 +1,47 @@
+import pytest
+
+
+@pytest.mark.parametrize("design", ["pidfd", "poll"])
+def test_chaos_run_detects_and_heals(tmp_path, monkeypatch, design):
+    import utils.audit
+    from apps import auto_heal
+    from bench import chaos
+
+    monkeypatch.setattr(utils.audit, "AUDIT_DIR", str(tmp_path))
+    monkeypatch.setattr(utils.audit, "AUDIT_PATH", str(tmp_path / "audit.jsonl"))
+    # run_once points the heal path at a throwaway state and the local backend: restore after
+    for name in ("_STATE", "DRY_RUN", "HEAL_BACKEND"):
+        monkeypatch.setattr(auto_heal, name, getattr(auto_heal, name))
+    audit_dir = tmp_path / "chaos-audit"
+    report = chaos.run_once(design, n_services=2, duration_s=3.0, kill_every_s=0.6, fill_mb_s=8,
+                            fill_quota_mb=4, fill_dir=str(tmp_path), interval_s=0.1, horizon_s=0,
+                            seed=3, audit_dir=str(audit_dir))
+
+    svc = report["services"]
+    assert svc["kills"] >= 1 and svc["undetected"] == 0
+    assert svc["time_to_detect"]["n"] == svc["kills"]
+    assert svc["time_to_heal"]["n"] + svc["unhealed"] == svc["kills"]
+    disk = report["disk"]
+    assert disk["episodes"] >= 1 and disk["crossed_threshold"] >= 1
+    assert disk["time_to_heal"]["mean_s"] is not None
+    assert report["agent"]["cpu_s"] >= 0 and report["agent"]["max_rss_mb"] > 0
+    # services, pidfiles and the fill file cleaned up
+    assert not list(tmp_path.glob("linops-chaos-*"))
+    # the agent's records went to audit_dir, and the redirect ended with the run
+    assert not (tmp_path / "audit.jsonl").exists()
+    assert utils.audit.AUDIT_PATH == str(tmp_path / "audit.jsonl")
+
+
+def test_heals_are_credited_to_their_own_kill():
+    from bench.chaos import _pair
+
+    # kill 1 detected at 1.1, its heal finishes at 1.6; kill 2 lands at 1.5, mid-heal,
+    # and is only detected at 1.7 and healed by its own incident at 1.9
+    kills = [(80, 1.0), (80, 1.5)]
+    events = [("detect", 80, 1.1, 1), ("healed", 80, 1.6, 1),
+              ("detect", 80, 1.7, 2), ("healed", 80, 1.9, 2)]
+    ttd, undetected, tth, unhealed = _pair(kills, events)
+    assert ttd == pytest.approx([0.1, 0.2]) and tth == pytest.approx([0.6, 0.4])
+    assert (undetected, unhealed) == (0, 0)
+    for detect, heal in zip(ttd, tth):
+        assert detect <= heal
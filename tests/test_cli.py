@@ -31,3 +31,35 @@ def test_do_is_dry_run_by_default():
     data = json.loads(r.stdout)
     assert data["dry_run"] is True
     assert len(data["results"]) >= 1
+
+
+def test_do_stream_emits_ndjson_per_step():
+    r = runner.invoke(cli.app, ["do", "free disk and check cpu/mem", "--stream"])
+    assert r.exit_code == 0
+    events = [json.loads(line) for line in r.stdout.splitlines()]
+    kinds = [e["event"] for e in events]
+    assert kinds == ["plan", "step_start", "step_finish", "step_start", "step_finish", "done"]
+    assert events[2]["step"] == "free_disk" and events[2]["result"]["ok"] is True
+    assert events[-1]["ok"] is True and events[-1]["failed"] == []
+
+
+def test_plan_batch_one_line_per_query_and_one_grouped_audit(tmp_path, monkeypatch):
+    records = []
+    monkeypatch.setattr(cli, "audit_log",
+                        lambda event, **kw: records.append({"event": event, **kw}))
+    src = tmp_path / "alerts.ndjson"
+    src.write_text('"free disk and check cpu/mem"\n'
+                   '{"query": "web server crashed, restart and verify", "alert_id": 7}\n\n'
+                   '"free disk and check cpu/mem"\n')
+    r = runner.invoke(cli.app, ["plan", "--batch", str(src)])
+    assert r.exit_code == 0
+    lines = [json.loads(line) for line in r.stdout.splitlines()]
+    firsts = [line["plan"][0]["name"] for line in lines]
+    assert firsts == ["free_disk", "heal_fakesvc_8080", "free_disk"]
+    assert [rec["event"] for rec in records] == ["plan_batch"]
+    assert records[0]["queries"] == 3
+    assert [(g["query"], g["count"]) for g in records[0]["plans"]] == [
+        ("free disk and check cpu/mem", 2), ("web server crashed, restart and verify", 1)]
+
+    src.write_text('{"alert_id": 8}\n')
+    assert runner.invoke(cli.app, ["plan", "--batch", str(src)]).exit_code != 0
@@ -0,0 +1,33 @@
+import threading
+
+from utils.db import MySQLAdapter, PostgresAdapter, restart_database
+from utils.fakedb import FakeDBListener
+
+
+def test_postgres_probe_distinguishes_starting_from_accepting():
+    with FakeDBListener("postgres") as fake:
+        fake.starting_up = True
+        res = PostgresAdapter().probe(port=fake.port)
+        assert res["ok"] is False and res["state"] == "starting"
+        fake.starting_up = False
+        assert PostgresAdapter().probe(port=fake.port)["state"] == "accepting"
+
+
+def test_mysql_probe_reads_greeting():
+    with FakeDBListener("mysql") as fake:
+        res = MySQLAdapter().probe(port=fake.port)
+        assert res["ok"] is True and "8.0.36-fake" in res["detail"]
+    assert MySQLAdapter().probe(port=fake.port, timeout_s=0.2)["state"] == "down"
+
+
+def test_restart_waits_until_accepting_and_uses_one_mechanism():
+    calls = []
+    with FakeDBListener("postgres") as fake:
+        fake.starting_up = True
+        threading.Timer(0.3, lambda: setattr(fake, "starting_up", False)).start()
+        res = restart_database("postgresql", run=lambda c: calls.append(c) or {"rc": 0},
+                               port=fake.port, ready_timeout_s=5, init="systemd")
+    assert res["ok"] is True and res["accepting_connections"] is True
+    assert res["time_to_accept_s"] >= 0.25 and res["readiness"]["attempts"] > 1
+    assert calls == ["systemctl restart postgresql"] and res["restarted_service"] == "postgresql"
+    assert restart_database("oracle", run=lambda c: {"rc": 0})["ok"] is False
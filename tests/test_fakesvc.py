@@ -1,10 +1,12 @@
 import time
+import utils.audit
 from utils.shell import run_shell_safe
 from runbooks.fakesvc import heal_fakesvc_8080, DEFAULT_PIDFILE
 
 
 def test_heal_fakesvc_dryrun_then_exec(tmp_path, monkeypatch):
-    monkeypatch.setenv("LINOPS_AUDIT_DIR", str(tmp_path))
+    monkeypatch.setattr(utils.audit, "AUDIT_DIR", str(tmp_path))
+    monkeypatch.setattr(utils.audit, "AUDIT_PATH", str(tmp_path / "audit.jsonl"))
     run_shell_safe(
         f"kill -9 $(cat {DEFAULT_PIDFILE}) 2>/dev/null || true", dry_run=False)
     r1 = heal_fakesvc_8080(dry_run=True)
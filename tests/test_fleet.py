@@ -0,0 +1,56 @@
+import json
+import os
+import stat
+import sys
+
+from executor import fleet
+
+
+class _ScriptTransport(fleet.Transport):
+    """Each host 'runs' a canned do payload; hosts named bad-* fail the free_disk step."""
+    name = "script"
+
+    def command(self, host, query, dry_run):
+        ok = not host.startswith("bad-")
+        payload = {"dry_run": dry_run, "results": [{"step": "free_disk", "ok": ok},
+                                                   {"step": "check_cpu_mem", "ok": True}]}
+        return [sys.executable, "-c", f"print({json.dumps(json.dumps(payload))})"]
+
+
+def test_read_targets_skips_comments_and_duplicates(tmp_path):
+    p = tmp_path / "hosts.txt"
+    p.write_text("web-1\n# fleet\nweb-2  # canary\n\nweb-1\n")
+    assert fleet.read_targets(str(p)) == ["web-1", "web-2"]
+
+
+def test_fleet_streams_and_aggregates_failed_steps():
+    seen = []
+    hosts = ["web-1", "bad-1", "web-2", "bad-2"]
+    res = fleet.run_fleet(hosts, "free disk", transport=_ScriptTransport(), concurrency=2,
+                          on_result=lambda r: seen.append(r["host"]))
+    assert sorted(seen) == sorted(hosts) and len(res) == 4
+    summary = fleet.aggregate(res)
+    assert summary["ok"] == 2 and summary["failed"] == 2
+    assert summary["failed_steps"] == {"free_disk": ["bad-1", "bad-2"]}
+    assert set(summary["latency_s"]) == {"p50", "p90", "p99", "max"}
+
+
+def test_ssh_transport_against_localhost_shim(tmp_path):
+    shim = tmp_path / "ssh"
+    shim.write_text(
+        "#!/bin/sh\n"
+        "while [ \"$1\" = \"-o\" ]; do shift 2; done\n"
+        "host=$1; shift\n"
+        "[ \"$host\" = down-host ] && { echo 'ssh: connect: Connection refused' >&2; exit 255; }\n"
+        "exec sh -c \"$*\"\n")
+    shim.chmod(shim.stat().st_mode | stat.S_IEXEC)
+    t = fleet.SSHTransport(ssh=[str(shim), "-o", "BatchMode=yes"], remote_dir=fleet.REPO_ROOT,
+                           python=sys.executable)
+    os.environ.setdefault("LINOPS_LLM", "0")
+    res = fleet.run_fleet(["localhost", "down-host"], "check_cpu_mem", transport=t)
+    by_host = {r["host"]: r for r in res}
+    assert by_host["localhost"]["ok"] is True
+    assert by_host["localhost"]["results"][0]["step"] == "check_cpu_mem"
+    assert by_host["down-host"]["ok"] is False and by_host["down-host"]["rc"] == 255
+    failed = fleet.aggregate(res)["failed_hosts"]
+    assert failed == {"down-host": "rc=255: ssh: connect: Connection refused"}
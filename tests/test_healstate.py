@@ -0,0 +1,44 @@
+from apps import auto_heal
+from utils.healstate import HealState
+
+
+def test_token_bucket_and_cooldown(tmp_path):
+    st = HealState(str(tmp_path / "s.sqlite"), burst=2, refill_s=100, cooldown_s=10)
+    assert st.allow("service:nginx", now=0) == (True, None)
+    ok, why = st.allow("service:nginx", now=5)
+    assert ok is False and why.startswith("cooldown")
+    assert st.allow("service:nginx", now=11)[0] is True
+    ok, why = st.allow("service:nginx", now=22)  # burst of 2 spent, ~0.2 tokens refilled
+    assert ok is False and why.startswith("rate limited")
+    assert st.allow("service:nginx", now=200)[0] is True
+    assert st.allow("disk:/", now=5)[0] is True  # buckets are per target
+
+
+def test_lease_excludes_other_owner_until_expiry(tmp_path):
+    path = str(tmp_path / "s.sqlite")
+    a, b = HealState(path), HealState(path)  # two watchers, one file
+    assert a.acquire_lease("auto_heal", "a", ttl_s=30, now=0) == (True, "a")
+    assert b.acquire_lease("auto_heal", "b", ttl_s=30, now=10) == (False, "a")
+    assert a.acquire_lease("auto_heal", "a", ttl_s=30, now=20)[0] is True  # renew
+    assert b.acquire_lease("auto_heal", "b", ttl_s=30, now=55)[0] is True  # a lapsed
+    b.release_lease("auto_heal", "b")
+    assert a.acquire_lease("auto_heal", "a", ttl_s=30, now=56)[0] is True
+
+
+def test_restart_storm_is_suppressed_in_summary(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(auto_heal, "_STATE", HealState(str(tmp_path / "s.sqlite"), cooldown_s=60))
+    monkeypatch.setattr(auto_heal, "DRY_RUN", False)
+    monkeypatch.setattr(auto_heal, "_service_running_exact", lambda name: False)
+    monkeypatch.setattr(auto_heal, "_call_ops", lambda fn, **kw: calls.append(fn) or {"ok": True})
+    first = auto_heal._check_services_and_maybe_heal(["nginx"])[0]
+    second = auto_heal._check_services_and_maybe_heal(["nginx"])[0]
+    assert first["healed"] is True and "suppressed" not in first
+    assert second["healed"] is False and second["suppressed"].startswith("cooldown")
+    assert second["last_attempt"]["ok"] is True
+    assert calls == ["restart_service"]
+
+    other = HealState(str(tmp_path / "s.sqlite"))
+    other.acquire_lease("auto_heal", "someone-else", ttl_s=60)
+    summary = auto_heal._watch_impl()
+    assert summary["skipped"] is True and "someone-else" in summary["suppressed"]
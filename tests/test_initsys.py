@@ -0,0 +1,19 @@
+import utils.initsys as initsys
+
+
+def test_detection_is_cached_per_host(monkeypatch):
+    calls = []
+    monkeypatch.setattr(initsys, "_CACHE", {})
+    monkeypatch.setattr(initsys, "_detect", lambda: calls.append(1) or initsys.OPENRC)
+    assert initsys.detect_init_system() == initsys.OPENRC
+    assert initsys.detect_init_system() == initsys.OPENRC
+    assert len(calls) == 1
+
+
+def test_service_cmds_only_use_the_detected_mechanism(monkeypatch):
+    monkeypatch.setattr(initsys.os, "geteuid", lambda: 0)
+    assert initsys.service_cmds(initsys.SYSTEMD, "nginx", "restart") == ["systemctl restart nginx"]
+    assert initsys.service_cmds(initsys.NONE, "nginx", "restart") == []
+    monkeypatch.setattr(initsys.os, "geteuid", lambda: 1000)
+    assert initsys.service_cmds(initsys.SYSV, "a b", "start") == [
+        "service 'a b' start", "sudo -n service 'a b' start"]
@@ -0,0 +1,84 @@
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from apps import auto_heal
+from apps.local_watch import DiskRing, LocalWatcher
+from utils.healstate import HealState
+
+
+@pytest.fixture(autouse=True)
+def _heal_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(auto_heal, "_STATE", HealState(str(tmp_path / "healstate.sqlite")))
+
+
+def test_disk_ring_fill_rate_is_bounded():
+    ring = DiskRing(size=4)
+    for i in range(10):
+        ring.add(float(i), 1000 + 50 * i, 10_000)
+    assert len(ring.samples) == 4
+    assert ring.fill_rate() == 50.0
+    assert ring.summary()["used_percent"] == 14.5
+
+
+@pytest.mark.skipif(not hasattr(os, "pidfd_open"), reason="needs pidfd_open")
+def test_process_exit_wakes_watcher_and_heals(tmp_path, monkeypatch):
+    exe = tmp_path / "lnxwatchsvc"
+    shutil.copy("/bin/sleep", exe)
+    p = subprocess.Popen([str(exe), "30"])
+    calls = []
+    monkeypatch.setattr(auto_heal, "DRY_RUN", False)
+    monkeypatch.setattr(auto_heal, "DISK_THRESHOLD", 101)
+    # our test child lingers as a zombie until reaped, which pgrep -x would still match
+    monkeypatch.setattr(auto_heal, "_service_running_exact", lambda name: p.poll() is None)
+    monkeypatch.setattr(auto_heal, "_call_ops",
+                        lambda fn, **kw: calls.append((fn, kw)) or {"ok": True})
+    w = LocalWatcher(["lnxwatchsvc"], interval_s=10)
+    try:
+        for _ in range(50):  # the exec may not have replaced comm yet
+            if w.arm("lnxwatchsvc"):
+                break
+            time.sleep(0.02)
+        t0 = time.monotonic()
+        p.kill()
+        ev = w.step()
+        assert time.monotonic() - t0 < 2
+        assert ev["trigger"] == "pidfd"
+        assert ev["services"][0]["healed"] is True
+        assert calls == [("restart_service", {"name": "lnxwatchsvc"})]
+    finally:
+        w.close()
+        p.kill()
+        p.wait()
+
+
+def test_disk_ring_forecasts_time_to_full():
+    ring = DiskRing(size=8)
+    for i in range(4):
+        ring.add(float(i), 1000 + 100 * i, 10_000)
+    assert ring.time_to_full_s() is None  # too few samples to extrapolate
+    for i in range(4, 12):
+        ring.add(float(i), 1000 + 100 * i, 10_000)
+    assert abs(ring.fill_rate() - 100.0) < 1e-9
+    assert abs(ring.time_to_full_s() - 79.0) < 1e-6  # (10000 - 2100) / 100
+    ring.add(12.0, 500, 10_000)
+    ring.add(13.0, 400, 10_000)
+    ring.add(14.0, 300, 10_000)
+    ring.add(15.0, 200, 10_000)
+    assert ring.fill_rate() < 0 and ring.time_to_full_s() is None
+
+
+def test_forecast_triggers_free_disk_below_threshold(monkeypatch):
+    calls = []
+    monkeypatch.setattr(auto_heal, "DRY_RUN", False)
+    monkeypatch.setattr(auto_heal, "_disk_used_percent", lambda mount="/": 40)
+    monkeypatch.setattr(auto_heal, "_call_ops", lambda fn, **kw: calls.append(fn) or {"ok": True})
+    calm = auto_heal._check_disk_and_maybe_heal(forecast={"mount": "/data", "time_to_full_s": None})
+    assert calm["healed"] is False and calm["forecast"]["predicted_full"] is False
+    res = auto_heal._check_disk_and_maybe_heal(forecast={"mount": "/data", "time_to_full_s": 120.0})
+    assert res["healed"] is True and res["mount"] == "/data"
+    assert res["forecast"]["predicted_full"] is True and "predicted full in 120s" in res["action"]
+    assert calls == ["free_disk"]
@@ -0,0 +1,35 @@
+from utils.logmine import LogMiner, format_summary, mine_file, mine_text
+
+
+def test_repeated_errors_collapse_into_ranked_templates():
+    lines = [
+        f"2025/09/07 14:00:{i % 60:02d} [error] 12#0: *{i} connect() failed"
+        f" (111: Connection refused)"
+        f" client: 10.0.0.{i % 250}, request: \"GET /api/items/{i} HTTP/1.1\""
+        for i in range(500)
+    ] + [f"2025/09/07 14:01:0{i} [crit] open() \"/var/www/x{i}.png\" failed (2: No such file)"
+         for i in range(3)]
+    out = mine_text("\n".join(lines), top=5)
+    assert out["total_lines"] == 503 and out["distinct_templates"] == 2
+    top = out["templates"][0]
+    assert top["count"] == 500
+    assert "<IP>" in top["template"] and "<PATH>" in top["template"] and "<NUM>" in top["template"]
+    assert top["first_ts"] == "2025/09/07 14:00:00" and top["last_ts"] == "2025/09/07 14:00:19"
+    assert 1 <= len(top["samples"]) <= 3
+    assert "500x" in format_summary(out)
+
+
+def test_memory_stays_bounded_with_many_distinct_lines():
+    m = LogMiner(max_clusters=20)
+    words = ("".join(chr(ord("g") + int(d)) for d in str(i)) for i in range(1000))
+    m.add_many(f"{w} happened" for w in words)
+    s = m.summary(top=100)
+    assert s["distinct_templates"] <= 20 and s["evicted_templates"] > 0
+
+
+def test_mine_file_tail_window_starts_at_full_line(tmp_path):
+    p = tmp_path / "error.log"
+    p.write_text("".join(f"worker {i} exited with code 1\n" for i in range(100)))
+    out = mine_file(str(p), tail_bytes=100)
+    assert out["total_lines"] < 100
+    assert out["templates"][0]["template"] == "worker <NUM> exited with code <NUM>"
@@ -0,0 +1,60 @@
+import os
+
+import utils.logtail as logtail
+from utils.logtail import follow, read_new, tail_lines
+
+
+def _write(path, text, mode="w"):
+    with open(path, mode, encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_tail_lines_across_blocks_and_mmap(tmp_path, monkeypatch):
+    p = tmp_path / "app.log"
+    _write(p, "".join(f"line {i}\n" for i in range(1000)))
+    res = tail_lines(str(p), lines=3, block_size=16)
+    assert res["content"] == "line 997\nline 998\nline 999\n"
+    monkeypatch.setattr(logtail, "MMAP_THRESHOLD", 1)
+    assert tail_lines(str(p), lines=3)["content"] == res["content"]
+    assert tail_lines(str(p), lines=5000)["content"].startswith("line 0\n")
+
+
+def test_follow_reads_only_new_complete_lines_and_redacts(tmp_path):
+    p = tmp_path / "app.log"
+    _write(p, "old\n")
+    first = follow(str(p), lines=10)
+    _write(p, "db password=hunter2\npartial", mode="a")
+    second = follow(str(p), cursor=first["cursor"])
+    assert second["content"] == "db password=******\n"
+    _write(p, " line\n", mode="a")
+    third = follow(str(p), cursor=second["cursor"])
+    assert third["content"] == "partial line\n"
+    assert follow(str(p), cursor=third["cursor"])["content"] == ""
+
+
+def test_read_new_handles_rotation_and_truncation(tmp_path):
+    p = tmp_path / "app.log"
+    _write(p, "a\n")
+    cur = tail_lines(str(p), lines=1)["cursor"]
+    _write(p, "b\n", mode="a")
+    os.rename(p, str(p) + ".1")
+    _write(p, "c\n")
+    res = read_new(str(p), cur)
+    assert res["rotated"] is True and res["content"] == "b\nc\n"
+    _write(p, "")
+    res2 = read_new(str(p), res["cursor"])
+    assert res2["reset"] == "truncated" and res2["content"] == ""
+
+
+def test_rotation_flushes_the_old_files_partial_last_line(tmp_path):
+    p = tmp_path / "app.log"
+    _write(p, "a\n")
+    cur = tail_lines(str(p), lines=1)["cursor"]
+    _write(p, "half a li", mode="a")
+    held = read_new(str(p), cur)
+    assert held["content"] == ""
+    _write(p, "ne", mode="a")
+    os.rename(p, str(p) + ".1")
+    _write(p, "new\n")
+    res = read_new(str(p), held["cursor"])
+    assert res["rotated"] is True and res["content"] == "half a line\nnew\n"
@@ -0,0 +1,51 @@
+import urllib.request
+
+from runbooks import ops
+from utils import metrics
+from utils.shell import run_shell_safe
+
+
+def test_counter_and_histogram_render_prometheus_text():
+    reg = metrics.Registry()
+    c = reg.counter("t_total", "things", ("rule",))
+    h = reg.histogram("t_seconds", "latency", ("step",), buckets=(0.1, 1.0))
+    c.labels(rule='blocked "x"').inc()
+    c.labels(rule='blocked "x"').inc(2)
+    h.labels(step="a").observe(0.05)
+    h.labels(step="a").observe(0.5)
+    text = reg.render()
+    assert "# TYPE t_total counter" in text
+    assert 't_total{rule="blocked \\"x\\""} 3' in text
+    assert 't_seconds_bucket{step="a",le="0.1"} 1' in text
+    assert 't_seconds_bucket{step="a",le="+Inf"} 2' in text
+    assert 't_seconds_count{step="a"} 2' in text
+    assert reg.counter("t_total", "again", ("rule",)) is c
+
+
+def test_refusals_are_counted_per_rule():
+    before = metrics.REFUSALS.value(rule="mkfs")
+    assert run_shell_safe("mkfs.ext4 /dev/sdb1", dry_run=True)["ok"] is False
+    assert metrics.REFUSALS.value(rule="mkfs") == before + 1
+    # reasons carry the command text; labels only the rule
+    before = metrics.REFUSALS.value(rule="parse_error")
+    run_shell_safe("echo 'unterminated /etc/secret", dry_run=True)
+    assert metrics.REFUSALS.value(rule="parse_error") == before + 1
+    ops.run_shell_safe("echo x > /etc/motd", dry_run=True)
+    ops.run_shell_script(["cat x > /etc/hosts"], dry_run=True)
+    assert metrics.REFUSALS.value(rule="unsafe_write") >= 2
+    assert not any("/etc" in line for line in metrics.REGISTRY.render().splitlines()
+                   if line.startswith("linops_refusals_total"))
+
+
+def test_http_endpoint_serves_metrics():
+    reg = metrics.Registry()
+    reg.counter("served_total", "x").inc()
+    srv = metrics.start_http_server(0, registry=reg)
+    try:
+        port = srv.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=2) as r:
+            assert r.status == 200
+            assert "served_total 1" in r.read().decode()
+    finally:
+        srv.shutdown()
+        metrics._SERVERS.pop(srv.server_address[1], None)
@@ -0,0 +1,39 @@
+import modal
+import pytest
+
+from runbooks import backend, ops
+from runbooks.catalog import OPS_RUNBOOKS, RUNBOOKS
+
+
+def test_local_backend_runs_ops_runbooks_in_process(monkeypatch):
+    res = backend.call("run_shell_script", backend="local", commands=["echo hi", "uname"],
+                       dry_run=False)
+    assert res["ok"] and [r["rc"] for r in res["results"]] == [0, 0]
+    assert res["results"][0]["out_tail"] == "hi\n"
+    refused = backend.call("run_shell_safe", backend="local", command="rm -rf /", dry_run=False)
+    assert refused == {"ok": False, "reason": "blocked by pattern: rm -rf", "command": "rm -rf /"}
+    assert backend.call("hello", backend="local").startswith("Hello from ")
+    # registry runbooks without an ops counterpart are reachable the same way
+    monkeypatch.setitem(RUNBOOKS, "noop_runbook",
+                        lambda dry_run=True: {"ok": True, "dry_run": dry_run})
+    res = backend.call("noop_runbook", backend="local", dry_run=False)
+    assert res == {"ok": True, "dry_run": False}
+    with pytest.raises(ValueError):
+        backend.call("hello", backend="ssh")
+
+
+def test_tail_logs_cursor_round_trip(tmp_path):
+    log = tmp_path / "app.log"
+    log.write_text("one\ntwo\n")
+    first = ops.tail_logs(str(log), lines=10)
+    assert first["ok"] and first["content_tail"].splitlines() == ["one", "two"]
+    with open(log, "a") as f:
+        f.write("three\n")
+    assert ops.tail_logs(str(log), cursor=first["cursor"])["content_tail"] == "three\n"
+    assert not ops.tail_logs("/etc/passwd")["ok"]
+
+
+def test_modal_app_wraps_every_ops_runbook():
+    from apps import modal_app
+    for name in OPS_RUNBOOKS:
+        assert isinstance(getattr(modal_app, name), modal.Function), name
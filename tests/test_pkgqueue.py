@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+
+from utils.fakeapt import FakeApt
+from utils.pkgqueue import PackageQueue
+
+
+def _queue(apt, **kw):
+    kw.setdefault("batch_window_s", 0.2)
+    return PackageQueue(run=apt.run, exec_argv=apt.exec_argv,
+                        allow={"jq", "htop", "curl", "git", "redis"},
+                        lists_dir=apt.lists_dir, stamp=apt.stamp, **kw)
+
+
+def test_concurrent_installs_share_one_transaction_and_one_update(tmp_path):
+    apt = FakeApt(tmp_path, available={"jq", "htop", "curl", "git"})
+    q = _queue(apt)
+    results = {}
+    threads = [threading.Thread(target=lambda p=p: results.__setitem__(p, q.install([p])))
+               for p in ("jq", "htop", "curl")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    installs = [c for c in apt.calls() if c[:2] == ["apt-get", "install"]]
+    assert [sorted(c[3:]) for c in installs] == [["curl", "htop", "jq"]]
+    updates = [c for c in apt.calls() if c[:2] == ["apt-get", "update"]]
+    assert updates == [["apt-get", "update", "-y"]]
+    assert all(r["ok"] and r["batch"]["requests"] == 3 for r in results.values())
+    assert results["jq"]["packages"] == {"jq": {"status": "installed", "version": "1.0-fake"}}
+
+    # index now fresh and jq present: no update, no transaction for an already-installed package
+    again = q.install(["jq", "git"])
+    assert again["packages"]["jq"]["status"] == "already_installed"
+    assert again["packages"]["git"]["status"] == "installed"
+    assert [c[0:2] for c in apt.calls()].count(["apt-get", "update"]) == 1
+    assert not q.install(["jq"])["steps"][1:]  # only the dpkg-query: nothing to do
+
+
+def test_stale_index_is_refreshed_and_failures_are_per_package(tmp_path):
+    apt = FakeApt(tmp_path, available={"jq", "htop"})
+    q = _queue(apt, batch_window_s=0, max_index_age_s=60)
+    apt.run("apt-get update -y")
+    old = time.time() - 3600
+    os.utime(apt.lists_dir, (old, old))
+    q.install(["jq"])
+    assert [c[0:2] for c in apt.calls()].count(["apt-get", "update"]) == 2
+
+    res = q.install(["htop", "redis"])  # allowlisted, but not a real package name here
+    assert not res["ok"]
+    assert res["packages"] == {"htop": {"status": "installed", "version": "1.0-fake"},
+                               "redis": {"status": "failed", "version": None}}
+    assert apt.installed() == ["htop", "jq"]
+    refused = q.install(["jq", "nmap"])
+    assert not refused["ok"] and refused["packages"]["nmap"]["status"] == "refused"
+
+
+def test_status_check_reads_all_of_dpkg_query_output(tmp_path):
+    # a listing far longer than run()'s 2000-char tail: nothing may be reported missing
+    pkgs = [f"lib-package-with-a-long-name-{i:03d}" for i in range(120)]
+    apt = FakeApt(tmp_path, available=pkgs)
+    apt.run("apt-get install -y " + " ".join(pkgs))
+    q = PackageQueue(run=apt.run, exec_argv=apt.exec_argv, lists_dir=apt.lists_dir, stamp=apt.stamp)
+    status = q.query(pkgs)
+    assert all(s["installed"] for s in status.values())
+    assert q.install(pkgs)["packages"][pkgs[0]]["status"] == "already_installed"
@@ -22,3 +22,22 @@ def test_auto_fallback_safe_default():
 def test_llm_mode_when_unconfigured_falls_back_safely():
     out = _names("novel request", mode="llm")
     assert len(out) >= 1
+
+
+def test_plan_many_matches_plan_actions_and_batches_llm(monkeypatch):
+    import planner.plan as plan_mod
+    from planner import llm
+    queries = ["free disk and check cpu/mem", "FREE  disk and check CPU/mem", "novel request",
+               "web server crashed, restart and verify", "novel request", "another novel one", ""]
+    for mode in ("auto", "rules", "llm"):
+        got = plan_mod.plan_many(queries, mode=mode)
+        assert got == [plan_actions(q, mode=mode) for q in queries], mode
+
+    calls = []
+    monkeypatch.setattr(llm, "llm_enabled", lambda: True)
+    monkeypatch.setattr(llm, "LLM_BATCH_SIZE", 2)
+    monkeypatch.setattr(llm, "audit_log", lambda event, **kw: calls.append((event, kw["queries"])))
+    plan_mod.plan_many(queries)
+    # distinct unresolved queries only, two per prompt
+    assert calls == [("llm_plan_skipped_placeholder", ["novel request", "another novel one"]),
+                     ("llm_plan_skipped_placeholder", [""])]
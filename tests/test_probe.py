@@ -0,0 +1,30 @@
+import http.server
+import threading
+
+from utils.probe import http_status, process_running, wait_until
+
+
+def test_wait_until_backs_off_and_times_out():
+    calls = []
+    res = wait_until(lambda: calls.append(1) or len(calls) >= 3, timeout_s=2, initial_s=0.01)
+    assert res["ok"] is True and res["attempts"] == 3
+    res2 = wait_until(lambda: False, timeout_s=0.05, initial_s=0.01)
+    assert res2["ok"] is False and res2["attempts"] >= 2
+
+
+def test_process_running_reads_comm(tmp_path):
+    (tmp_path / "42").mkdir()
+    (tmp_path / "42" / "comm").write_text("nginx\n")
+    (tmp_path / "self").mkdir()
+    assert process_running("nginx", proc_root=str(tmp_path)) is True
+    assert process_running("postgres", proc_root=str(tmp_path)) is False
+
+
+def test_http_status_against_local_server():
+    srv = http.server.HTTPServer(("127.0.0.1", 0), http.server.SimpleHTTPRequestHandler)
+    threading.Thread(target=srv.handle_request, daemon=True).start()
+    try:
+        assert http_status(f"http://127.0.0.1:{srv.server_port}/") == 200
+    finally:
+        srv.server_close()
+    assert http_status("http://127.0.0.1:9/", timeout_s=0.2) is None
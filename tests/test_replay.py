@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+import utils.audit
+
+
+def _write(path, records):
+    path.write_text("".join(json.dumps(r) + "\n" for r in records) + "{torn")
+
+
+def test_replay_reports_latency_and_plan_diffs(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.audit, "AUDIT_DIR", str(tmp_path))
+    monkeypatch.setattr(utils.audit, "AUDIT_PATH", str(tmp_path / "audit.jsonl"))
+    from bench import replay
+
+    src = tmp_path / "prod.jsonl"
+    _write(src, [
+        {"event": "plan", "ts": 100.0, "query": "free disk and check cpu/mem",
+         "plan": [{"name": "free_disk", "kwargs": {}}, {"name": "check_cpu_mem", "kwargs": {}}]},
+        # recorded by an older planner: now maps to the fakesvc heal
+        {"event": "plan", "ts": 100.2, "query": "web server crashed, restart and verify",
+         "plan": [{"name": "check_cpu_mem", "kwargs": {}}]},
+        {"event": "do", "ts": 100.4, "query": "free disk and check cpu/mem", "dry_run": True,
+         "results": [{"step": "free_disk", "ok": True}, {"step": "check_cpu_mem", "ok": True}]},
+        {"event": "shell_exec", "ts": 100.5, "cmd": "uptime"},
+    ])
+    reqs = replay.load(str(src))
+    assert [r["target"] for r in reqs] == ["plan", "plan", "do"]
+    offsets = replay.schedule(reqs, speedup=2, loops=2)
+    assert offsets == pytest.approx([0.0, 0.1, 0.2, 0.3, 0.4, 0.5])
+
+    report = replay.replay(reqs, speedup=4, workers=2, loops=2,
+                           audit_dir=str(tmp_path / "replay-audit"))
+    assert report["requests"] == 6 and report["errors"] == {}
+    assert report["wall_s"] >= 0.25  # open loop: the schedule is kept
+    assert report["targets"]["plan"]["requests"] == 4 and report["targets"]["do"]["failed"] == 0
+    latency = report["targets"]["do"]["latency"]
+    assert set(latency) == {"mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms"}
+    diffs = report["plan_diffs"]
+    assert (diffs["count"], diffs["distinct"]) == (2, 1)
+    assert diffs["examples"][0]["replayed"] == [{"name": "heal_fakesvc_8080", "kwargs": {}}]
+    # replayed `do` calls audited into audit_dir, not the default log; the redirect is undone
+    assert (tmp_path / "replay-audit" / "audit.jsonl").stat().st_size > 0
+    assert not (tmp_path / "audit.jsonl").exists()
+    assert utils.audit.AUDIT_PATH == str(tmp_path / "audit.jsonl")
+
+
+def test_load_expands_plan_batch_records(tmp_path):
+    from bench import replay
+
+    src = tmp_path / "batch.jsonl"
+    _write(src, [{"event": "plan_batch", "ts": 5.0, "queries": 3, "plans": [
+        {"query": "free disk and check cpu/mem", "count": 2,
+         "plan": [{"name": "free_disk", "kwargs": {}}, {"name": "check_cpu_mem", "kwargs": {}}]},
+        {"query": "nonsense phrase", "count": 1,
+         "plan": [{"name": "check_cpu_mem", "kwargs": {}}]}]}])
+    reqs = replay.load(str(src))
+    assert [r["query"] for r in reqs] == ["free disk and check cpu/mem"] * 2 + ["nonsense phrase"]
+    assert reqs[2]["recorded"] == [{"name": "check_cpu_mem", "kwargs": {}}]
+    assert replay.load(str(src), targets=("do",)) == []
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from planner.plan import Step
+from utils import serialize
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def backend(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(serialize, "orjson", None)
+    elif serialize.orjson is None:
+        pytest.skip("orjson not installed")
+    return request.param
+
+
+def test_encodes_steps_and_odd_types_the_same_on_both_backends(backend):
+    obj = {"plan": [Step("free_disk", {"mount": "/"})], "tags": ("a",), "msg": "ünïcode", 1: "k"}
+    line = serialize.dumps_bytes(obj, newline=True)
+    assert line.endswith(b"\n") and b"\n" not in line[:-1]
+    assert json.loads(line) == {"plan": [{"name": "free_disk", "kwargs": {"mount": "/"}}],
+                                "tags": ["a"], "msg": "ünïcode", "1": "k"}
+    assert serialize.loads(serialize.dumps(obj)) == json.loads(line)
+
+
+def test_pretty_and_compact(backend):
+    obj = {"a": [1, 2]}
+    assert serialize.dumps(obj) == '{"a":[1,2]}'
+    assert serialize.dumps(obj, pretty=True) == json.dumps(obj, indent=2)
+
+
+def test_huge_ints_fall_back_to_stdlib():
+    assert serialize.loads(serialize.dumps_bytes({"n": 2 ** 70})) == {"n": 2 ** 70}
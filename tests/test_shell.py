@@ -1,8 +1,13 @@
+import pytest
+
+import utils.audit
+from runbooks import ops
 from utils.shell import is_safe_command, run_shell_safe
 
 
 def test_refusal_blocks_dangerous_command(tmp_path, monkeypatch):
-    monkeypatch.setenv("LINOPS_AUDIT_DIR", str(tmp_path))
+    monkeypatch.setattr(utils.audit, "AUDIT_DIR", str(tmp_path))
+    monkeypatch.setattr(utils.audit, "AUDIT_PATH", str(tmp_path / "audit.jsonl"))
     ok, reason = is_safe_command("rm -rf / --no-preserve-root")
     assert ok is False and "blocked token" in reason
     res = run_shell_safe("rm -rf / --no-preserve-root", dry_run=False)
@@ -11,8 +16,66 @@ def test_refusal_blocks_dangerous_command(tmp_path, monkeypatch):
 
 
 def test_dry_run_and_exec(tmp_path, monkeypatch):
-    monkeypatch.setenv("LINOPS_AUDIT_DIR", str(tmp_path))
+    monkeypatch.setattr(utils.audit, "AUDIT_DIR", str(tmp_path))
+    monkeypatch.setattr(utils.audit, "AUDIT_PATH", str(tmp_path / "audit.jsonl"))
     res1 = run_shell_safe("echo hello", dry_run=True)
     assert res1["ok"] is True and res1["dry_run"] is True
     res2 = run_shell_safe("echo hello", dry_run=False)
     assert res2["ok"] is True and res2["rc"] == 0 and "hello" in res2["stdout"]
+
+
+def test_screen_is_shell_aware():
+    # arguments and quoted text don't trip rules; wrappers, sh -c and substitutions can't hide
+    assert is_safe_command("grep shutdown /var/log/syslog") == (True, None)
+    assert is_safe_command('echo "rm -rf /"') == (True, None)
+    assert is_safe_command("rm -rf build/") == (True, None)
+    for bad in ("sudo rm -fr /", "bash -c reboot", "ls $(mkfs /dev/sdb)", ":(){ :|:& };:"):
+        assert is_safe_command(bad)[0] is False, bad
+    assert is_safe_command("echo 'unterminated")[1].startswith("unparseable")
+
+
+CHECKS, CHECK_IDS = [is_safe_command, ops.is_safe_command], ["utils.shell", "runbooks.ops"]
+
+
+@pytest.mark.parametrize("check", CHECKS, ids=CHECK_IDS)
+@pytest.mark.parametrize("cmd", [
+    # a shell reading its script from a pipe, here-string or heredoc
+    "echo reboot | sh", "sh <<< reboot", "bash <<EOF\nreboot\nEOF",
+    # power verbs through systemd
+    "systemctl reboot", "systemctl poweroff", "loginctl halt", "systemctl kexec",
+    "systemctl start poweroff.target",
+    # wrappers whose argument is itself a command
+    "busybox reboot", "watch reboot", "watch -n 5 'rm -rf /'", "ssh localhost reboot",
+    "ssh -p 22 -o BatchMode=yes root@db1 'shutdown -h now'", "su -c reboot",
+    "su root -c 'mkfs /dev/sdb'",
+    # the program is only known after expansion
+    "$(echo reboot)", "`echo reboot`", "$CMD now", "/sbin/re*t",
+    # recursive deletes of absolute paths below the root level
+    "rm -rf /usr/lib", "rm -rf /var/lib/mysql", "rm -rf /home/user", "rm -rf ~/",
+    # scripts that run commands of their own, and at(1) jobs queued from stdin
+    "awk 'BEGIN{system(\"reboot\")}'", "sed -n '1e reboot' f", "sed 's/x/reboot/e' f",
+    "python3 -c 'import os; os.system(\"reboot\")'", "perl -e 'system \"shutdown -h now\"'",
+    "echo reboot | at now", "batch <<< reboot",
+])
+def test_both_screens_refuse(check, cmd):
+    assert check(cmd)[0] is False, cmd
+
+
+@pytest.mark.parametrize("check", CHECKS, ids=CHECK_IDS)
+def test_both_screens_allow_routine_commands(check):
+    for cmd in ("systemctl restart nginx", "journalctl -u nginx | tail -n 50",
+                "bash /opt/app/check.sh", "watch -n 1 df -h", "ssh db1 uptime", "busybox ls /tmp",
+                "[ -f /etc/hosts ] && echo ok", "echo hi | cat",
+                "awk '/err|warn/ {print $1}' /var/log/syslog", "sed -n '1,5p' f",
+                "python3 -c 'print(1)'", "at -f /opt/app/job.sh now"):
+        assert check(cmd) == (True, None), cmd
+
+
+@pytest.mark.parametrize("cmd", [
+    "awk '{print > \"/etc/passwd\"}' /tmp/x", "sed -n 'w /etc/cron.d/x' f",
+    "sed 's/a/b/w /etc/x' f",
+])
+def test_ops_refuses_script_writes_outside_safe_prefixes(cmd):
+    ok, reason = ops.is_safe_command(cmd)
+    assert ok is False and "outside" in reason, cmd
+    assert ops.is_safe_command("awk '{print > \"/tmp/out\"}' f") == (True, None)
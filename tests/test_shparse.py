@@ -0,0 +1,55 @@
+import os
+
+from utils import shparse
+
+
+def _names(cmd):
+    return [s.name for s in shparse.parse(cmd).segments if s.argv]
+
+
+def test_splits_lists_pipelines_subshells_and_substitutions():
+    assert _names("ls -la | grep x && (cd /etc; cat passwd) || echo 'a | b'") == \
+        ["ls", "grep", "cd", "cat", "echo"]
+    assert _names('echo "$(id -u)" `hostname` <(df -h)') == ["echo", "id", "hostname", "df"]
+    assert _names("sudo -u root env A=1 nice -n 5 timeout 5 r''m -fr /") == ["rm"]
+    assert _names("bash -lc 'reboot'") == ["bash", "reboot"]
+    assert _names("find / -exec rm -rf {} \\;") == ["find", "rm"]
+    assert _names("busybox sh -c 'watch -n 1 reboot'") == ["sh", "watch", "reboot"]
+    assert _names("ssh -i key -p 22 host 'df -h; uptime'") == ["ssh", "df", "uptime"]
+    assert [s.piped for s in shparse.parse("echo x | (sh); cat").segments] == [False, True, False]
+    assert _names("cat <<EOF\nrm -rf /\nEOF\nuptime") == ["cat", "uptime"]
+    bomb = shparse.parse(":(){ :|:& };:").segments
+    assert any(s.func == ":" and s.name == ":" for s in bomb)
+    assert shparse.parse("echo 'oops").error == "unterminated quote"
+
+
+def test_redirections_and_readonly_classification():
+    p = shparse.parse("du -x / 2>/dev/null | sort -nr > /tmp/du.txt 2>&1; tee -a /etc/hosts < x")
+    assert p.write_targets == ("/dev/null", "/tmp/du.txt", "/etc/hosts")
+    assert [s.redirects[-1].writes_file for s in p.segments if s.redirects][:2] == [True, False]
+    assert shparse.parse("ps aux | grep nginx | head -n 5 2>/dev/null").readonly
+    assert not shparse.parse("sed -i s/a/b/ f").readonly
+    assert not shparse.parse("cat x > /tmp/y").readonly
+    assert not shparse.parse("ls; reboot").readonly
+    assert not shparse.parse("awk 'BEGIN{system(\"id\")}'").readonly
+    assert shparse.parse("sed -n 'w /etc/x' f").segments[0].write_targets == ("/etc/x",)
+
+
+def test_parse_is_cached_and_rules_use_declaration_order():
+    assert shparse.parse("df -h /") is shparse.parse("df -h /")
+    rules = shparse.RuleSet([
+        ("any-force", None, lambda s: s.has_flag("f", "force")),
+        ("rm-recursive", ("rm",), lambda s: s.has_flag("r", "R", "recursive")),
+    ])
+    assert rules.first_hit(shparse.parse("rm --recursive --force /tmp/x")) == "any-force"
+    assert rules.first_hit(shparse.parse("rm -R /tmp/x")) == "rm-recursive"
+    # read-only commands are checked too
+    assert rules.first_hit(shparse.parse("cat -f x")) == "any-force"
+
+
+def test_direct_argv_only_for_plain_commands():
+    argv = shparse.direct_argv("df -h '/'")
+    assert argv is not None and os.path.basename(argv[0]) == "df" and argv[1:] == ["-h", "/"]
+    for needs_shell in ("free -h || head /proc/meminfo", "echo $HOME", "ls *.py", "cd /tmp",
+                        "FOO=1 env", "du / 2>/dev/null", "no-such-binary-xyz"):
+        assert shparse.direct_argv(needs_shell) is None, needs_shell
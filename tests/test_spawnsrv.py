@@ -0,0 +1,100 @@
+import sys
+import threading
+import time
+
+import pytest
+
+import utils.audit
+from utils import shell, spawnsrv
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(spawnsrv, "ENABLED", True)
+    yield spawnsrv.start()
+    spawnsrv.stop()
+
+
+def test_runs_commands_and_returns_rc_and_tails(server):
+    p = spawnsrv.run(["/bin/sh", "-c", "echo out; echo err >&2; exit 3"])
+    assert (p.returncode, p.stdout, p.stderr) == (3, "out\n", "err\n")
+    tail = server.run(["/bin/sh", "-c", "printf 'x%.0s' $(seq 1 5000); echo END"], tail=100)
+    assert len(tail["stdout"]) == 100 and tail["stdout"].endswith("END\n")
+    assert spawnsrv.run(["no-such-binary-xyz"]).returncode == 127
+    p = spawnsrv.run(["sleep", "5"], budget=spawnsrv.Budget(wall_s=0.2))
+    assert p.timed_out and p.returncode == -15
+
+
+def test_concurrent_requests_and_restart_after_crash(server):
+    out = []
+    threads = [threading.Thread(
+        target=lambda i=i: out.append(spawnsrv.run(["echo", str(i)]).stdout)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(out) == [f"{i}\n" for i in range(6)]
+    server.proc.kill()
+    server.proc.wait()
+    assert spawnsrv.run(["echo", "again"]).stdout == "again\n"
+    assert spawnsrv.start() is not server
+
+
+def test_shell_runner_uses_it_transparently(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.audit, "AUDIT_DIR", str(tmp_path))
+    monkeypatch.setattr(utils.audit, "AUDIT_PATH", str(tmp_path / "audit.jsonl"))
+    res = shell.run_shell_safe("echo hello | tr a-z A-Z", dry_run=False)
+    assert res["ok"] and res["stdout"] == "HELLO\n"
+    res = shell.run_shell_safe("pwd", dry_run=False, cwd=str(tmp_path))
+    assert res["stdout"].strip() == str(tmp_path)
+
+
+def _gone(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] == "Z"  # killed, awaiting its reaper
+    except FileNotFoundError:
+        return True
+
+
+@pytest.mark.parametrize("helper", [False, True])
+def test_budget_limits_cpu_memory_and_niceness(helper, monkeypatch):
+    monkeypatch.setattr(spawnsrv, "ENABLED", helper)
+    try:
+        spin = spawnsrv.run(["/bin/sh", "-c", "while :; do :; done"],
+                            budget=spawnsrv.Budget(cpu_s=1, wall_s=20))
+        assert spin.returncode == -24 and not spin.timed_out  # SIGXCPU at the soft limit
+        assert spin.rusage["cpu_user_s"] + spin.rusage["cpu_sys_s"] >= 0.9
+        hog = spawnsrv.run([sys.executable, "-c", "bytearray(512 * 2**20)"],
+                           budget=spawnsrv.Budget(mem_mb=256))
+        assert hog.returncode == 1 and "MemoryError" in hog.stderr
+        base = int(spawnsrv.run(["nice"]).stdout)
+        niced = spawnsrv.run(["nice"], budget=spawnsrv.Budget(nice=5))
+        assert int(niced.stdout) == min(base + 5, 19)
+    finally:
+        spawnsrv.stop()
+
+
+@pytest.mark.parametrize("helper", [False, True])
+def test_wall_budget_kills_the_whole_process_group(helper, monkeypatch, tmp_path):
+    monkeypatch.setattr(spawnsrv, "ENABLED", helper)
+    try:
+        t0 = time.monotonic()
+        p = spawnsrv.run(["/bin/sh", "-c", "sleep 30 & echo $! > bg.pid; sleep 30; wait"],
+                         cwd=str(tmp_path), budget=spawnsrv.Budget(wall_s=0.3))
+        assert p.timed_out and time.monotonic() - t0 < 5
+        bg = int((tmp_path / "bg.pid").read_text())
+        time.sleep(0.1)
+        assert _gone(bg)
+        assert set(p.rusage) >= {"wall_s", "cpu_user_s", "cpu_sys_s", "max_rss_kb",
+                                 "io_read_blocks"}
+    finally:
+        spawnsrv.stop()
+
+
+def test_shell_runner_reports_timeouts_and_rusage(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.audit, "AUDIT_DIR", str(tmp_path))
+    monkeypatch.setattr(utils.audit, "AUDIT_PATH", str(tmp_path / "audit.jsonl"))
+    res = shell.run_shell_safe("sleep 5", dry_run=False, timeout=0.2)
+    assert res["timed_out"] and not res["ok"]
+    assert shell.run_shell_safe("true", dry_run=False)["rusage"]["max_rss_kb"] > 0
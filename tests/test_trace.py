@@ -0,0 +1,43 @@
+import json
+
+from typer.testing import CliRunner
+
+import cli.main as cli
+from utils import trace
+
+
+def test_disabled_tracing_is_a_shared_noop():
+    trace.disable()
+    a, b = trace.span("x"), trace.span("y", k=1)
+    assert a is b and a.timing() == {}
+    with a:
+        assert trace.current() is None
+
+
+def test_nested_spans_export_otlp_json(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    trace.enable(str(path))
+    try:
+        with trace.span("root", q="demo") as root:
+            with trace.span("child", cmd="export TOKEN=abc") as child:
+                sum(range(1000))
+        assert child.parent is root and child.trace_id == root.trace_id
+        assert root.timing()["wall_ms"] >= child.timing()["wall_ms"]
+    finally:
+        trace.disable()
+    spans = json.loads(path.read_text())["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    by_name = {s["name"]: s for s in spans}
+    assert by_name["child"]["parentSpanId"] == by_name["root"]["spanId"]
+    assert "abc" not in json.dumps(by_name["child"]["attributes"])
+
+
+def test_do_attaches_step_timings_when_enabled(tmp_path):
+    trace.enable(str(tmp_path / "traces.jsonl"))
+    try:
+        r = CliRunner().invoke(cli.app, ["do", "free disk and check cpu/mem"])
+    finally:
+        trace.disable()
+    data = json.loads(r.stdout)
+    assert {"plan", "audit", "total"} <= set(data["timings"])
+    assert all("wall_ms" in res["timing"] for res in data["results"])
+    assert (tmp_path / "traces.jsonl").exists()
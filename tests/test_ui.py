@@ -1,6 +1,8 @@
 # tests/test_ui.py
+import pytest
 from typer.testing import CliRunner
 import cli.main as cli
+import cli.ui as ui
 from cli.ui import show_plan, show_results, show_refusal
 
 
@@ -50,3 +52,48 @@ def test_cli_pretty_plan_and_call_and_do():
     r3 = runner.invoke(cli.app, [
                        "do", "web server crashed, restart and verify", "--yes", "--pretty", "--no-json"])
     assert r3.exit_code == 0 and "Execution (applied)" in r3.stdout and "heal_fakesvc_8080" in r3.stdout
+
+
+@pytest.mark.parametrize("use_rich", [True, False])
+def test_large_tables_stream_in_chunks(monkeypatch, use_rich):
+    monkeypatch.setattr(ui, "_USE_RICH", use_rich)
+    monkeypatch.setattr(ui, "SAMPLE_ROWS", 20)
+    monkeypatch.setattr(ui, "CHUNK_ROWS", 10)
+    consumed = []
+
+    def rows():
+        for i in range(1000):
+            consumed.append(i)
+            yield [str(i), "x" * (i % 7 if i < 20 else 50)]
+
+    pages = ui._pages(ui._limited(rows(), 0, [0]), 0)
+    chunks = (ui._rich_chunks if use_rich else ui._ascii_chunks)("Big", ["#", "Note"], pages, 1000)
+    first = next(chunks)
+    # widths come from the sampled prefix (both look one chunk ahead) and the row count
+    assert "Big" in first and len(consumed) <= 31
+    text = first + "".join(chunks)
+    assert len(consumed) == 1000 and "999" in text
+    assert "x" * 50 not in text  # later cells are cut to the sampled width
+    assert text.count("Note") == 1
+
+
+def test_table_truncation_and_pagination(capsys, monkeypatch):
+    monkeypatch.setattr(ui, "_USE_RICH", False)
+    ui._print_table("Paged", ["#", "Step"], ([str(i), f"s{i}"] for i in range(25)),
+                    max_rows=10, page_rows=4)
+    out = capsys.readouterr().out
+    assert "s9" in out and "s10" not in out
+    assert out.count(" # ") == 3  # header on rows 1, 5 and 9
+    assert "15 more row(s) not shown" in out
+
+
+@pytest.mark.parametrize("use_rich", [True, False])
+def test_short_table_keeps_long_cells_whole(capsys, monkeypatch, use_rich):
+    monkeypatch.setattr(ui, "_USE_RICH", use_rich)
+    monkeypatch.setattr(ui, "MAX_CELL", 20)
+    if use_rich:
+        monkeypatch.setattr(ui._console, "width", 400)  # so rich itself doesn't wrap the cell
+    note = "n" * 150
+    ui._print_table("Short", ["#", "Note"], [["1", note], ["2", "ok"]])
+    assert note in capsys.readouterr().out
+    assert ui._widths(["#", "Note"], [["1", note]]) == [1, 20]  # streamed/paged tables still cap
@@ -1,21 +1,52 @@
 # Append-only audit log: one JSON record per event, written to audit/audit.jsonl
+# (LINOPS_AUDIT_FORMAT=binary|both also/instead writes compact segments, see utils/auditbin.py)
 
-import json
+import contextlib
 import os
 import time
 import uuid
 from datetime import datetime
 
+from utils import auditbin, serialize, trace
+from utils.redact import redact_obj
+
 # Directory can be overridden for tests via env var
 AUDIT_DIR = os.environ.get("LINOPS_AUDIT_DIR", "audit")
 os.makedirs(AUDIT_DIR, exist_ok=True)
 
 AUDIT_PATH = os.path.join(AUDIT_DIR, "audit.jsonl")
+AUDIT_FORMAT = os.environ.get("LINOPS_AUDIT_FORMAT", "jsonl")  # jsonl | binary | both
+
+_binary = None
+
+
+def _binary_writer() -> auditbin.BinaryAuditWriter:
+    global _binary
+    if _binary is None or _binary.audit_dir != AUDIT_DIR:
+        _binary = auditbin.BinaryAuditWriter(AUDIT_DIR)
+    return _binary
+
+
+@contextlib.contextmanager
+def redirect(audit_dir: str):
+    """
+    Send audit_log writes to audit_dir/ for the duration of the block (harnesses, tests).
+    AUDIT_DIR is read from the env once, at import, so setting LINOPS_AUDIT_DIR later has no effect.
+    """
+    global AUDIT_DIR, AUDIT_PATH
+    saved = AUDIT_DIR, AUDIT_PATH
+    os.makedirs(audit_dir, exist_ok=True)
+    AUDIT_DIR, AUDIT_PATH = audit_dir, os.path.join(audit_dir, "audit.jsonl")
+    try:
+        yield AUDIT_PATH
+    finally:
+        AUDIT_DIR, AUDIT_PATH = saved
 
 
 def audit_log(event: str, **payload):
     """
     Write a single audit record (plan/do/refusal/shell_exec/etc.).
+    Payload strings are redacted before anything touches disk.
     Returns the record dict so callers can reuse it in responses/tests.
     """
     record = {
@@ -23,8 +54,18 @@ def audit_log(event: str, **payload):
         "event": event,                          # e.g., "plan", "do", "refusal", "shell_exec"
         "ts": time.time(),                       # unix timestamp (float)
         "iso": datetime.utcnow().isoformat() + "Z",  # ISO8601 timestamp (UTC)
-        **payload,                               # any additional fields provided by caller
+        **redact_obj(payload),                   # any additional fields provided by caller
     }
-    with open(AUDIT_PATH, "a", encoding="utf-8") as f:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    sp = trace.current()
+    if sp is not None:
+        record["trace_id"] = sp.trace_id         # join audit records to exported traces
+        record["span_id"] = sp.span_id
+    # only time the write as part of a larger trace; a lone audit write isn't worth a trace
+    with trace.span("audit_write", event=event) if sp is not None else contextlib.nullcontext():
+        if AUDIT_FORMAT != "binary":
+            line = serialize.dumps_bytes(record, newline=True)
+            with open(AUDIT_PATH, "ab") as f:
+                f.write(line)
+        if AUDIT_FORMAT in ("binary", "both"):
+            _binary_writer().append(record)
     return record
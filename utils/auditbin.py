@@ -0,0 +1,230 @@
+# Optional binary audit sink (LINOPS_AUDIT_FORMAT=binary or both), readable back as JSONL.
+#
+# Segment files <audit dir>/audit-<first ts ms>.lab, rotated at SEGMENT_BYTES:
+#   file   := b"LAB1" frame*
+#   frame  := u32 body_len | body                                  (little-endian)
+#   body   := u16 event_id | 16-byte raw uuid | f64 ts | u8 codec | [u8 len | name] | payload
+# event_id indexes EVENTS (a fixed, append-only table, so every record is self-contained and
+# concurrent writers never have to agree on an intern table); 0xFFFF means the name follows
+# inline. "iso" is not stored (it is derived from ts on export). The payload is every other field,
+# msgpack-encoded when msgpack is installed, compact JSON otherwise (codec byte says which), and
+# zlib-compressed (codec | 0x80) when it is large enough for that to pay off: shell output tails
+# dominate record size and compress several-fold.
+#
+# Each segment has a sidecar <segment>.idx of (f64 ts, u64 offset) entries, one per record, so
+# reads with `since` seek straight to the first matching frame; event filters skip payload
+# decoding entirely. Frames are written with a single O_APPEND write, like the JSONL sink.
+
+import bisect
+import os
+import struct
+import uuid
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from utils import serialize
+
+try:
+    import msgpack  # type: ignore
+except ImportError:  # optional: JSON payloads otherwise
+    msgpack = None  # type: ignore[assignment]
+
+MAGIC = b"LAB1"
+SEGMENT_BYTES = int(os.getenv("LINOPS_AUDIT_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+
+# append-only: ids are persisted in files, never reorder or remove entries
+EVENTS: Tuple[str, ...] = (
+    "plan", "do", "refusal", "shell_dry_run", "shell_exec", "spawn_proc", "fleet_do",
+    "llm_plan_unconfigured", "llm_plan_skipped_placeholder",
+)
+_EVENT_IDS = {name: i for i, name in enumerate(EVENTS)}
+_INLINE = 0xFFFF
+
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+CODEC_ZLIB = 0x80
+COMPRESS_MIN_BYTES = int(os.getenv("LINOPS_AUDIT_COMPRESS_MIN_BYTES", "256"))  # 0: never compress
+
+_LEN = struct.Struct("<I")
+_HEAD = struct.Struct("<H16sdB")
+_IDX = struct.Struct("<dQ")
+_RESERVED = ("id", "event", "ts", "iso")
+
+
+# --- encoding ---------------------------------------------------------------------
+def encode(record: Dict[str, Any]) -> bytes:
+    """One frame (length prefix included) for an audit record dict."""
+    name = record["event"]
+    event_id = _EVENT_IDS.get(name, _INLINE)
+    payload = {k: v for k, v in record.items() if k not in _RESERVED}
+    if msgpack is not None:
+        try:
+            body_payload, codec = msgpack.packb(payload, default=serialize._default), CODEC_MSGPACK
+        except (TypeError, ValueError, OverflowError):
+            body_payload, codec = serialize.dumps_bytes(payload), CODEC_JSON
+    else:
+        body_payload, codec = serialize.dumps_bytes(payload), CODEC_JSON
+    if COMPRESS_MIN_BYTES and len(body_payload) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(body_payload, 1)
+        if len(packed) < len(body_payload):
+            body_payload, codec = packed, codec | CODEC_ZLIB
+    body = _HEAD.pack(event_id, uuid.UUID(record["id"]).bytes, float(record["ts"]), codec)
+    if event_id == _INLINE:
+        raw = name.encode("utf-8")[:255]
+        body += bytes((len(raw),)) + raw
+    body += body_payload
+    return _LEN.pack(len(body)) + body
+
+
+def _decode_head(body: bytes) -> Tuple[str, int]:
+    """(event name, payload offset) without touching the payload."""
+    event_id = _HEAD.unpack_from(body)[0]
+    if event_id != _INLINE:
+        return EVENTS[event_id], _HEAD.size
+    n = body[_HEAD.size]
+    return body[_HEAD.size + 1:_HEAD.size + 1 + n].decode("utf-8"), _HEAD.size + 1 + n
+
+
+def decode(body: bytes) -> Dict[str, Any]:
+    """Frame body -> the audit record dict as the JSONL sink would have written it."""
+    _, raw_id, ts, codec = _HEAD.unpack_from(body)
+    event, off = _decode_head(body)
+    raw = memoryview(body)[off:]
+    if codec & CODEC_ZLIB:
+        raw = zlib.decompress(raw)
+    if codec & ~CODEC_ZLIB == CODEC_MSGPACK:
+        if msgpack is None:
+            raise RuntimeError("segment has msgpack payloads; pip install msgpack to read it")
+        payload = msgpack.unpackb(raw, strict_map_key=False)
+    else:
+        payload = serialize.loads(raw)
+    h = raw_id.hex()  # str(uuid.UUID(bytes=...)) without building the object
+    return {
+        "id": f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}",
+        "event": event,
+        "ts": ts,
+        "iso": datetime.utcfromtimestamp(ts).isoformat() + "Z",
+        **payload,
+    }
+
+
+# --- writing ---------------------------------------------------------------------
+def _segments(audit_dir: str) -> List[str]:
+    try:
+        names = sorted(n for n in os.listdir(audit_dir)
+                       if n.startswith("audit-") and n.endswith(".lab"))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(audit_dir, n) for n in names]
+
+
+class BinaryAuditWriter:
+    def __init__(self, audit_dir: str, segment_bytes: int = SEGMENT_BYTES):
+        self.audit_dir = audit_dir
+        self.segment_bytes = segment_bytes
+        self._path: Optional[str] = None
+
+    def _segment(self, ts: float) -> str:
+        path = self._path
+        if path is None:
+            segs = _segments(self.audit_dir)
+            path = segs[-1] if segs else None
+        if path is None or os.path.getsize(path) >= self.segment_bytes:
+            path = os.path.join(self.audit_dir, f"audit-{int(ts * 1000):015d}.lab")
+            self._create(path)
+        self._path = path
+        return path
+
+    @staticmethod
+    def _create(path: str) -> None:
+        # write the magic to a private file, then link it into place: a concurrent writer sees
+        # either no segment or a complete header, never an empty file it could append to first
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass  # another writer created it in the same millisecond; share it
+        finally:
+            os.unlink(tmp)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        frame = encode(record)
+        path = self._segment(record["ts"])
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, frame)
+            # with O_APPEND our fd position is the end of what we just wrote
+            offset = os.lseek(fd, 0, os.SEEK_CUR) - len(frame)
+        finally:
+            os.close(fd)
+        fd = os.open(path[:-4] + ".idx", os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, _IDX.pack(float(record["ts"]), offset))
+        finally:
+            os.close(fd)
+
+
+# --- reading ---------------------------------------------------------------------
+def _start_offset(seg: str, since: Optional[float]) -> int:
+    if since is None:
+        return len(MAGIC)
+    try:
+        with open(seg[:-4] + ".idx", "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return len(MAGIC)
+    whole = len(raw) - len(raw) % _IDX.size
+    entries = [_IDX.unpack_from(raw, i) for i in range(0, whole, _IDX.size)]
+    # concurrent writers can interleave slightly out of ts order: take the earliest offset
+    # among entries at or after `since` rather than trusting a pure bisect on file order
+    ts_sorted = sorted(entries)
+    i = bisect.bisect_left(ts_sorted, (since, -1))
+    if i >= len(ts_sorted):
+        return -1  # nothing in this segment is new enough
+    return min(off for _, off in ts_sorted[i:])
+
+
+def iter_records(audit_dir: str, since: Optional[float] = None, until: Optional[float] = None,
+                 events: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Decoded records from all segments in order, filtered by time range and event name."""
+    want = set(events) if events else None
+    segs = _segments(audit_dir)
+    for n, seg in enumerate(segs):
+        # segment names carry their first ts: skip segments that end before `since`
+        if since is not None and n + 1 < len(segs):
+            if int(os.path.basename(segs[n + 1])[6:-4]) / 1000.0 < since:
+                continue
+        start = _start_offset(seg, since)
+        if start < 0:
+            continue
+        with open(seg, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{seg}: not a linops binary audit segment")
+            f.seek(start)
+            data = f.read()  # one read per segment; frames are sliced out of memory
+        pos, end = 0, len(data)
+        while pos + _LEN.size <= end:
+            n_body = _LEN.unpack_from(data, pos)[0]
+            body = data[pos + _LEN.size:pos + _LEN.size + n_body]
+            pos += _LEN.size + n_body
+            if len(body) < n_body:
+                break  # torn tail from a writer still mid-append
+            ts = _HEAD.unpack_from(body)[2]
+            if (since is not None and ts < since) or (until is not None and ts > until):
+                continue
+            if want is not None and _decode_head(body)[0] not in want:
+                continue
+            yield decode(body)
+
+
+def export_jsonl(audit_dir: str, out, since: Optional[float] = None,
+                 until: Optional[float] = None, events: Optional[Sequence[str]] = None) -> int:
+    """Write records as JSONL bytes to the binary file object `out`; returns the record count."""
+    n = 0
+    for rec in iter_records(audit_dir, since=since, until=until, events=events):
+        out.write(serialize.dumps_bytes(rec, newline=True))
+        n += 1
+    return n
@@ -0,0 +1,105 @@
+# Tiny local stand-in for apt-get / dpkg-query, so package code runs without root or a network:
+#     apt = FakeApt(tmp_path, available={"jq", "htop"})
+#     PackageQueue(run=apt.run, exec_argv=apt.exec_argv, lists_dir=apt.lists_dir,
+#                  stamp=apt.stamp).install(["jq"])
+# The shims live in <root>/bin and keep their state under <root>: installed/<pkg> files, a lists/
+# dir that `apt-get update` touches, and calls.log with one line per invocation. Like real apt,
+# an install with any unknown package installs nothing.
+
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Iterable, List
+
+_SHIM = """#!{python}
+import sys
+sys.path.insert(0, {repo!r})
+from utils.fakeapt import main
+sys.exit(main(sys.argv))
+"""
+
+
+class FakeApt:
+    def __init__(self, root: str, available: Iterable[str] = (), install_delay_s: float = 0.0):
+        self.root = str(root)
+        self.bin_dir = os.path.join(self.root, "bin")
+        self.lists_dir = os.path.join(self.root, "lists")
+        self.stamp = os.path.join(self.root, "update-success-stamp")
+        self.log = os.path.join(self.root, "calls.log")
+        for d in (self.bin_dir, os.path.join(self.root, "installed")):
+            os.makedirs(d, exist_ok=True)
+        with open(os.path.join(self.root, "available"), "w", encoding="utf-8") as f:
+            f.write("".join(f"{p}\n" for p in available))
+        with open(os.path.join(self.root, "delay"), "w", encoding="utf-8") as f:
+            f.write(str(install_delay_s))
+        repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        shim = os.path.join(self.bin_dir, "fakeapt")
+        with open(shim, "w", encoding="utf-8") as f:
+            f.write(_SHIM.format(python=sys.executable, repo=repo))
+        os.chmod(shim, 0o755)
+        for name in ("apt-get", "dpkg-query"):
+            link = os.path.join(self.bin_dir, name)
+            if not os.path.exists(link):
+                os.symlink("fakeapt", link)
+
+    def run(self, cmd: str) -> Dict[str, Any]:
+        """Run cmd with the shims first on PATH; same shape as modal_app.sh."""
+        env = {**os.environ, "PATH": self.bin_dir + os.pathsep + os.environ.get("PATH", "")}
+        p = subprocess.run(["/bin/sh", "-c", cmd], capture_output=True, text=True, env=env)
+        return {"rc": p.returncode, "out_tail": (p.stdout + p.stderr)[-2000:]}
+
+    def exec_argv(self, argv: List[str]) -> Dict[str, Any]:
+        """Exec argv (no shell) with the shims first on PATH; same shape as pkgqueue.exec_argv."""
+        env = {**os.environ, "PATH": self.bin_dir + os.pathsep + os.environ.get("PATH", "")}
+        p = subprocess.run(argv, capture_output=True, text=True, env=env)
+        return {"rc": p.returncode, "stdout": p.stdout}
+
+    def calls(self) -> List[List[str]]:
+        try:
+            with open(self.log, encoding="utf-8") as f:
+                return [line.split() for line in f]
+        except FileNotFoundError:
+            return []
+
+    def installed(self) -> List[str]:
+        return sorted(os.listdir(os.path.join(self.root, "installed")))
+
+
+def main(argv: List[str]) -> int:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(argv[0])))
+    name, args = os.path.basename(argv[0]), argv[1:]
+    with open(os.path.join(root, "calls.log"), "a", encoding="utf-8") as f:
+        f.write(" ".join([name, *args]) + "\n")
+    installed_dir = os.path.join(root, "installed")
+    if name == "dpkg-query":
+        pkgs = [a for a in args if not a.startswith("-")]
+        missing = 0
+        for p in pkgs:
+            if os.path.exists(os.path.join(installed_dir, p)):
+                sys.stdout.write(f"{p}\tinstalled\t1.0-fake\n")
+            else:
+                sys.stderr.write(f"dpkg-query: no packages found matching {p}\n")
+                missing += 1
+        return 1 if missing else 0
+    if name == "apt-get" and "update" in args:
+        os.makedirs(os.path.join(root, "lists"), exist_ok=True)
+        os.utime(os.path.join(root, "lists"))
+        print("Reading package lists... Done")
+        return 0
+    if name == "apt-get" and "install" in args:
+        pkgs = [a for a in args[args.index("install") + 1:] if not a.startswith("-")]
+        with open(os.path.join(root, "available"), encoding="utf-8") as f:
+            available = set(f.read().split())
+        unknown = [p for p in pkgs if p not in available]
+        if unknown:
+            sys.stderr.write("".join(f"E: Unable to locate package {p}\n" for p in unknown))
+            return 100
+        with open(os.path.join(root, "delay"), encoding="utf-8") as f:
+            time.sleep(float(f.read() or 0))
+        for p in pkgs:
+            open(os.path.join(installed_dir, p), "w").close()
+            print(f"Setting up {p} (1.0-fake) ...")
+        return 0
+    sys.stderr.write(f"fakeapt: unsupported: {name} {' '.join(args)}\n")
+    return 64
@@ -0,0 +1,83 @@
+# Tiny local stand-in for a database listener (postgres or mysql wire greeting).
+# Lets restart/readiness code be exercised without a real database:
+#     with FakeDBListener("postgres") as db: PostgresAdapter().probe(port=db.port)
+
+import socket
+import struct
+import threading
+from typing import Optional
+
+
+def _pg_error(code: str, msg: str) -> bytes:
+    body = b"SFATAL\x00C" + code.encode() + b"\x00M" + msg.encode() + b"\x00\x00"
+    return b"E" + struct.pack("!I", 4 + len(body)) + body
+
+
+def _mysql_packet(payload: bytes, seq: int = 0) -> bytes:
+    n = len(payload)
+    return bytes([n & 0xFF, (n >> 8) & 0xFF, (n >> 16) & 0xFF, seq]) + payload
+
+
+class FakeDBListener:
+    """
+    Accepts connections on 127.0.0.1 and answers like `engine` would.
+    Set `starting_up = True` to reply like a database that is still recovering.
+    """
+
+    def __init__(self, engine: str = "postgres", port: int = 0):
+        self.engine = engine
+        self.starting_up = False
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", port))
+        self._sock.listen(16)
+        self.port = self._sock.getsockname()[1]
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def _reply(self, conn: socket.socket) -> None:
+        if self.engine in ("mysql", "mariadb"):
+            if self.starting_up:
+                payload = b"\xff" + struct.pack("<H", 1040) + b"Too many connections"
+            else:
+                payload = b"\x0a" + b"8.0.36-fake\x00" + struct.pack("<I", 1) + b"\x00" * 20
+            conn.sendall(_mysql_packet(payload))
+            return
+        conn.recv(1024)  # StartupMessage
+        if self.starting_up:
+            conn.sendall(_pg_error("57P03", "the database system is starting up"))
+        else:
+            conn.sendall(b"R" + struct.pack("!II", 8, 5) + b"salt")  # md5 auth request
+
+    def _serve(self) -> None:
+        while not self._closed:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            with conn:
+                try:
+                    self._reply(conn)
+                except OSError:
+                    pass
+
+    def start(self) -> "FakeDBListener":
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._closed = True
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)  # wakes the thread blocked in accept()
+        except OSError:
+            pass
+        self._sock.close()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def __enter__(self) -> "FakeDBListener":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
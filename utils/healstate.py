@@ -0,0 +1,137 @@
+# Persistent auto-heal state (SQLite): attempt history, per-target rate limits, watcher leases.
+#
+# Every auto-heal pass used to be stateless, so a crash-looping service got restarted on every
+# pass forever and two overlapping watchers healed the same target at once. This store is shared
+# by all watchers on a host (one file, WAL mode, BEGIN IMMEDIATE for read-modify-write):
+#   - allow(target): per-target token bucket (burst HEAL_BURST, one token per HEAL_REFILL_S)
+#     plus a cool-down after each attempt; consuming the token is atomic, so of two watchers
+#     racing on the same target only one gets to heal
+#   - record(target, ok): attempt history, capped per target
+#   - acquire_lease(name, owner, ttl_s): a renewable lock so only one watcher runs heals
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+HEAL_BURST = float(os.getenv("HEAL_BURST", "3"))
+HEAL_REFILL_S = float(os.getenv("HEAL_REFILL_S", "600"))
+HEAL_COOLDOWN_S = float(os.getenv("HEAL_COOLDOWN_S", "60"))
+KEEP_ATTEMPTS = 50  # per target
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    target TEXT NOT NULL, ts REAL NOT NULL, ok INTEGER, detail TEXT);
+CREATE INDEX IF NOT EXISTS attempts_target ON attempts (target, id);
+CREATE TABLE IF NOT EXISTS buckets (
+    target TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL,
+    cooldown_until REAL NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+"""
+
+
+def default_path() -> str:
+    return os.getenv("LINOPS_HEAL_DB") or os.path.join(
+        os.environ.get("LINOPS_AUDIT_DIR", "audit"), "healstate.sqlite")
+
+
+class HealState:
+    def __init__(self, path: Optional[str] = None, burst: float = HEAL_BURST,
+                 refill_s: float = HEAL_REFILL_S, cooldown_s: float = HEAL_COOLDOWN_S):
+        self.path = path or default_path()
+        self.burst, self.refill_s, self.cooldown_s = burst, refill_s, cooldown_s
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        # autocommit mode; transactions are explicit BEGIN IMMEDIATE below
+        self._db = sqlite3.connect(self.path, timeout=10, isolation_level=None,
+                                   check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def _tx(self):
+        return _Tx(self._db, self._lock)
+
+    # --- rate limiting ----------------------------------------------------------------
+    def allow(self, target: str, now: Optional[float] = None) -> Tuple[bool, Optional[str]]:
+        """Take one heal token for target; (False, reason) while cooling down or out of tokens."""
+        now = time.time() if now is None else now
+        with self._tx() as db:
+            row = db.execute("SELECT tokens, updated, cooldown_until FROM buckets WHERE target=?",
+                             (target,)).fetchone()
+            tokens, updated, cooldown_until = row if row else (self.burst, now, 0.0)
+            tokens = min(self.burst, tokens + max(0.0, now - updated) / self.refill_s)
+            if now < cooldown_until:
+                reason = f"cooldown: {cooldown_until - now:.0f}s left"
+            elif tokens < 1.0:
+                reason = f"rate limited: next token in {(1.0 - tokens) * self.refill_s:.0f}s"
+            else:
+                reason = None
+                tokens -= 1.0
+                cooldown_until = now + self.cooldown_s
+            db.execute("INSERT OR REPLACE INTO buckets (target, tokens, updated, cooldown_until) "
+                       "VALUES (?, ?, ?, ?)", (target, tokens, now, cooldown_until))
+        return reason is None, reason
+
+    def record(self, target: str, ok: bool, detail: str = "", now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._tx() as db:
+            db.execute("INSERT INTO attempts (target, ts, ok, detail) VALUES (?, ?, ?, ?)",
+                       (target, now, int(ok), detail[:500]))
+            db.execute("DELETE FROM attempts WHERE target=? AND id NOT IN "
+                       "(SELECT id FROM attempts WHERE target=? ORDER BY id DESC LIMIT ?)",
+                       (target, target, KEEP_ATTEMPTS))
+
+    def attempts(self, target: str, limit: int = 10) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute("SELECT ts, ok, detail FROM attempts WHERE target=? "
+                                    "ORDER BY id DESC LIMIT ?", (target, limit)).fetchall()
+        return [{"ts": ts, "ok": bool(ok), "detail": detail} for ts, ok, detail in rows]
+
+    # --- leases ----------------------------------------------------------------------
+    def acquire_lease(self, name: str, owner: str, ttl_s: float,
+                      now: Optional[float] = None) -> Tuple[bool, str]:
+        """Take or renew lease `name`; returns (held, current_owner)."""
+        now = time.time() if now is None else now
+        with self._tx() as db:
+            row = db.execute("SELECT owner, expires FROM leases WHERE name=?", (name,)).fetchone()
+            if row and row[0] != owner and row[1] > now:
+                return False, row[0]
+            db.execute("INSERT OR REPLACE INTO leases (name, owner, expires) VALUES (?, ?, ?)",
+                       (name, owner, now + ttl_s))
+        return True, owner
+
+    def release_lease(self, name: str, owner: str) -> None:
+        with self._tx() as db:
+            db.execute("DELETE FROM leases WHERE name=? AND owner=?", (name, owner))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class _Tx:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK: takes the write lock up front, so check-then-set is
+    atomic."""
+
+    def __init__(self, db: sqlite3.Connection, lock: threading.Lock):
+        self._db, self._lock = db, lock
+
+    def __enter__(self) -> sqlite3.Connection:
+        self._lock.acquire()
+        try:
+            self._db.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self._lock.release()
+            raise
+        return self._db
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            self._db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self._lock.release()
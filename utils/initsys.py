@@ -0,0 +1,65 @@
+# Init-system detection + service command selection (used by restart runbooks).
+#
+# Detection only looks at the filesystem (no subprocesses) and is cached per host, so a
+# restart runs exactly one mechanism instead of trying systemd, SysV and OpenRC in turn.
+
+import os
+import shlex
+import shutil
+import socket
+from typing import Dict, List
+
+from utils import metrics
+
+SYSTEMD = "systemd"
+OPENRC = "openrc"
+SYSV = "sysv"
+NONE = "none"
+
+_CACHE: Dict[str, str] = {}
+
+
+def _detect() -> str:
+    # same test as sd_booted(3): systemd is PID 1 iff this directory exists
+    if os.path.isdir("/run/systemd/system"):
+        return SYSTEMD
+    if os.path.isdir("/run/openrc") or shutil.which("openrc"):
+        return OPENRC if shutil.which("rc-service") else NONE
+    if shutil.which("service") or os.path.isdir("/etc/init.d"):
+        return SYSV
+    return NONE
+
+
+def detect_init_system(refresh: bool = False) -> str:
+    """Return one of systemd/openrc/sysv/none for this host (cached by hostname)."""
+    host = socket.gethostname()
+    hit = not refresh and host in _CACHE
+    metrics.cache_lookup("init_system", hit)
+    if not hit:
+        _CACHE[host] = _detect()
+    return _CACHE[host]
+
+
+def service_cmds(init: str, name: str, action: str) -> List[str]:
+    """
+    Commands to try, in order, for `action` (start/stop/restart) under `init`.
+    Non-root callers get a non-interactive sudo variant as the fallback.
+    """
+    svc = shlex.quote(name)
+    if init == SYSTEMD:
+        cmd = f"systemctl {action} {svc}"
+    elif init == OPENRC:
+        cmd = f"rc-service {svc} {action}"
+    elif init == SYSV:
+        cmd = f"service {svc} {action}"
+    else:
+        return []
+    if os.geteuid() == 0:
+        return [cmd]
+    return [cmd, f"sudo -n {cmd}"]
+
+
+def direct_launch_cmd(name: str) -> str:
+    """Last resort when no init system manages the service: start the binary detached."""
+    exe = shlex.quote(name)
+    return f"( command -v {exe} >/dev/null 2>&1 && nohup {exe} >/dev/null 2>&1 & ) || true"
@@ -0,0 +1,220 @@
+# Streaming log-template miner (Drain-style) for log summaries.
+#
+# Each line is masked (IPs, numbers, hex, uuids, paths -> placeholders), split into tokens and
+# routed through a fixed-depth tree (token count -> first token) to a small bucket of clusters.
+# A line joins the most similar cluster in its bucket (differing tokens become <*>) or starts
+# a new one. Memory is bounded: clusters are LRU-evicted past `max_clusters`, and each keeps
+# at most `max_samples` example lines. One pass, so multi-GB files stream through fine.
+
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.redact import redact
+
+WILDCARD = "<*>"
+
+# Leading timestamps we know how to peel off: nginx error log, ISO-8601, syslog.
+_TS_RE = re.compile(
+    r"^\s*(?P<ts>"
+    r"\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}"
+    r"|\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"
+    r"|[A-Z][a-z]{2} [ \d]\d \d{2}:\d{2}:\d{2}"
+    r")\s*"
+)
+
+# One compiled pass for all variable fields; order matters (uuid before hex before number).
+_MASK_RE = re.compile(
+    r"(?P<UUID>\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b)"
+    r"|(?P<IP>\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b)"
+    r"|(?P<PATH>(?<![\w/])/[\w.\-/%~]+)"
+    r"|(?P<HEX>\b0x[0-9a-fA-F]+\b)"
+    r"|(?P<NUM>[-+]?\b\d+(?:\.\d+)?\b)"
+)
+
+_PLACEHOLDER = {name: f"<{name}>" for name in _MASK_RE.groupindex}
+
+# Lines that differ only in digits almost always share a template; stripping digits (C-speed
+# str.translate) gives a cheap key so repeated errors skip masking and the tree entirely.
+_DROP_DIGITS = str.maketrans("", "", "0123456789")
+
+
+def _mask(content: str) -> str:
+    return _MASK_RE.sub(lambda m: _PLACEHOLDER[m.lastgroup], content)
+
+
+def split_timestamp(line: str) -> Tuple[Optional[str], str]:
+    m = _TS_RE.match(line)
+    if not m:
+        return None, line.strip()
+    return m.group("ts"), line[m.end():].strip()
+
+
+class Cluster:
+    __slots__ = ("tokens", "count", "first_ts", "last_ts", "samples")
+
+    def __init__(self, tokens: List[str], ts: Optional[str], sample: str):
+        self.tokens = tokens
+        self.count = 0
+        self.first_ts = ts
+        self.last_ts = ts
+        self.samples: List[str] = [redact(sample)]
+
+    @property
+    def template(self) -> str:
+        return " ".join(self.tokens)
+
+
+class LogMiner:
+    """
+    Feed lines with add()/add_many(), then call summary().
+        m = LogMiner(); m.add_many(open(path, errors="replace")); m.summary(top=10)
+    """
+
+    def __init__(self, sim_threshold: float = 0.5, max_clusters: int = 1000,
+                 max_bucket: int = 64, max_samples: int = 3, max_tokens: int = 64):
+        self.sim_threshold = sim_threshold
+        self.max_clusters = max_clusters
+        self.max_bucket = max_bucket
+        self.max_samples = max_samples
+        self.max_tokens = max_tokens
+        self.total = 0
+        self.evicted = 0
+        # (n_tokens, first_token) -> clusters; LRU across all clusters for eviction
+        self._buckets: Dict[Tuple[int, str], List[Cluster]] = {}
+        self._lru: "OrderedDict[int, Tuple[Tuple[int, str], Cluster]]" = OrderedDict()
+        # digit-stripped content -> cluster, so repeated lines skip masking and the scan
+        self._shapes: "OrderedDict[str, Cluster]" = OrderedDict()
+
+    @staticmethod
+    def _similarity(template: List[str], tokens: List[str]) -> float:
+        same = 0
+        for a, b in zip(template, tokens):
+            if a == b or a == WILDCARD:
+                same += 1
+        return same / len(tokens)
+
+    def _route_key(self, tokens: List[str]) -> Tuple[int, str]:
+        first = tokens[0] if tokens else ""
+        # keys that are themselves variable go to a shared bucket
+        if first.startswith("<") or any(c.isdigit() for c in first):
+            first = WILDCARD
+        return len(tokens), first
+
+    def _touch(self, key: Tuple[int, str], cluster: Cluster) -> None:
+        cid = id(cluster)
+        if cid in self._lru:
+            self._lru.move_to_end(cid)
+            return
+        self._lru[cid] = (key, cluster)
+        while len(self._lru) > self.max_clusters:
+            _, (old_key, old) = self._lru.popitem(last=False)
+            bucket = self._buckets.get(old_key)
+            if bucket is not None:
+                bucket.remove(old)
+                if not bucket:
+                    del self._buckets[old_key]
+            self.evicted += 1
+            # shape shortcuts pointing at the evicted cluster are dropped lazily (see add)
+
+    def add(self, line: str) -> Optional[Cluster]:
+        line = line.rstrip("\n")
+        if not line.strip():
+            return None
+        self.total += 1
+        ts, content = split_timestamp(line)
+        shape = content.translate(_DROP_DIGITS)
+
+        cluster = self._shapes.get(shape)
+        if cluster is not None and id(cluster) in self._lru:
+            self._shapes.move_to_end(shape)
+        else:
+            tokens = _mask(content).split()[: self.max_tokens]
+            key = self._route_key(tokens)
+            bucket = self._buckets.setdefault(key, [])
+            best, best_sim = None, -1.0
+            for c in bucket:
+                sim = self._similarity(c.tokens, tokens)
+                if sim > best_sim:
+                    best, best_sim = c, sim
+            # a full bucket folds into its closest cluster rather than growing without bound
+            if best is not None and (best_sim >= self.sim_threshold
+                                     or len(bucket) >= self.max_bucket):
+                cluster = best
+                cluster.tokens = [a if a == b else WILDCARD for a, b in zip(cluster.tokens, tokens)]
+            else:
+                cluster = Cluster(tokens, ts, line)
+                bucket.append(cluster)
+            self._touch(key, cluster)
+            self._shapes[shape] = cluster
+            if len(self._shapes) > self.max_clusters * 4:
+                self._shapes.popitem(last=False)
+
+        cluster.count += 1
+        if ts:
+            if cluster.first_ts is None:
+                cluster.first_ts = ts
+            cluster.last_ts = ts
+        if cluster.count > 1 and len(cluster.samples) < self.max_samples:
+            sample = redact(line)
+            if sample not in cluster.samples:
+                cluster.samples.append(sample)
+        return cluster
+
+    def add_many(self, lines: Iterable[str]) -> "LogMiner":
+        for line in lines:
+            self.add(line)
+        return self
+
+    def clusters(self) -> List[Cluster]:
+        return [c for _, c in self._lru.values()]
+
+    def summary(self, top: int = 10) -> Dict[str, Any]:
+        ranked = sorted(self.clusters(), key=lambda c: c.count, reverse=True)
+        return {
+            "total_lines": self.total,
+            "distinct_templates": len(ranked),
+            "evicted_templates": self.evicted,
+            "templates": [
+                {
+                    "template": redact(c.template),
+                    "count": c.count,
+                    "first_ts": c.first_ts,
+                    "last_ts": c.last_ts,
+                    "samples": list(c.samples),
+                }
+                for c in ranked[:max(0, int(top))]
+            ],
+        }
+
+
+def iter_file_lines(path: str, tail_bytes: Optional[int] = None) -> Iterable[str]:
+    """Stream decoded lines from `path`; with tail_bytes, start at the window's first full line."""
+    with open(path, "rb") as f:
+        if tail_bytes is not None:
+            f.seek(0, 2)
+            size = f.tell()
+            if size > tail_bytes:
+                f.seek(size - tail_bytes - 1)
+                f.readline()  # skip the partial line (or just the preceding newline)
+        for raw in f:
+            yield raw.decode("utf-8", errors="replace")
+
+
+def mine_file(path: str, tail_bytes: Optional[int] = None, top: int = 10, **kw) -> Dict[str, Any]:
+    return LogMiner(**kw).add_many(iter_file_lines(path, tail_bytes=tail_bytes)).summary(top=top)
+
+
+def mine_text(text: str, top: int = 10, **kw) -> Dict[str, Any]:
+    return LogMiner(**kw).add_many(text.splitlines()).summary(top=top)
+
+
+def format_summary(summary: Dict[str, Any], width: int = 160) -> str:
+    """Compact, human-oriented rendering: one line per template, most frequent first."""
+    out = [f"{summary['total_lines']} lines, {summary['distinct_templates']} templates"]
+    for t in summary["templates"]:
+        span = ""
+        if t["first_ts"]:
+            span = f" [{t['first_ts']} .. {t['last_ts']}]"
+        out.append(f"{t['count']:>7}x {t['template'][:width]}{span}")
+    return "\n".join(out)
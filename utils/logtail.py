@@ -0,0 +1,201 @@
+# Tail + incremental follow for log files without spawning `tail`.
+#
+# - tail_lines(): seek backward from EOF in blocks (mmap for big files) to find the last N lines
+# - read_new():   resume from an opaque cursor (device, inode, offset) and return only new bytes
+# - follow():     one call that does either, depending on whether a cursor was given
+
+import base64
+import mmap
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from utils.redact import redact
+
+BLOCK_SIZE = 64 * 1024
+MMAP_THRESHOLD = 8 * 1024 * 1024     # files larger than this are scanned via mmap
+MAX_READ_BYTES = 256 * 1024          # cap per call so one poll can't blow the output budget
+ROTATED_SUFFIXES = (".1", "-1")      # where logrotate usually moves the previous file
+
+_CURSOR_PREFIX = "v1:"
+
+
+def encode_cursor(dev: int, ino: int, offset: int) -> str:
+    raw = f"{dev}:{ino}:{offset}".encode("ascii")
+    return _CURSOR_PREFIX + base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[int, int, int]]:
+    """Return (dev, ino, offset) or None if the cursor is malformed/unknown."""
+    if not cursor or not cursor.startswith(_CURSOR_PREFIX):
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor[len(_CURSOR_PREFIX):]).decode("ascii")
+        dev, ino, offset = (int(x) for x in raw.split(":"))
+    except Exception:
+        return None
+    if offset < 0:
+        return None
+    return dev, ino, offset
+
+
+def _find_tail_start_blocks(f, size: int, lines: int, block_size: int) -> int:
+    """Read blocks backward from EOF until `lines` newlines are seen; return start offset."""
+    pos = size
+    # a trailing newline terminates the last line, it doesn't start a new one
+    f.seek(size - 1)
+    if f.read(1) == b"\n":
+        pos -= 1
+    seen = 0
+    while pos > 0:
+        step = min(block_size, pos)
+        pos -= step
+        f.seek(pos)
+        block = f.read(step)
+        idx = len(block)
+        while True:
+            idx = block.rfind(b"\n", 0, idx)
+            if idx < 0:
+                break
+            seen += 1
+            if seen == lines:
+                return pos + idx + 1
+    return 0
+
+
+def _find_tail_start_mmap(f, size: int, lines: int) -> int:
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        end = size - 1 if mm[size - 1:size] == b"\n" else size
+        for _ in range(lines):
+            idx = mm.rfind(b"\n", 0, end)
+            if idx < 0:
+                return 0
+            end = idx
+        return end + 1
+
+
+def tail_lines(path: str, lines: int = 50, block_size: int = BLOCK_SIZE,
+               max_bytes: int = MAX_READ_BYTES) -> Dict[str, Any]:
+    """
+    Return the last `lines` lines of `path` plus a cursor positioned at EOF.
+    Only the tail region of the file is ever read.
+    """
+    lines = max(0, int(lines))
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        size = st.st_size
+        if size == 0 or lines == 0:
+            start = size
+        elif size >= MMAP_THRESHOLD:
+            start = _find_tail_start_mmap(f, size, lines)
+        else:
+            start = _find_tail_start_blocks(f, size, lines, block_size)
+        truncated = size - start > max_bytes
+        if truncated:
+            start = size - max_bytes
+        f.seek(start)
+        data = f.read(size - start)
+    return {
+        "content": redact(data.decode("utf-8", errors="replace")),
+        "cursor": encode_cursor(st.st_dev, st.st_ino, size),
+        "offset": start,
+        "truncated": truncated,
+    }
+
+
+def _read_range(path: str, offset: int, max_bytes: int,
+                final: bool = False) -> Tuple[bytes, int, bool]:
+    """
+    Read complete lines from `offset` (at most max_bytes). Returns (data, new_offset, more).
+    A trailing partial line is left for the next poll unless it alone exceeds max_bytes, or
+    `final` says the file won't grow (rotated away): then it is returned newline-terminated.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(max_bytes + 1)
+    more = len(data) > max_bytes
+    data = data[:max_bytes]
+    if final and not more:
+        end = offset + len(data)
+        return (data + b"\n" if data and not data.endswith(b"\n") else data), end, False
+    cut = data.rfind(b"\n") + 1
+    if cut == 0 and not more:
+        return b"", offset, False
+    if cut:
+        data = data[:cut]
+    return data, offset + len(data), more
+
+
+def _find_rotated(path: str, dev: int, ino: int) -> Optional[str]:
+    for suffix in ROTATED_SUFFIXES:
+        cand = path + suffix
+        try:
+            st = os.stat(cand)
+        except OSError:
+            continue
+        if st.st_dev == dev and st.st_ino == ino:
+            return cand
+    return None
+
+
+def read_new(path: str, cursor: str, max_bytes: int = MAX_READ_BYTES) -> Dict[str, Any]:
+    """
+    Return only bytes appended since `cursor`.
+    Rotation (new inode) drains the rest of the old file if it can be found, including a
+    last line written without its newline, then starts the new file from 0; truncation
+    (same inode, smaller size) restarts from 0.
+    """
+    parsed = decode_cursor(cursor)
+    st = os.stat(path)
+    if parsed is None:
+        out = tail_lines(path, lines=0)
+        out.update({"reset": "bad_cursor", "rotated": False})
+        return out
+
+    dev, ino, offset = parsed
+    rotated = False
+    reset = None
+    chunks = []
+    budget = max_bytes
+    if (dev, ino) != (st.st_dev, st.st_ino):
+        rotated = True
+        old = _find_rotated(path, dev, ino)
+        if old:
+            data, old_offset, old_more = _read_range(old, offset, budget, final=True)
+            if old_more:
+                # still draining the rotated file; keep pointing at it
+                return {
+                    "content": redact(data.decode("utf-8", errors="replace")),
+                    "cursor": encode_cursor(dev, ino, old_offset),
+                    "offset": old_offset,
+                    "rotated": True,
+                    "reset": None,
+                    "truncated": True,
+                }
+            chunks.append(data)
+            budget -= len(data)
+        offset = 0
+    elif st.st_size < offset:
+        reset = "truncated"
+        offset = 0
+
+    more = False
+    if budget > 0:
+        data, offset, more = _read_range(path, offset, budget)
+        chunks.append(data)
+    text = b"".join(chunks).decode("utf-8", errors="replace")
+    return {
+        "content": redact(text),
+        "cursor": encode_cursor(st.st_dev, st.st_ino, offset),
+        "offset": offset,
+        "rotated": rotated,
+        "reset": reset,
+        "truncated": more,
+    }
+
+
+def follow(path: str, cursor: Optional[str] = None, lines: int = 50,
+           max_bytes: int = MAX_READ_BYTES) -> Dict[str, Any]:
+    """First call (no cursor) returns the tail; later calls return only what was appended."""
+    if cursor:
+        return read_new(path, cursor, max_bytes=max_bytes)
+    return tail_lines(path, lines=lines, max_bytes=max_bytes)
@@ -0,0 +1,239 @@
+# In-process metrics (counters + histograms) with a Prometheus text endpoint.
+#
+#   from utils import metrics
+#   metrics.REFUSALS.labels(rule="mkfs").inc()
+#   metrics.STEP_LATENCY.labels(step="free_disk").observe(0.12)
+#   metrics.start_http_server(9108)      # GET /metrics
+#
+# Label sets are small and fixed by our own code (rule names, step names, targets), so
+# cardinality stays bounded: never put command text, paths or error messages in a label.
+# Everything is stdlib and thread-safe.
+
+import bisect
+import http.server
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _CounterChild:
+    __slots__ = ("_metric", "_key")
+
+    def __init__(self, metric: "Counter", key: LabelKey):
+        self._metric, self._key = metric, key
+
+    def inc(self, n: float = 1.0) -> None:
+        m = self._metric
+        with m._lock:
+            m._values[self._key] = m._values.get(self._key, 0.0) + n
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def labels(self, **labels: str) -> _CounterChild:
+        return _CounterChild(self, self._key(labels))
+
+    def inc(self, n: float = 1.0) -> None:
+        self.labels().inc(n)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_num(v)}"
+                                for k, v in items]
+
+
+class _HistogramChild:
+    __slots__ = ("_metric", "_key")
+
+    def __init__(self, metric: "Histogram", key: LabelKey):
+        self._metric, self._key = metric, key
+
+    def observe(self, v: float) -> None:
+        m = self._metric
+        i = bisect.bisect_left(m.buckets, v)
+        with m._lock:
+            st = m._series.get(self._key)
+            if st is None:
+                st = m._series[self._key] = [[0] * (len(m.buckets) + 1), 0.0, 0]
+            st[0][i] += 1
+            st[1] += v
+            st[2] += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[LabelKey, list] = {}
+
+    def labels(self, **labels: str) -> _HistogramChild:
+        return _HistogramChild(self, self._key(labels))
+
+    def observe(self, v: float) -> None:
+        self.labels().observe(v)
+
+    def count(self, **labels: str) -> int:
+        st = self._series.get(self._key(labels))
+        return st[2] if st else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(st[0]), st[1], st[2])) for k, st in self._series.items())
+        out = self.header()
+        for key, (counts, total, n) in items:
+            acc = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le_label = 'le="%s"' % _fmt_num(le)
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le_label)} {acc}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_num(total)}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {n}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))  # type: ignore[return-value]
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for m in metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- the agent's metrics ------------------------------------------------------
+HEALS_ATTEMPTED = REGISTRY.counter(
+    "linops_heals_attempted_total", "Heal actions started", ("kind", "target"))
+HEALS_SUCCEEDED = REGISTRY.counter(
+    "linops_heals_succeeded_total", "Heal actions that reported success", ("kind", "target"))
+HEALS_SUPPRESSED = REGISTRY.counter(
+    "linops_heals_suppressed_total", "Heals skipped by rate limit, cool-down or lease",
+    ("kind", "target"))
+HEAL_LATENCY = REGISTRY.histogram(
+    "linops_heal_latency_seconds", "Wall time of heal actions", ("kind",))
+REFUSALS = REGISTRY.counter(
+    "linops_refusals_total", "Commands refused by the safety screen", ("rule",))
+STEP_LATENCY = REGISTRY.histogram(
+    "linops_step_latency_seconds", "Wall time of runbook steps", ("step",))
+SPAWNS = REGISTRY.counter(
+    "linops_subprocess_spawns_total", "Child processes started", ("runner",))
+CACHE_REQUESTS = REGISTRY.counter(
+    "linops_cache_requests_total", "Cache lookups by result (hit/miss)", ("cache", "result"))
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+# --- HTTP endpoint ------------------------------------------------------------
+class _Handler(http.server.BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+
+    def do_GET(self) -> None:  # noqa: N802 (http.server API)
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        return None  # scrapes every few seconds would flood stderr
+
+
+_SERVERS: Dict[int, http.server.ThreadingHTTPServer] = {}
+
+
+def start_http_server(port: int, addr: str = "127.0.0.1",
+                      registry: Registry = REGISTRY) -> http.server.ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread; idempotent per port (port 0 picks a free one)."""
+    if port and port in _SERVERS:
+        return _SERVERS[port]
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+    srv = http.server.ThreadingHTTPServer((addr, port), handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="linops-metrics", daemon=True).start()
+    _SERVERS[srv.server_address[1]] = srv
+    return srv
+
+
+def start_from_env() -> Optional[http.server.ThreadingHTTPServer]:
+    """Start the endpoint if LINOPS_METRICS_PORT is set (addr via LINOPS_METRICS_ADDR)."""
+    port = os.getenv("LINOPS_METRICS_PORT")
+    if not port:
+        return None
+    return start_http_server(int(port), addr=os.getenv("LINOPS_METRICS_ADDR", "127.0.0.1"))
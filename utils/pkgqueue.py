@@ -0,0 +1,192 @@
+# Package installs through one queue: batched apt transactions and a freshness-cached index.
+#
+# install_package used to run `apt-get update` + `apt-get install <pkg>` per call, so five
+# installs meant five index refreshes and five dpkg transactions (each serialised on the dpkg
+# lock anyway). PackageQueue.install() instead:
+#   - coalesces concurrent requests (group commit): the first caller becomes the leader, waits
+#     BATCH_WINDOW_S for company, then runs one transaction for every pending package while the
+#     others wait for their share of the result; callers that arrive mid-transaction form the
+#     next batch
+#   - skips packages dpkg already reports installed, and the whole transaction if that's all
+#   - runs `apt-get update` only when the index is older than APT_INDEX_MAX_AGE_S (newest of the
+#     lists dir and the update-success stamp, which we touch after a successful update)
+#   - if the merged install fails, refreshes a skipped index once and retries package by package,
+#     so one bad name can't fail the rest; per-package status comes from dpkg-query either way
+# `run(cmd) -> {rc, out_tail}` executes one command (sh in the Modal app, utils.fakeapt in tests).
+# Status checks instead go through `exec_argv(argv) -> {rc, stdout}`, which execs dpkg-query
+# directly and keeps all of its output: run's tail is capped and redacted, and a cut listing
+# would report packages as missing.
+#
+# Batching is per process: only install() calls on the same PackageQueue object coalesce.
+# Separate CLI invocations or Modal containers each run their own transactions (dpkg's lock
+# still serialises them); they share only the index freshness, which lives on disk.
+
+import os
+import shlex
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+APT_INDEX_MAX_AGE_S = float(os.getenv("LINOPS_APT_INDEX_MAX_AGE_S", "3600"))  # 0: always update
+APT_LISTS_DIR = os.getenv("LINOPS_APT_LISTS_DIR", "/var/lib/apt/lists")
+APT_STAMP = os.getenv("LINOPS_APT_STAMP", "/var/lib/apt/periodic/update-success-stamp")
+BATCH_WINDOW_S = float(os.getenv("LINOPS_PKG_BATCH_WINDOW_S", "0.05"))
+
+Run = Callable[[str], Dict[str, Any]]
+ExecArgv = Callable[[List[str]], Dict[str, Any]]
+STATUS_FORMAT = r"${Package}\t${db:Status-Status}\t${Version}\n"  # dpkg expands the escapes
+
+
+def exec_argv(argv: List[str], timeout_s: float = 60.0) -> Dict[str, Any]:
+    """Run argv without a shell in the C locale; {rc, stdout}, stdout complete and unredacted."""
+    try:
+        p = subprocess.run(argv, capture_output=True, text=True, timeout=timeout_s, check=False,
+                           env={**os.environ, "LC_ALL": "C", "LANG": "C"})
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return {"rc": 127 if isinstance(e, OSError) else None, "stdout": "", "error": repr(e)}
+    return {"rc": p.returncode, "stdout": p.stdout}
+
+
+class _Request:
+    def __init__(self, pkgs: List[str]):
+        self.pkgs = pkgs
+        self.result: Optional[Dict[str, Any]] = None
+
+
+class PackageQueue:
+    def __init__(self, run: Run, allow: Optional[Iterable[str]] = None,
+                 max_index_age_s: float = APT_INDEX_MAX_AGE_S, lists_dir: str = APT_LISTS_DIR,
+                 stamp: str = APT_STAMP, batch_window_s: float = BATCH_WINDOW_S,
+                 exec_argv: ExecArgv = exec_argv):
+        self.run = run
+        self.exec_argv = exec_argv
+        self.allow = frozenset(allow) if allow is not None else None
+        self.max_index_age_s = max_index_age_s
+        self.lists_dir, self.stamp = lists_dir, stamp
+        self.batch_window_s = batch_window_s
+        self._cv = threading.Condition()
+        self._pending: List[_Request] = []
+        self._busy = False
+        self._batches = 0
+
+    # --- apt index --------------------------------------------------------------------
+    def index_age_s(self) -> Optional[float]:
+        """Seconds since the package index was last refreshed (None: never / unknown)."""
+        mtimes = []
+        for path in (self.lists_dir, self.stamp):
+            try:
+                mtimes.append(os.stat(path).st_mtime)
+            except OSError:
+                pass
+        return max(0.0, time.time() - max(mtimes)) if mtimes else None
+
+    def update_index(self, force: bool = False) -> Dict[str, Any]:
+        """`apt-get update` unless the index is fresh enough; returns a step for logs/UI."""
+        age = self.index_age_s()
+        if not force and age is not None and age < self.max_index_age_s:
+            return {"cmd": "apt-get update -y", "rc": 0, "skipped": True,
+                    "out_tail": f"index fresh ({age:.0f}s old < {self.max_index_age_s:.0f}s)"}
+        res = self.run("apt-get update -y")
+        if res.get("rc") == 0:
+            self._touch_stamp()
+        return {"cmd": "apt-get update -y", "skipped": False, **res}
+
+    def _touch_stamp(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.stamp), exist_ok=True)
+            with open(self.stamp, "a"):
+                pass
+            os.utime(self.stamp)
+        except OSError:
+            pass  # read-only /var: the lists dir mtime still counts
+
+    # --- status -----------------------------------------------------------------------
+    def query(self, pkgs: List[str]) -> Dict[str, Dict[str, Any]]:
+        """{pkg: {installed, version}} from one dpkg-query call (all of its output, no tail)."""
+        if not pkgs:
+            return {}
+        res = self.exec_argv(["dpkg-query", "-W", "-f=" + STATUS_FORMAT, *pkgs])
+        found: Dict[str, Dict[str, Any]] = {}
+        for line in (res.get("stdout") or "").splitlines():
+            parts = line.split("\t")
+            if len(parts) == 3:
+                found[parts[0]] = {"installed": parts[1] == "installed",
+                                   "version": parts[2] or None}
+        return {p: found.get(p, {"installed": False, "version": None}) for p in pkgs}
+
+    # --- installs ---------------------------------------------------------------------
+    def install(self, pkgs: Iterable[str]) -> Dict[str, Any]:
+        """
+        Install pkgs, merged with any concurrent install() calls into one apt transaction.
+        Returns {ok, packages: {pkg: {status, version}}, batch: {...}, steps} for these pkgs.
+        """
+        want = list(dict.fromkeys(pkgs))
+        refused = [p for p in want if self.allow is not None and p not in self.allow]
+        if refused:
+            return {"ok": False, "reason": f"not in allowlist: {', '.join(refused)}",
+                    "allow": sorted(self.allow or ()),
+                    "packages": {p: {"status": "refused" if p in refused else "skipped",
+                                     "version": None} for p in want}}
+        req = _Request(want)
+        with self._cv:
+            self._pending.append(req)
+            while req.result is None and self._busy:
+                self._cv.wait()
+            if req.result is not None:
+                return req.result  # a leader installed ours along with its own
+            self._busy = True
+        try:
+            if self.batch_window_s:
+                time.sleep(self.batch_window_s)  # let concurrent callers join this transaction
+            with self._cv:
+                batch, self._pending = self._pending, []
+                self._batches += 1
+                batch_id = self._batches
+            self._run_batch(batch_id, batch)
+        finally:
+            with self._cv:
+                self._busy = False
+                self._cv.notify_all()
+        return req.result  # type: ignore[return-value]
+
+    def _run_batch(self, batch_id: int, batch: List[_Request]) -> None:
+        pkgs = list(dict.fromkeys(p for r in batch for p in r.pkgs))
+        steps: List[Dict[str, Any]] = []
+        before = self.query(pkgs)
+        todo = [p for p in pkgs if not before[p]["installed"]]
+        update: Optional[Dict[str, Any]] = None
+        failed_batch = False
+        if todo:
+            update = self.update_index()
+            steps.append(update)
+            res = self.run(_install_cmd(todo))
+            steps.append({"cmd": _install_cmd(todo), **res})
+            if res.get("rc") != 0:
+                failed_batch = True
+                if update.get("skipped"):  # maybe the index is what's stale after all
+                    steps.append(self.update_index(force=True))
+                for p in todo:
+                    steps.append({"cmd": _install_cmd([p]), **self.run(_install_cmd([p]))})
+        after = self.query(todo) if todo else {}
+        status: Dict[str, Dict[str, Any]] = {}
+        for p in pkgs:
+            if before[p]["installed"]:
+                status[p] = {"status": "already_installed", "version": before[p]["version"]}
+            else:
+                ok = after[p]["installed"]
+                status[p] = {"status": "installed" if ok else "failed",
+                             "version": after[p]["version"]}
+        info = {"id": batch_id, "requests": len(batch), "packages": pkgs, "installed": todo,
+                "transactions": (1 + len(todo) if failed_batch else 1) if todo else 0,
+                "index_refreshed": any(s["cmd"] == "apt-get update -y" and not s.get("skipped")
+                                       for s in steps)}
+        for r in batch:
+            mine = {p: status[p] for p in r.pkgs}
+            r.result = {"ok": all(s["status"] != "failed" for s in mine.values()),
+                        "packages": mine, "batch": info, "steps": steps}
+
+
+def _install_cmd(pkgs: List[str]) -> str:
+    return ("DEBIAN_FRONTEND=noninteractive apt-get install -y "
+            + " ".join(shlex.quote(p) for p in pkgs))
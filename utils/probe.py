@@ -0,0 +1,84 @@
+# Readiness probes + polling with backoff (no subprocess per check).
+
+import os
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional
+
+
+def wait_until(check: Callable[[], bool], timeout_s: float = 10.0, initial_s: float = 0.05,
+               factor: float = 2.0, max_interval_s: float = 1.0) -> Dict[str, Any]:
+    """
+    Poll `check` with exponential backoff until it returns True or timeout_s elapses.
+    Returns {ok, attempts, waited_s}; the first check happens immediately.
+    """
+    start = time.monotonic()
+    deadline = start + timeout_s
+    interval = initial_s
+    attempts = 0
+    while True:
+        attempts += 1
+        if check():
+            return {"ok": True, "attempts": attempts,
+                    "waited_s": round(time.monotonic() - start, 3)}
+        now = time.monotonic()
+        if now >= deadline:
+            return {"ok": False, "attempts": attempts, "waited_s": round(now - start, 3)}
+        time.sleep(min(interval, deadline - now))
+        interval = min(interval * factor, max_interval_s)
+
+
+def process_running(name: str, proc_root: str = "/proc") -> bool:
+    """Like `pgrep -x name`, but reads /proc/<pid>/comm directly (comm is capped at 15 chars)."""
+    want = name[:15]
+    try:
+        pids = [p for p in os.listdir(proc_root) if p.isdigit()]
+    except OSError:
+        return False
+    for pid in pids:
+        try:
+            with open(os.path.join(proc_root, pid, "comm"), "r",
+                      encoding="utf-8", errors="replace") as f:
+                if f.read().rstrip("\n") == want:
+                    return True
+        except OSError:
+            continue  # process exited mid-scan
+    return False
+
+
+def find_pids(name: str, proc_root: str = "/proc") -> List[int]:
+    """PIDs whose comm is exactly `name`, skipping zombies (pgrep -x would still list them)."""
+    want = name[:15]
+    try:
+        pids = [p for p in os.listdir(proc_root) if p.isdigit()]
+    except OSError:
+        return []
+    out: List[int] = []
+    for pid in pids:
+        try:
+            with open(os.path.join(proc_root, pid, "stat"), "r",
+                      encoding="utf-8", errors="replace") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # "<pid> (<comm>) <state> ..." -- comm may itself contain spaces or parens
+        lp, rp = stat.find("("), stat.rfind(")")
+        if stat[lp + 1:rp] == want and stat[rp + 2:rp + 3] not in ("Z", "X"):
+            out.append(int(pid))
+    return out
+
+
+# probes target local services; never route them through an env-configured proxy
+_OPENER = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+def http_status(url: str, timeout_s: float = 1.0) -> Optional[int]:
+    """HTTP status code for GET url, or None if nothing answered."""
+    try:
+        with _OPENER.open(url, timeout=timeout_s) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except Exception:
+        return None
@@ -0,0 +1,176 @@
+# Secret redaction for anything we show or persist (log tails, command output, audit).
+#
+# All rules are compiled into ONE alternation, so a line is scanned once no matter how
+# many secret shapes we know about; a literal-trigger prefilter keeps clean lines away
+# from the regex entirely. StreamRedactor applies the same matcher to chunked output and
+# holds back the trailing partial line so a token split across two chunks is still caught.
+
+import dataclasses
+import re
+from typing import Any, Iterable, Iterator, List, Tuple
+
+MASK = "******"
+
+# Longest secret we try to recognise; also the hold-back window for streaming.
+MAX_TOKEN = 512
+
+# Identifier with a secret-ish word as one of its parts: DB_PASSWORD, x-api-key, authToken,
+# but not max_tokens or tokenizer. The word must start the identifier or follow _ . - or a
+# camelCase hump, and end it or be followed by one. env_leak guards it with a lookahead
+# (identifier followed by = or :) so ordinary words fail fast instead of backtracking.
+_SECRET_KEYS = (
+    r"(?:[A-Za-z0-9_.-]{0,64}?(?:[_.-]|(?-i:[a-z](?=[A-Z]))))?"
+    r"(?:passw(?:or)?d|secrets?|token|api[_-]?key|access[_-]?key|private[_-]?key|credentials?)"
+    r"(?:(?:[_.-]|(?-i:(?=[A-Z])))[A-Za-z0-9_.-]{0,64})?"
+)
+
+# (rule name, pattern). Order matters: at the same offset the earlier rule wins.
+# Groups named `keep_<rule>` are preserved, everything else in the match is masked.
+# Rules never cross a newline, so matching line-by-line equals matching the whole text.
+RULES: List[Tuple[str, str]] = [
+    ("bearer", r"(?P<keep_bearer>(?i:bearer)[ \t]+)[A-Za-z0-9._~+/-]{8,%d}=*" % MAX_TOKEN),
+    ("url_creds", r"(?P<keep_url_creds>\b[a-zA-Z][a-zA-Z0-9+.-]{1,20}://[^\s:/@]{1,128}:)"
+                  r"[^\s@/]{1,%d}(?=@)" % MAX_TOKEN),
+    ("aws_key", r"\b(?:AKIA|ASIA|AGPA|AIDA|AROA)[0-9A-Z]{16}\b"),
+    ("api_key", r"\b(?:sk-(?:ant-|proj-)?[A-Za-z0-9_-]{20,%d}|gh[pousr]_[A-Za-z0-9]{30,%d}"
+                r"|xox[abposr]-[A-Za-z0-9-]{10,%d}|AIza[0-9A-Za-z_-]{35})"
+                % (MAX_TOKEN, MAX_TOKEN, MAX_TOKEN)),
+    ("env_leak", r"(?P<keep_env_leak>(?<![A-Za-z0-9_.-])(?=[A-Za-z0-9_.-]{1,128}[ \t]*[=:])"
+                 r"(?i:%s)[ \t]*[=:][ \t]*)"
+                 r"(?:\"[^\"\n]{1,%d}\"|'[^'\n]{1,%d}'|[^\s\"',;&|]{1,%d})"
+                 % (_SECRET_KEYS, MAX_TOKEN, MAX_TOKEN, MAX_TOKEN)),
+    ("marker", r"password|secret"),
+]
+
+_MATCHER = re.compile("|".join(f"(?P<{name}>{pat})" for name, pat in RULES))
+
+# Lowercase literals at least one of which appears in any line a rule can match.
+# str.find on these runs at memchr speed; the regex only sees lines that contain one.
+TRIGGERS: Tuple[str, ...] = (
+    "bearer", "://", "akia", "asia", "agpa", "aida", "aroa", "sk-",
+    "ghp_", "gho_", "ghu_", "ghs_", "ghr_", "xox", "aiza", "passw", "secret", "token", "credential",
+    "apikey", "api_key", "api-key", "accesskey", "access_key", "access-key",
+    "privatekey", "private_key", "private-key",
+)
+
+
+def _replace(m: "re.Match[str]") -> str:
+    keep = m.group("keep_" + m.lastgroup) if f"keep_{m.lastgroup}" in _MATCHER.groupindex else None
+    return (keep or "") + MASK
+
+
+def _candidate_lines(text: str, low: str) -> List[Tuple[int, int]]:
+    """Sorted, merged (start, end) spans of lines that contain any trigger literal."""
+    spans = []
+    for kw in TRIGGERS:
+        i = low.find(kw)
+        while i >= 0:
+            start = text.rfind("\n", 0, i) + 1
+            end = text.find("\n", i)
+            end = len(text) if end < 0 else end + 1
+            spans.append((start, end))
+            i = low.find(kw, end)
+    if not spans:
+        return spans
+    spans.sort()
+    merged = [spans[0]]
+    for start, end in spans[1:]:
+        if start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def redact(text: str) -> str:
+    """Mask known secret shapes; only lines containing a trigger literal hit the regex."""
+    if not text:
+        return text
+    low = text.lower()
+    if len(low) != len(text):
+        # some non-ASCII lowercasing changed lengths; offsets would drift, scan everything
+        return _MATCHER.sub(_replace, text)
+    spans = _candidate_lines(text, low)
+    if not spans:
+        return text
+    parts: List[str] = []
+    pos = 0
+    for start, end in spans:
+        parts.append(text[pos:start])
+        parts.append(_MATCHER.sub(_replace, text[start:end]))
+        pos = end
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+def redact_obj(obj: Any) -> Any:
+    """Recursively redact strings inside dicts/lists (used for audit records)."""
+    if isinstance(obj, str):
+        return redact(obj)
+    if isinstance(obj, dict):
+        return {k: redact_obj(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [redact_obj(v) for v in obj]
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        # keep the dataclass itself (the encoder handles it) unless a field actually needed masking
+        fields = {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)}
+        masked = redact_obj(fields)
+        return obj if masked == fields else masked
+    return obj
+
+
+class StreamRedactor:
+    """
+    Incremental redaction over chunks:
+        r = StreamRedactor()
+        for chunk in chunks: out.write(r.feed(chunk))
+        out.write(r.flush())
+    The trailing partial line is held back until its newline (or flush) arrives; a line
+    longer than `overlap` is emitted early, minus a hold-back window of `overlap` chars.
+    """
+
+    def __init__(self, overlap: int = 2 * MAX_TOKEN):
+        self.overlap = overlap
+        self._pending = ""
+
+    def feed(self, chunk: str) -> str:
+        buf = self._pending + chunk
+        nl = buf.rfind("\n", len(self._pending))
+        if nl >= 0:
+            self._pending = buf[nl + 1:]
+            return redact(buf[:nl + 1])
+        cut = len(buf) - self.overlap
+        if cut <= 0:
+            self._pending = buf
+            return ""
+        parts: List[str] = []
+        pos = 0
+        for m in _MATCHER.finditer(buf):
+            if m.start() >= cut:
+                break
+            if m.end() > cut:
+                # match straddles the emit boundary; it may still grow, so re-scan it later
+                cut = m.start()
+                break
+            parts.append(buf[pos:m.start()])
+            parts.append(_replace(m))
+            pos = m.end()
+        parts.append(buf[pos:cut])
+        self._pending = buf[cut:]
+        return "".join(parts)
+
+    def flush(self) -> str:
+        buf, self._pending = self._pending, ""
+        return redact(buf)
+
+
+def redact_stream(chunks: Iterable[str], overlap: int = 2 * MAX_TOKEN) -> Iterator[str]:
+    r = StreamRedactor(overlap=overlap)
+    for chunk in chunks:
+        out = r.feed(chunk)
+        if out:
+            yield out
+    tail = r.flush()
+    if tail:
+        yield tail
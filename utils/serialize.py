@@ -0,0 +1,64 @@
+# JSON encode/decode for audit records, traces and CLI output.
+#
+# Uses orjson when it is installed (several times faster on large `results` payloads, encodes
+# straight to UTF-8 bytes, serializes dataclasses such as planner.plan.Step natively) and falls
+# back to the stdlib with identical output shape otherwise:
+#   dumps_bytes(obj, newline=True)  -> compact bytes, ready for an "ab" file write
+#   dumps(obj)                      -> compact str (machine consumers, NDJSON)
+#   dumps(obj, pretty=True)         -> 2-space indented str (humans)
+
+import dataclasses
+import json
+from typing import Any
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # optional speedup
+    orjson = None  # type: ignore[assignment]
+
+if orjson is not None:
+    _OPT = orjson.OPT_NON_STR_KEYS
+
+
+def _default(o: Any) -> Any:
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        # one level only (the fields are encoded in turn), unlike asdict()'s recursive deep copy
+        return {f.name: getattr(o, f.name) for f in dataclasses.fields(o)}
+    if isinstance(o, (set, frozenset, tuple)):
+        return list(o)
+    if isinstance(o, bytes):
+        return o.decode("utf-8", "replace")
+    return str(o)
+
+
+def _stdlib(obj: Any, pretty: bool) -> str:
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2, default=_default)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default)
+
+
+def dumps_bytes(obj: Any, pretty: bool = False, newline: bool = False) -> bytes:
+    """UTF-8 JSON bytes (compact unless pretty), optionally newline-terminated."""
+    if orjson is not None:
+        opt = (_OPT | (orjson.OPT_INDENT_2 if pretty else 0)
+               | (orjson.OPT_APPEND_NEWLINE if newline else 0))
+        try:
+            return orjson.dumps(obj, default=_default, option=opt)
+        except TypeError:
+            pass  # e.g. ints beyond 64 bits: the stdlib encoder handles them
+    out = _stdlib(obj, pretty).encode("utf-8")
+    return out + b"\n" if newline else out
+
+
+def dumps(obj: Any, pretty: bool = False) -> str:
+    """JSON text: compact by default, 2-space indented when pretty."""
+    if orjson is None:
+        return _stdlib(obj, pretty)
+    return dumps_bytes(obj, pretty=pretty).decode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from str or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
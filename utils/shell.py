@@ -1,33 +1,57 @@
 # Safely run shell commands with audit + refusals + dry-run-by-default.
 
-import subprocess
+import os
 from typing import Optional, Tuple
+from utils import metrics, shparse, spawnsrv, trace
 from utils.audit import audit_log
+from utils.redact import redact
 
-# Don't allow these commands
-BLOCKLIST = [
-    "rm -rf /",
-    "--no-preserve-root",
-    "mkfs",
-    ":(){ :|:& };:",
-    "dd if=/dev/zero of=/dev/sd",
-    "shutdown", "reboot", "cryptsetup"
-]
+# Don't allow these commands. Each rule tests one parsed command (see utils/shparse.py), so
+# `grep shutdown /var/log/syslog` or `echo "rm -rf /"` pass while `sudo rm -fr /`,
+# `bash -c 'reboot'`, `ssh host reboot` or `$(mkfs /dev/sdb)` do not; the label is what the
+# refusal reports. shparse.SHARED_RULES refuses what the parse can't see through.
+BLOCK_RULES = shparse.RuleSet([
+    ("rm -rf /", ("rm",), lambda s: s.has_flag("r", "R", "recursive")
+        and any(shparse.is_system_path(a) for a in s.operands)),
+    ("--no-preserve-root", None, lambda s: "no-preserve-root" in s.flags),
+    ("mkfs", None, lambda s: s.name.startswith("mkfs")),
+    # a function that calls itself
+    (":(){ :|:& };:", None, lambda s: s.func is not None and s.name == s.func),
+    ("dd if=/dev/zero of=/dev/sd", ("dd",), lambda s: any(
+        a.startswith("of=/dev/") and not shparse.is_harmless_sink(a[3:]) for a in s.args)),
+    ("shutdown", ("shutdown", "poweroff", "halt"), lambda s: True),
+    ("reboot", ("reboot",), lambda s: True),
+    ("cryptsetup", ("cryptsetup",), lambda s: True),
+    *shparse.SHARED_RULES,
+])
+BLOCKLIST = BLOCK_RULES.labels
+
+# Exec plain argv-only commands directly instead of through /bin/sh (see shparse.direct_argv)
+DIRECT_EXEC = os.getenv("LINOPS_DIRECT_EXEC", "1") != "0"
+
+
+def _screen(cmd: str) -> Tuple[Optional[str], Optional[str]]:
+    """(rule, reason) for a refused command, else (None, None). `rule` is the metrics label:
+    a BLOCK_RULES label or "parse_error", never command text."""
+    parsed = shparse.parse((cmd or "").strip())
+    if parsed.error:
+        return "parse_error", f"unparseable command: {parsed.error}"
+    label = BLOCK_RULES.first_hit(parsed)
+    if label:
+        return label, f"blocked token: {label}"
+    return None, None
 
 
 def is_safe_command(cmd: str) -> Tuple[bool, Optional[str]]:
     """
-    Decide if a command is obviously unsafe based on BLOCKLIST.
+    Decide if a command is obviously unsafe based on BLOCK_RULES.
     Returns (ok, reason).
       - ok=True: command passes this basic screen
       - ok=False: refused, and 'reason' describes why
     NOTE: This is a *first line* of defense. We'll add allowlists/policies later.
     """
-    low = (cmd or "").lower().strip()
-    for bad in BLOCKLIST:
-        if bad in low:
-            return False, f"blocked token: {bad}"
-    return True, None
+    _, reason = _screen(cmd)
+    return reason is None, reason
 
 
 def run_shell_safe(cmd: str, dry_run: bool = True, timeout: int = 60, cwd: str | None = None):
@@ -35,16 +59,19 @@ def run_shell_safe(cmd: str, dry_run: bool = True, timeout: int = 60, cwd: str |
     Execute a shell command in a safety-first, auditable way.
 
     Behaviors:
-      - If the command hits BLOCKLIST => REFUSE and audit an event {event:'refusal', ...}
+      - If the command hits BLOCK_RULES => REFUSE and audit an event {event:'refusal', ...}
       - If dry_run=True (default)     => DON'T execute; audit {event:'shell_dry_run', ...}
       - Else                          => Execute via subprocess, capture output, audit {event:'shell_exec', ...}
+                                         (with timed_out and the child's rusage)
+                                         (commands without shell syntax skip /bin/sh: argv exec)
 
     Returns a small dict describing the result. We keep it simple + JSON-serializable.
     """
-    ok, reason = is_safe_command(cmd)
-    if not ok:
+    rule, reason = _screen(cmd)
+    if reason:
         # 2) Refusal path
         audit_log(event="refusal", cmd=cmd, reason=reason)
+        metrics.REFUSALS.labels(rule=rule).inc()
         return {"ok": False, "refused": True, "reason": reason, "cmd": cmd}
 
     if dry_run:
@@ -53,22 +80,26 @@ def run_shell_safe(cmd: str, dry_run: bool = True, timeout: int = 60, cwd: str |
         return {"ok": True, "dry_run": True, "cmd": cmd}
 
     # 4) Real execution path
-    proc = subprocess.run(
-        cmd,
-        shell=True,
-        capture_output=True,
-        text=True,
-        cwd=cwd,
-        timeout=timeout
-    )
+    metrics.SPAWNS.labels(runner="run_shell_safe").inc()
+    argv = shparse.direct_argv(cmd) if DIRECT_EXEC else None
+    with trace.span("shell", cmd=cmd, direct=argv is not None) as sp:
+        # same as subprocess.run(shell=True, capture_output=True, text=True), under the
+        # LINOPS_CMD_* budget (own process group, killed at `timeout`); via the spawn server
+        # when LINOPS_SPAWN_SERVER=1
+        proc = spawnsrv.run(argv or ["/bin/sh", "-c", cmd], cwd=cwd,
+                            budget=spawnsrv.default_budget(wall_s=timeout))
+        sp.set(rc=proc.returncode, timed_out=proc.timed_out)
     out = {
-        "ok": proc.returncode == 0,
+        "ok": proc.returncode == 0 and not proc.timed_out,
         "rc": proc.returncode,
-        # We "tail" the outputs so logs stay readable
-        "stdout": (proc.stdout or "")[-2000:],
-        "stderr": (proc.stderr or "")[-2000:],
+        "timed_out": proc.timed_out,
+        # Redact before tailing (so a cut can't expose half a token), then "tail" for readability
+        "stdout": redact(proc.stdout or "")[-2000:],
+        "stderr": redact(proc.stderr or "")[-2000:],
         "cmd": cmd,
+        "rusage": proc.rusage,
     }
+    trace.attach(out, sp)
     # 5) Always audit real executions
     audit_log(event="shell_exec", **out)
     return out
@@ -0,0 +1,817 @@
+# Shell command parser for safety screening: tokenize a command line once, reuse it everywhere.
+#
+# parse(cmd) splits a command into simple commands ("segments") the way bash would for the
+# constructs agents actually emit:
+#   - quoting ('...', "...", backslash), comments, heredoc bodies
+#   - lists and pipelines (| |& && || ; & newline), subshells ( ) and groups { }
+#   - command substitution $( ), backticks and <( ) >( ), parsed as nested commands
+#   - redirections ([n]> >> < &> &>> >| >& <<< <<)
+#   - function definitions (so a self-calling body, i.e. a fork bomb, is visible)
+# Leading VAR=value assignments, keywords (if/then/do/!/{ ...) and wrapper commands (sudo, env,
+# nohup, timeout, xargs, busybox, ...) are peeled off, and the scripts other commands run
+# (`sh -c '...'`, `eval`, `su -c`, `watch`, `ssh host ...`) are parsed too, so a segment's `name`
+# is the program that actually runs. Words are not expanded ($VAR stays literal), which is why
+# SHARED_RULES refuses what the parse can't see: a command name that is itself an expansion, a
+# shell or at(1) reading its script from stdin, or an awk/sed/python -c script that runs commands.
+#
+# Results are cached by command text: the same LLM-proposed command is screened by the planner,
+# the dry run and the real run, and parsing it once is cheaper than re-scanning the string per rule.
+
+import os
+import re
+import shutil
+from dataclasses import dataclass, field
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+# Commands that only read (best-effort heuristic). sed and awk count only while their script
+# neither writes a file nor runs a command (see _embedded_effects); `sed -i` never does.
+READONLY_BIN = frozenset((
+    "cat", "grep", "egrep", "zgrep", "head", "tail", "sed", "awk", "cut",
+    "wc", "ls", "stat", "df", "du", "uname", "whoami", "id",
+    "ps", "top", "free", "uptime", "date", "hostname", "env", "printenv",
+))
+
+# Redirect targets that are not files on disk
+HARMLESS_SINKS = ("/dev/null", "/dev/stdout", "/dev/stderr", "/dev/tty", "/dev/fd/")
+
+# wrapper -> its options that take a separate value (everything else is a flag)
+WRAPPERS: Dict[str, FrozenSet[str]] = {
+    "sudo": frozenset(("-u", "-g", "-C", "-D", "-h", "-p", "-r", "-t", "-U")),
+    "doas": frozenset(("-u", "-C")),
+    "env": frozenset(("-u", "-C", "-S", "--unset", "--chdir")),
+    "nohup": frozenset(),
+    "setsid": frozenset(),
+    "nice": frozenset(("-n", "--adjustment")),
+    "ionice": frozenset(("-c", "-n", "-p", "-P", "-u", "--class", "--classdata")),
+    "timeout": frozenset(("-s", "-k", "--signal", "--kill-after")),
+    "stdbuf": frozenset(("-i", "-o", "-e")),
+    "xargs": frozenset(("-I", "-L", "-n", "-P", "-s", "-d", "-E", "-a", "--max-args",
+                        "--max-procs", "--delimiter", "--arg-file")),
+    "time": frozenset(("-f", "-o", "--format", "--output")),
+    "command": frozenset(),
+    "builtin": frozenset(),
+    "exec": frozenset(("-a",)),
+    "chroot": frozenset(("--userspec", "--groups")),
+    "busybox": frozenset(),
+    "nsenter": frozenset(("-t", "--target", "-S", "--setuid", "-G", "--setgid")),
+    "unshare": frozenset(),
+    "chrt": frozenset(),
+    "taskset": frozenset(),
+    "flock": frozenset(("-w", "--timeout", "-E", "--conflict-exit-code")),
+}
+# wrappers with a positional argument before the command
+_WRAPPER_POSITIONALS = {"timeout": 1, "chroot": 1, "chrt": 1, "taskset": 1, "flock": 1}
+
+SHELLS = frozenset(("sh", "bash", "dash", "zsh", "ksh", "ash", "su", "runuser"))
+# commands that hand the rest of their argv to a shell as one script: command -> its options
+# that take a separate value, plus how many positionals (host, ...) come before the script
+SCRIPT_RUNNERS: Dict[str, Tuple[FrozenSet[str], int]] = {
+    "watch": (frozenset(("-n", "--interval", "-q", "--equexit")), 0),
+    "ssh": (frozenset(("-B", "-b", "-c", "-D", "-E", "-e", "-F", "-I", "-i", "-J", "-L", "-l",
+                       "-m", "-O", "-o", "-p", "-Q", "-R", "-S", "-W", "-w")), 1),
+}
+KEYWORDS = frozenset(("!", "{", "}", "if", "then", "elif", "else", "fi", "do", "done", "while",
+                      "until", "esac"))
+_HEADERS = frozenset(("for", "select", "case", "function"))  # no command runs from these words
+
+# longest first so '>>' wins over '>'
+_OPS = ("&>>", "<<<", "<<-", "&&", "||", "|&", ";;", "&>", ">>", ">&", ">|", "<<", "<&", "<>",
+        "|", "&", ";", "(", ")", ">", "<", "\n")
+_REDIRECTS = frozenset(("&>>", "<<<", "<<-", "&>", ">>", ">&", ">|", "<<", "<&", "<>", ">", "<"))
+_WRITE_REDIRECTS = frozenset(("&>>", "&>", ">>", ">&", ">|", "<>", ">"))
+_SEPARATORS = frozenset(("&&", "||", "|&", ";;", "|", "&", ";", "\n"))
+_META = " \t\n;&|()<>"
+_OPS_BY_CHAR = {c: tuple(o for o in _OPS if o[0] == c) for c in {o[0] for o in _OPS}}
+_PLAIN = re.compile(r"[^ \t\n;&|()<>'\"\\$`]+|\$")
+
+CACHE_MAX = 4096
+
+
+@dataclass(frozen=True)
+class Redirect:
+    op: str                     # e.g. ">", ">>", "2>", "&>", "<"
+    target: str                 # path (quotes removed), fd number, or heredoc delimiter
+
+    @property
+    def writes_file(self) -> bool:
+        op = self.op.lstrip("0123456789")
+        if op not in _WRITE_REDIRECTS:
+            return False
+        # >&2 / 2>&1 / >&- duplicate descriptors, they don't open files
+        return not (op == ">&" and (self.target.isdigit() or self.target == "-"))
+
+
+@dataclass(frozen=True)
+class Segment:
+    argv: Tuple[str, ...]       # effective argv: assignments, keywords and wrappers removed
+    redirects: Tuple[Redirect, ...] = ()
+    wrappers: Tuple[str, ...] = ()
+    func: Optional[str] = None  # name of the shell function whose body this is in
+    piped: bool = False         # stdin is the previous command of a pipeline
+    # derived once here so rules evaluated against a cached parse are plain attribute reads
+    name: str = field(init=False)
+    args: Tuple[str, ...] = field(init=False)
+    flags: FrozenSet[str] = field(init=False)      # short ("-rf" -> r, f) and long flag names
+    operands: Tuple[str, ...] = field(init=False)  # non-option arguments
+    write_targets: Tuple[str, ...] = field(init=False)
+    spawns: bool = field(init=False)  # an awk/sed/interpreter script it runs starts other programs
+    readonly: bool = field(init=False)
+
+    def __post_init__(self) -> None:
+        name = os.path.basename(self.argv[0]) if self.argv else ""
+        args = self.argv[1:]
+        flags: set = set()
+        operands: List[str] = []
+        opts_done = False
+        for a in args:
+            if opts_done or a == "-" or not a.startswith("-"):
+                operands.append(a)
+            elif a == "--":
+                opts_done = True
+            elif a.startswith("--"):
+                flags.add(a[2:].split("=", 1)[0])
+            else:
+                flags.update(a[1:])
+        targets = [r.target for r in self.redirects if r.writes_file]
+        if name == "tee":
+            targets.extend(operands)
+        spawns, script_targets = _embedded_effects(name, args, flags)
+        targets.extend(script_targets)
+        readonly = (name in READONLY_BIN and not spawns
+                    and not {"sudo", "doas"} & set(self.wrappers)
+                    and not (name == "sed" and flags & {"i", "in-place"})
+                    and all(is_harmless_sink(t) for t in targets))
+        for k, v in (("name", name), ("args", args), ("flags", frozenset(flags)),
+                     ("operands", tuple(operands)), ("write_targets", tuple(targets)),
+                     ("spawns", spawns), ("readonly", readonly)):
+            object.__setattr__(self, k, v)
+
+    def has_flag(self, *flags: str) -> bool:
+        """True if any short ("r") or long ("recursive") flag is set; short ones may be bundled."""
+        return any(f in self.flags for f in flags)
+
+
+# --- embedded scripts --------------------------------------------------------------
+# awk, sed and interpreters run programs of their own: `awk 'BEGIN{system("reboot")}'`,
+# `sed -n '1e reboot'`, `sed 'w /etc/x'`, `python3 -c 'os.system(...)'`. We don't parse those
+# languages, only look for the constructs that run commands or open files for writing.
+AWKS = frozenset(("awk", "gawk", "mawk", "nawk", "busybox-awk"))
+# interpreter name pattern -> flags whose value is inline code
+_INTERPRETERS = (
+    (re.compile(r"(?:python|pypy)[0-9.]*$"), frozenset("c")),
+    (re.compile(r"perl[0-9.]*$"), frozenset("eE")),
+    (re.compile(r"ruby[0-9.]*$"), frozenset("e")),
+    (re.compile(r"node(?:js)?$"), frozenset(("e", "p", "eval", "print"))),
+    (re.compile(r"php[0-9.]*$"), frozenset("r")),
+    (re.compile(r"lua[0-9.]*$"), frozenset("e")),
+)
+# process-starting calls across those languages (and shell-outs like `...`, qx//, %x())
+_SPAWN_CALL = re.compile(
+    r"\b(?:system|popen\w*|spawn\w*|exec\w*|fork|subprocess|check_output|check_call|getoutput|"
+    r"getstatusoutput|child_process|shell_exec|passthru|proc_open|qx)\b|`|%x[({\[]"
+    r"|\bopen\s*\([^)]*\|")
+_AWK_SPAWN = re.compile(r"\bsystem\s*\(|\|\s*getline|\bprintf?\b[^;}\n]*\|")
+_AWK_WRITE = re.compile(r"\bprintf?\b[^;}\n]*?>>?\s*(\"[^\"]*\"|[^;}\s]+)")
+
+
+def _embedded_effects(name: str, args: Tuple[str, ...], flags: set) -> Tuple[bool, List[str]]:
+    """(starts other programs, files written) for the script an awk/sed/interpreter call runs."""
+    if name in AWKS:
+        program = _awk_program(args)
+        if program is None:
+            return False, []
+        targets = [m.group(1).strip('"') for m in _AWK_WRITE.finditer(program)]
+        return bool(_AWK_SPAWN.search(program)), targets
+    if name == "sed":
+        spawns, targets = False, []
+        for script in _sed_scripts(args):
+            sp, tg = _sed_effects(script)
+            spawns, targets = spawns or sp, targets + tg
+        return spawns, targets
+    for pattern, inline in _INTERPRETERS:
+        if pattern.match(name):
+            return bool(inline & flags) and bool(_SPAWN_CALL.search(" ".join(args))), []
+    return False, []
+
+
+def _awk_program(args: Tuple[str, ...]) -> Optional[str]:
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == "--":
+            return args[i + 1] if i + 1 < len(args) else None
+        if a in ("-f", "--file") or a.startswith("--file="):
+            return None  # program in a file: not visible here
+        if a in ("-F", "-v", "--field-separator", "--assign"):
+            i += 2
+            continue
+        if not a.startswith("-") or a == "-":
+            return a
+        i += 1
+    return None
+
+
+def _sed_scripts(args: Tuple[str, ...]) -> List[str]:
+    """The -e/--expression scripts, else the first operand; none for -f (script in a file)."""
+    scripts: List[str] = []
+    operands: List[str] = []
+    from_file = False
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == "--":
+            operands.extend(args[i + 1:])
+            break
+        if a.startswith("--expression="):
+            scripts.append(a.split("=", 1)[1])
+        elif a in ("--expression", "--file", "--line-length"):
+            if a == "--expression":
+                scripts.extend(args[i + 1:i + 2])
+            from_file = from_file or a == "--file"
+            i += 1
+        elif a.startswith("--file="):
+            from_file = True
+        elif a.startswith("-") and not a.startswith("--") and a != "-":
+            for k, c in enumerate(a[1:], 1):
+                if c in "efl":  # options with a value: -e SCRIPT, -f FILE, -l N (or glued on)
+                    value = a[k + 1:]
+                    if not value:
+                        value = args[i + 1] if i + 1 < len(args) else ""
+                        i += 1
+                    if c == "e":
+                        scripts.append(value)
+                    from_file = from_file or c == "f"
+                    break
+        elif not a.startswith("-") or a == "-":
+            operands.append(a)
+        i += 1
+    if not scripts and operands and not from_file:
+        scripts.append(operands[0])
+    return scripts
+
+
+def _sed_effects(script: str) -> Tuple[bool, List[str]]:
+    """Scan a sed script's commands: `e` and `s///e` run commands, `w FILE`/`s///w FILE` write."""
+    spawns, targets = False, []
+    i, n = 0, len(script)
+
+    def eol(j: int) -> int:
+        k = script.find("\n", j)
+        return n if k < 0 else k
+
+    def skip_delimited(j: int, delim: str) -> int:
+        while j < n and script[j] != delim:
+            j += 2 if script[j] == "\\" else 1
+        return j + 1
+
+    while i < n:
+        c = script[i]
+        if c in " \t\n;{}!,":
+            i += 1
+            continue
+        if c.isdigit() or c in "$~+":
+            i += 1
+            continue
+        if c == "/":
+            i = skip_delimited(i + 1, "/")
+            continue
+        if c == "\\" and i + 1 < n:
+            i = skip_delimited(i + 2, script[i + 1])
+            continue
+        if c == "e":
+            return True, targets
+        if c in "wW":
+            targets.append(script[i + 1:eol(i)].strip())
+            i = eol(i)
+        elif c in "sy" and i + 1 < n:
+            delim = script[i + 1]
+            i = skip_delimited(skip_delimited(i + 2, delim), delim)
+            if c == "s":
+                j = i
+                while j < n and script[j] not in ";\n}":
+                    if script[j] == "e":
+                        spawns = True
+                    if script[j] == "w":
+                        targets.append(script[j + 1:eol(j)].strip())
+                        j = eol(j)
+                        break
+                    j += 1
+                i = j
+        elif c in "aicrRbtTqQlLvF:#":
+            # text, file names and labels run to the end of the line (b/t/: also stop at ';')
+            i = eol(i) if c in "aicrR#" else min(eol(i), (script.find(";", i) + 1) or n)
+        else:
+            i += 1
+    return spawns, targets
+
+
+@dataclass(frozen=True)
+class Parsed:
+    text: str
+    segments: Tuple[Segment, ...]
+    error: Optional[str] = None  # set when bash itself would reject the line (unterminated quote)
+    exec_argv: Optional[Tuple[str, ...]] = None  # set when no shell feature is needed (direct_argv)
+    write_targets: Tuple[str, ...] = field(init=False)
+    readonly: bool = field(init=False)  # every command is a read-only binary, no file is written
+
+    def __post_init__(self) -> None:
+        cmds = [s for s in self.segments if s.argv]
+        object.__setattr__(self, "write_targets",
+                           tuple(t for s in self.segments for t in s.write_targets))
+        object.__setattr__(self, "readonly", self.error is None and bool(cmds)
+                           and all(s.readonly for s in cmds))
+
+
+def is_harmless_sink(path: str) -> bool:
+    return any(path == p or (p.endswith("/") and path.startswith(p)) for p in HARMLESS_SINKS)
+
+
+def is_root_level(path: str) -> bool:
+    """'/', '/*', '/etc', '/usr/' ...: a path at most one level below the root."""
+    p = path.rstrip("/")
+    return path.startswith("/") and p.count("/") <= 1
+
+
+def is_system_path(path: str) -> bool:
+    """Any absolute or ~ path ('/usr/lib', '/var/lib/mysql', '~/x'), as opposed to cwd-relative."""
+    return path.startswith(("/", "~"))
+
+
+# Characters that make bash expand a word (parameters, substitutions, globs, braces)
+_EXPANSIONS = frozenset("$`*?[{")
+POWER_VERBS = frozenset(("reboot", "poweroff", "halt", "kexec", "soft-reboot"))
+
+
+def name_is_expansion(seg: Segment) -> bool:
+    """`$(echo reboot)`, `$CMD -f`, `/sbin/re*`: the program is only known after expansion."""
+    return (bool(seg.argv) and seg.argv[0] not in ("[", "[[")
+            and any(c in _EXPANSIONS for c in seg.argv[0]))
+
+
+def reads_script_from_stdin(seg: Segment) -> bool:
+    """`echo reboot | sh`, `sh <<< reboot`, `bash <<EOF`: a shell whose script we can't see."""
+    if seg.name not in SHELLS or _inline_script(seg) is not None:
+        return False
+    if (seg.name in ("sh", "bash", "dash", "zsh", "ksh", "ash") and seg.operands
+            and "s" not in seg.flags):
+        return False  # `bash script.sh` runs a file
+    return seg.piped or any(r.op in ("<<<", "<<", "<<-") for r in seg.redirects)
+
+
+def at_reads_stdin(seg: Segment) -> bool:
+    """`echo reboot | at now`, `at now <<< ...`: at/batch queue whatever arrives on stdin."""
+    return "f" not in seg.flags and "file" not in seg.flags and (
+        seg.piped or any(r.op in ("<<<", "<<", "<<-", "<") for r in seg.redirects))
+
+
+def is_power_action(seg: Segment) -> bool:
+    """`systemctl reboot`, `loginctl poweroff`, `systemctl start halt.target` ..."""
+    return any(a in POWER_VERBS or a.rsplit(".", 1)[0] in POWER_VERBS for a in seg.operands)
+
+
+# --- rules ---------------------------------------------------------------------------
+# (label, command names the rule applies to or None for any command, test on the segment)
+Rule = Tuple[str, Optional[Tuple[str, ...]], Callable[[Segment], bool]]
+
+
+class RuleSet:
+    """
+    Block rules indexed by command name: each segment only runs the rules that can match it.
+    Verdicts are memoized per command text, like the parses they come from.
+    """
+
+    def __init__(self, rules: Sequence[Rule]):
+        self.rules = list(rules)
+        generic = [(i, label, test) for i, (label, names, test) in enumerate(self.rules)
+                   if names is None]
+        self._any = [(label, test) for _, label, test in generic]
+        by_name: Dict[str, List[Tuple[int, str, Callable[[Segment], bool]]]] = {}
+        for i, (label, names, test) in enumerate(self.rules):
+            for n in names or ():
+                by_name.setdefault(n, list(generic)).append((i, label, test))
+        # keep declaration order so the reported label doesn't depend on the index
+        self._by_name = {n: [(label, test) for _, label, test in sorted(v, key=lambda r: r[0])]
+                         for n, v in by_name.items()}
+        self._memo: Dict[str, Optional[str]] = {}
+
+    @property
+    def labels(self) -> List[str]:
+        return [label for label, _, _ in self.rules]
+
+    def first_hit(self, parsed: Parsed) -> Optional[str]:
+        """Label of the first rule any command trips, else None (read-only ones are checked too)."""
+        try:
+            return self._memo[parsed.text]
+        except KeyError:
+            pass
+        hit = None
+        for seg in parsed.segments:
+            rules = self._by_name.get(seg.name, self._any)
+            hit = next((label for label, test in rules if test(seg)), None)
+            if hit:
+                break
+        if len(self._memo) >= CACHE_MAX:
+            self._memo.clear()
+        self._memo[parsed.text] = hit
+        return hit
+
+
+# Rules both safety screens (utils/shell.py, runbooks/ops.py) start from
+SHARED_RULES: List[Rule] = [
+    ("command from expansion", None, name_is_expansion),
+    ("shell script from stdin", tuple(SHELLS), reads_script_from_stdin),
+    ("at job from stdin", ("at", "batch"), at_reads_stdin),
+    ("embedded command", None, lambda s: s.spawns),  # awk system(), sed e, python -c os.system
+    ("systemctl reboot", ("systemctl", "loginctl"), is_power_action),
+]
+
+
+# --- lexer ------------------------------------------------------------------------
+class ParseError(ValueError):
+    pass
+
+
+def _scan_quoted(s: str, i: int, quote: str) -> int:
+    """Index just past the closing quote of a quoted span starting at s[i] == quote."""
+    j = i + 1
+    while j < len(s):
+        c = s[j]
+        if c == quote:
+            return j + 1
+        if c == "\\" and quote == '"':
+            j += 2
+            continue
+        j += 1
+    raise ParseError("unterminated quote")
+
+
+def _scan_parens(s: str, i: int) -> int:
+    """s[i] == '(': index just past the matching ')', skipping quoted text."""
+    depth, j = 0, i
+    while j < len(s):
+        c = s[j]
+        if c in "'\"":
+            j = _scan_quoted(s, j, c)
+            continue
+        if c == "\\":
+            j += 2
+            continue
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if depth == 0:
+                return j + 1
+        j += 1
+    raise ParseError("unterminated substitution")
+
+
+def _match_op(s: str, i: int) -> Optional[str]:
+    for o in _OPS_BY_CHAR.get(s[i], ()):
+        if s.startswith(o, i):
+            return o
+    return None
+
+
+def _lex(s: str) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """Tokens [("w", word) | ("op", op)] plus nested command texts from substitutions."""
+    toks: List[Tuple[str, str]] = []
+    nested: List[str] = []
+    heredocs: List[Tuple[str, bool]] = []
+    i, n = 0, len(s)
+    while i < n:
+        c = s[i]
+        if c in " \t":
+            i += 1
+            continue
+        if c == "#":
+            while i < n and s[i] != "\n":
+                i += 1
+            continue
+        if c in "<>" and i + 1 < n and s[i + 1] == "(":  # process substitution is a word
+            end = _scan_parens(s, i + 1)
+            nested.append(s[i + 2:end - 1])
+            toks.append(("w", s[i:end]))
+            i = end
+            continue
+        op = _match_op(s, i) if c in _META else None
+        if op is not None:
+            toks.append(("op", op))
+            i += len(op)
+            if op == "\n" and heredocs:
+                i = _skip_heredocs(s, i, heredocs)
+            continue
+        # a word: runs until unquoted whitespace/metacharacter
+        buf: List[str] = []
+        quoted = False
+        while i < n and s[i] not in _META:
+            c = s[i]
+            if c == "'":
+                j = _scan_quoted(s, i, "'")
+                buf.append(s[i + 1:j - 1])
+                quoted, i = True, j
+            elif c == '"':
+                j = _scan_quoted(s, i, '"')
+                inner = s[i + 1:j - 1]
+                _nested_in_dq(inner, nested)
+                buf.append(_unescape_dq(inner))
+                quoted, i = True, j
+            elif c == "\\":
+                if i + 1 < n and s[i + 1] != "\n":
+                    buf.append(s[i + 1])
+                i += 2
+            elif c == "$" and i + 1 < n and s[i + 1] == "(":
+                end = _scan_parens(s, i + 1)
+                if not s.startswith("((", i + 1):  # $(( )) is arithmetic, not a command
+                    nested.append(s[i + 2:end - 1])
+                buf.append(s[i:end])
+                i = end
+            elif c == "`":
+                j = s.find("`", i + 1)
+                if j < 0:
+                    raise ParseError("unterminated backquote")
+                nested.append(s[i + 1:j])
+                buf.append(s[i:j + 1])
+                i = j + 1
+            else:
+                m = _PLAIN.match(s, i)  # the common case: a run of ordinary characters
+                buf.append(m.group())
+                i = m.end()
+        word = "".join(buf)
+        # "2>", "10>>": an unquoted all-digit word glued to a redirect is its fd number
+        if not quoted and word.isdigit() and i < n and s[i] in "<>":
+            op = _match_op(s, i)
+            toks.append(("op", word + op))
+            i += len(op)
+            continue
+        toks.append(("w", word))
+        if toks[-2:-1] and toks[-2][0] == "op" and toks[-2][1] in ("<<", "<<-"):
+            heredocs.append((word, toks[-2][1] == "<<-"))
+    return toks, nested
+
+
+def _skip_heredocs(s: str, i: int, pending: List[Tuple[str, bool]]) -> int:
+    """Skip heredoc bodies that start at s[i] (after the newline ending their command line)."""
+    while pending:
+        delim, strip_tabs = pending.pop(0)
+        while i < len(s):
+            end = s.find("\n", i)
+            line = s[i:] if end < 0 else s[i:end]
+            i = len(s) if end < 0 else end + 1
+            if (line.lstrip("\t") if strip_tabs else line) == delim:
+                break
+    return i
+
+
+def _unescape_dq(inner: str) -> str:
+    out: List[str] = []
+    i = 0
+    while i < len(inner):
+        c = inner[i]
+        if c == "\\" and i + 1 < len(inner) and inner[i + 1] in '$`"\\\n':
+            if inner[i + 1] != "\n":
+                out.append(inner[i + 1])
+            i += 2
+            continue
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+
+def _nested_in_dq(inner: str, nested: List[str]) -> None:
+    """Command substitutions still run inside double quotes."""
+    i = 0
+    while i < len(inner):
+        if inner[i] == "\\":
+            i += 2
+        elif inner.startswith("$(", i):
+            end = _scan_parens(inner, i + 1)
+            if not inner.startswith("((", i + 1):
+                nested.append(inner[i + 2:end - 1])
+            i = end
+        elif inner[i] == "`":
+            j = inner.find("`", i + 1)
+            if j < 0:
+                raise ParseError("unterminated backquote")
+            nested.append(inner[i + 1:j])
+            i = j + 1
+        else:
+            i += 1
+
+
+# --- segments ----------------------------------------------------------------------
+def _is_assignment(word: str) -> bool:
+    name, eq, _ = word.partition("=")
+    return bool(eq) and name.replace("_", "a").isalnum() and not name[0].isdigit()
+
+
+def _unwrap(argv: List[str]) -> Tuple[List[str], List[str]]:
+    """Strip assignments, keywords and wrapper commands; returns (argv, wrappers)."""
+    wrappers: List[str] = []
+    i = 0
+    while i < len(argv):
+        w = argv[i]
+        if _is_assignment(w) or w in KEYWORDS:
+            i += 1
+            continue
+        base = os.path.basename(w)
+        if base not in WRAPPERS:
+            break
+        wrappers.append(base)
+        takes_value = WRAPPERS[base]
+        i += 1
+        while i < len(argv) and argv[i].startswith("-") and argv[i] != "-":
+            i += 2 if argv[i] in takes_value else 1
+        if base == "env":
+            while i < len(argv) and _is_assignment(argv[i]):
+                i += 1
+        i += _WRAPPER_POSITIONALS.get(base, 0)
+    return argv[i:], wrappers
+
+
+def _inline_script(seg: Segment) -> Optional[str]:
+    """The script text of `sh -c '...'`, `bash -lc ...`, `su -c ...`, `eval ...`, `watch ...` or
+    `ssh host ...`."""
+    if seg.name == "eval":
+        return " ".join(seg.args) or None
+    if seg.name in SCRIPT_RUNNERS:
+        takes_value, positionals = SCRIPT_RUNNERS[seg.name]
+        args = list(seg.args)
+        i = 0
+        while i < len(args) and args[i].startswith("-") and args[i] != "-":
+            if args[i] == "--":
+                i += 1
+                break
+            i += 2 if args[i] in takes_value else 1
+        return " ".join(args[i + positionals:]) or None
+    if seg.name not in SHELLS:
+        return None
+    args = seg.args
+    for k, a in enumerate(args):
+        if a.startswith("-") and not a.startswith("--") and "c" in a[1:]:
+            return args[k + 1] if k + 1 < len(args) else None
+        if a == "--command":
+            return args[k + 1] if k + 1 < len(args) else None
+    return None
+
+
+def _find_execs(seg: Segment) -> List[Segment]:
+    """The commands `find ... -exec CMD {} ;` runs, as segments of their own."""
+    if seg.name != "find":
+        return []
+    out: List[Segment] = []
+    args = seg.args
+    for k, a in enumerate(args):
+        if a in ("-exec", "-execdir", "-ok", "-okdir"):
+            end = next((j for j in range(k + 1, len(args)) if args[j] in (";", "+")), len(args))
+            if end > k + 1:
+                out.append(Segment(args[k + 1:end], (), ("find",), seg.func))
+    return out
+
+
+def _segments(toks: List[Tuple[str, str]]) -> List[Segment]:
+    segs: List[Segment] = []
+    words: List[str] = []
+    redirs: List[Redirect] = []
+    funcs: List[Tuple[str, int]] = []  # (function name, brace depth its body opened at)
+    braces = 0
+    piped = False
+
+    def flush() -> None:
+        nonlocal braces, piped
+        # braces at command position open/close groups, and with them function bodies
+        lead = 0
+        while lead < len(words) and words[lead] in ("{", "}"):
+            if words[lead] == "{":
+                braces += 1
+            else:
+                braces -= 1
+                while funcs and braces <= funcs[-1][1]:
+                    funcs.pop()
+            lead += 1
+        argv, wrappers = _unwrap(words[lead:])
+        if argv and argv[0] in _HEADERS:
+            argv = []
+        if argv or redirs:
+            func = funcs[-1][0] if funcs else None
+            seg = Segment(tuple(argv), tuple(redirs), tuple(wrappers), func, piped)
+            segs.append(seg)
+            piped = False
+            script = _inline_script(seg)
+            if script:
+                segs.extend(parse(script).segments)
+            segs.extend(_find_execs(seg))
+        words.clear()
+        redirs.clear()
+
+    k = 0
+    while k < len(toks):
+        kind, val = toks[k]
+        if kind == "w":
+            words.append(val)
+        elif val in _SEPARATORS or val == ")":
+            flush()
+            if val != ")":
+                piped = val in ("|", "|&")
+        elif val == "(":
+            # name() { ... }: a function definition, not a subshell
+            if len(words) == 1 and k + 1 < len(toks) and toks[k + 1] == ("op", ")"):
+                funcs.append((words[0], braces))
+                words.clear()
+                k += 2
+                continue
+            flush()
+        elif val.lstrip("0123456789") in _REDIRECTS:
+            target = toks[k + 1][1] if k + 1 < len(toks) and toks[k + 1][0] == "w" else ""
+            redirs.append(Redirect(val, target))
+            k += 2
+            continue
+        k += 1
+    flush()
+    return segs
+
+
+_CACHE: Dict[str, Parsed] = {}
+
+
+def _parse(cmd: str) -> Parsed:
+    try:
+        toks, nested = _lex(cmd)
+    except ParseError as e:
+        return Parsed(cmd, (), str(e))
+    segs = _segments(toks)
+    for inner in nested:
+        sub = parse(inner)
+        if sub.error:
+            return Parsed(cmd, tuple(segs), sub.error)
+        segs.extend(sub.segments)
+    argv = None
+    if toks and not _needs_shell(cmd):
+        argv = tuple(w for _, w in toks)
+        if (_is_assignment(argv[0]) or argv[0] in KEYWORDS or argv[0] in _HEADERS
+                or argv[0] in SHELL_ONLY):
+            argv = None
+    return Parsed(cmd, tuple(segs), exec_argv=argv)
+
+
+def parse(cmd: str) -> Parsed:
+    """Parsed form of a command line (cached by text)."""
+    hit = _CACHE.get(cmd)
+    if hit is not None:
+        return hit
+    parsed = _parse(cmd or "")
+    if len(_CACHE) >= CACHE_MAX:
+        try:
+            _CACHE.pop(next(iter(_CACHE)), None)  # oldest first
+        except (StopIteration, RuntimeError):
+            pass
+    _CACHE[cmd] = parsed
+    return parsed
+
+
+# --- direct exec -------------------------------------------------------------------
+# Most diagnostic commands (uptime, df -h /, pgrep -x nginx) are one program plus literal
+# arguments. Those can be exec'd from an argv list, skipping the shell (and, for `bash -lc`,
+# the login profile scripts) entirely; anything else still goes through bash.
+
+# Unquoted characters that mean bash would do something beyond splitting words: operators,
+# redirections, expansions (globs, $, ~, braces, history), comments and escapes.
+_SHELL_SPECIAL = frozenset(";&|<>()$`*?[]{}~!#\\\n")
+# Inside double quotes $ and ` still expand, and backslash escapes
+_DQ_SPECIAL = frozenset("$`\\")
+# Commands that exist as binaries on some systems but only mean something inside a shell
+SHELL_ONLY = frozenset(("cd", "command", "exec", "umask", "ulimit", "type", "hash", "read", "wait",
+                        "alias", "getopts", "jobs", "fg", "bg", "source", "."))
+
+
+def _needs_shell(cmd: str) -> bool:
+    quote = None
+    for c in cmd:
+        if quote == "'":
+            if c == "'":
+                quote = None
+        elif quote == '"':
+            if c == '"':
+                quote = None
+            elif c in _DQ_SPECIAL:
+                return True
+        elif c == "'" or c == '"':
+            quote = c
+        elif c in _SHELL_SPECIAL:
+            return True
+    return quote is not None
+
+
+def direct_argv(cmd: str, path: Optional[str] = None) -> Optional[List[str]]:
+    """
+    argv (executable resolved on `path`, default $PATH) to run `cmd` without a shell, or None
+    when it needs one: operators, redirections, expansions, assignments, builtins, or a
+    program that isn't on PATH (bash then reports "command not found" as usual).
+    """
+    argv = parse(cmd).exec_argv
+    if not argv:
+        return None
+    exe = argv[0] if "/" in argv[0] else shutil.which(argv[0], path=path)
+    if exe is None or not os.access(exe, os.X_OK):
+        return None
+    return [exe, *argv[1:]]
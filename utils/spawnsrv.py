@@ -0,0 +1,372 @@
+# Command spawning for the shell runners: resource budgets, rusage accounting, and an optional
+# pre-started spawn server.
+#
+# Every command run by utils.shell.run_shell_safe / modal_app.sh goes through run(argv, budget=...):
+#   - the child gets its own session (process group); past budget.wall_s the whole group gets
+#     SIGTERM, then SIGKILL after KILL_GRACE_S, so a hung apt-get or du can't outlive its budget
+#     or leave grandchildren behind
+#   - optional RLIMIT_CPU / RLIMIT_AS, nice and ionice: remediation must never be the thing that
+#     overloads a struggling host (defaults from LINOPS_CMD_* below)
+#   - the child is reaped with wait4, so each result carries its own CPU / max RSS / block I/O
+#
+# With LINOPS_SPAWN_SERVER=1 commands are handed to a helper started once per agent process.
+# The helper is a bare `python -S` running only this file (stdlib, no site-packages), so its
+# footprint stays a few MB however large the agent grows (LLM client, rich, caches). It spawns
+# children with posix_spawn, or fork when a budget sets limits in the child (cheap in a small
+# process, unlike forking the agent), and streams back rc plus output tails. Requests run
+# concurrently; replies are matched by id.
+#
+#   frame := u32 length | JSON      (both directions, little-endian length)
+#   request  {"id", "argv", "env", "cwd", "budget", "tail"}
+#   reply    {"id", "rc", "stdout", "stderr", "timed_out", "rusage"} | {"id", "error"}
+#
+# run() returns a subprocess.CompletedProcess (plus .timed_out and .rusage) either way, spawning
+# locally when the helper is disabled or unavailable. A timeout is a result (timed_out=True,
+# rc -15/-9), not an exception, and a missing program is rc 127 as a shell reports it.
+
+import dataclasses
+import json
+import os
+import resource
+import selectors
+import shutil
+import signal
+import struct
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+ENABLED = os.getenv("LINOPS_SPAWN_SERVER", "0") == "1"
+# bytes of each stream kept; callers redact then cut to their own (smaller) tail
+TAIL_BYTES = int(os.getenv("LINOPS_SPAWN_TAIL_BYTES", str(64 * 1024)))
+
+
+def _env_int(name: str) -> Optional[int]:
+    v = os.getenv(name, "").strip()
+    return int(v) if v else None
+
+
+# Default budget for every command; per-call values (e.g. run_shell_safe's timeout) win
+CMD_TIMEOUT_S = float(os.getenv("LINOPS_CMD_TIMEOUT_S", "600"))  # 0: no wall limit
+CMD_CPU_S = _env_int("LINOPS_CMD_CPU_S")          # RLIMIT_CPU seconds
+CMD_MEM_MB = _env_int("LINOPS_CMD_MEM_MB")        # RLIMIT_AS
+CMD_NICE = _env_int("LINOPS_CMD_NICE")            # niceness added in the child
+CMD_IONICE = os.getenv("LINOPS_CMD_IONICE") or None  # "class[:level]", e.g. "3" or "2:7"
+KILL_GRACE_S = 2.0     # SIGTERM -> SIGKILL
+CPU_HARD_GRACE_S = 5   # RLIMIT_CPU soft (SIGXCPU) -> hard (SIGKILL)
+
+_LEN = struct.Struct("<I")
+
+
+@dataclasses.dataclass(frozen=True)
+class Budget:
+    wall_s: Optional[float] = None   # then the process group is killed
+    cpu_s: Optional[int] = None
+    mem_mb: Optional[int] = None
+    nice: Optional[int] = None
+    ionice: Optional[str] = None
+
+    @property
+    def needs_preexec(self) -> bool:
+        return bool(self.cpu_s or self.mem_mb or self.nice)
+
+    def preexec(self) -> None:
+        """Runs in the child between fork and exec."""
+        if self.cpu_s:
+            resource.setrlimit(resource.RLIMIT_CPU, (self.cpu_s, self.cpu_s + CPU_HARD_GRACE_S))
+        if self.mem_mb:
+            limit = self.mem_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        if self.nice:
+            os.nice(self.nice)
+
+    def wrap(self, argv: List[str]) -> List[str]:
+        """argv behind `ionice` when an I/O class is set (as is where ionice isn't installed)."""
+        exe = shutil.which("ionice") if self.ionice else None
+        if exe is None:
+            return list(argv)
+        cls, _, level = self.ionice.partition(":")
+        return [exe, "-c", cls, *(["-n", level] if level else []), *argv]
+
+
+def default_budget(**overrides: Any) -> Budget:
+    """The LINOPS_CMD_* budget with any non-None overrides applied."""
+    b = Budget(wall_s=CMD_TIMEOUT_S or None, cpu_s=CMD_CPU_S, mem_mb=CMD_MEM_MB, nice=CMD_NICE,
+               ionice=CMD_IONICE)
+    return dataclasses.replace(b, **{k: v for k, v in overrides.items() if v is not None})
+
+
+class Completed(subprocess.CompletedProcess):
+    """CompletedProcess plus timed_out and the child's rusage."""
+
+    def __init__(self, args: List[str], rep: Dict[str, Any]):
+        super().__init__(args, rep["rc"], rep["stdout"], rep["stderr"])
+        self.timed_out: bool = rep.get("timed_out", False)
+        self.rusage: Dict[str, Any] = rep.get("rusage") or {}
+
+
+# --- spawning and reaping (both sides) -----------------------------------------------
+def _killpg(pid: int, sig: int) -> None:
+    try:
+        os.killpg(pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _usage(ru: Any, wall_s: float) -> Dict[str, Any]:
+    return {"wall_s": round(wall_s, 3), "cpu_user_s": round(ru.ru_utime, 3),
+            "cpu_sys_s": round(ru.ru_stime, 3), "max_rss_kb": ru.ru_maxrss,
+            "io_read_blocks": ru.ru_inblock, "io_write_blocks": ru.ru_oublock}
+
+
+def _wait(pid: int, out_fd: int, err_fd: int, wall_s: Optional[float], tail: int) -> Dict[str, Any]:
+    """Drain both pipes (last `tail` bytes each), enforce the wall budget, reap with wait4."""
+    t0 = time.monotonic()
+    deadline = t0 + wall_s if wall_s else None
+    signals = [signal.SIGTERM, signal.SIGKILL]
+    timed_out = False
+    bufs = {out_fd: bytearray(), err_fd: bytearray()}
+    reaped = None
+    with selectors.DefaultSelector() as sel:
+        for fd in bufs:
+            sel.register(fd, selectors.EVENT_READ)
+        while True:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                timed_out = True
+                if not signals:
+                    break  # group killed but something outside it holds the pipes: stop reading
+                _killpg(pid, signals.pop(0))
+                deadline = now + KILL_GRACE_S
+            if sel.get_map():
+                for key, _ in sel.select(None if deadline is None else max(0.0, deadline - now)):
+                    chunk = os.read(key.fd, 65536)
+                    if not chunk:
+                        sel.unregister(key.fd)
+                        continue
+                    buf = bufs[key.fd]
+                    buf += chunk
+                    if len(buf) > tail:
+                        del buf[:len(buf) - tail]
+                continue
+            # both pipes closed: the child is exiting, or it closed its output and kept running
+            if deadline is None:
+                break
+            wpid, status, ru = os.wait4(pid, os.WNOHANG)
+            if wpid:
+                reaped = (status, ru)
+                break
+            time.sleep(min(0.005, max(0.0, deadline - time.monotonic())))
+    status, ru = reaped or os.wait4(pid, 0)[1:]
+    return {"rc": os.waitstatus_to_exitcode(status), "timed_out": timed_out,
+            "stdout": bufs[out_fd].decode("utf-8", "replace"),
+            "stderr": bufs[err_fd].decode("utf-8", "replace"),
+            "rusage": _usage(ru, time.monotonic() - t0)}
+
+
+def _not_started(argv: List[str], e: OSError) -> Dict[str, Any]:
+    # what a shell would report for a missing/unrunnable program
+    return {"rc": 127 if isinstance(e, FileNotFoundError) else 126, "stdout": "",
+            "stderr": f"{argv[0]}: {e.strerror}\n", "timed_out": False, "rusage": {}}
+
+
+def _execute(argv: List[str], env: Optional[Dict[str, str]], cwd: Optional[str], budget: Budget,
+             tail: int, posix_spawn: bool = False) -> Dict[str, Any]:
+    argv = budget.wrap(argv)
+    if posix_spawn and not budget.needs_preexec and cwd is None:
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        try:
+            pid = os.posix_spawnp(
+                argv[0], argv, env if env is not None else os.environ,
+                file_actions=[(os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+                              (os.POSIX_SPAWN_DUP2, out_w, 1), (os.POSIX_SPAWN_DUP2, err_w, 2)],
+                setsid=True)
+        except OSError as e:
+            os.close(out_r)
+            os.close(err_r)
+            return _not_started(argv, e)
+        finally:
+            os.close(out_w)
+            os.close(err_w)
+        try:
+            return _wait(pid, out_r, err_r, budget.wall_s, tail)
+        finally:
+            os.close(out_r)
+            os.close(err_r)
+    # limits have to be set in the child, and posix_spawn has no portable chdir: fork
+    try:
+        p = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE, env=env, cwd=cwd, start_new_session=True,
+                             preexec_fn=budget.preexec if budget.needs_preexec else None)
+    except OSError as e:
+        return _not_started(argv, e)
+    try:
+        rep = _wait(p.pid, p.stdout.fileno(), p.stderr.fileno(), budget.wall_s, tail)
+    finally:
+        p.stdout.close()
+        p.stderr.close()
+    p.returncode = rep["rc"]  # already reaped by wait4
+    return rep
+
+
+# --- helper side -------------------------------------------------------------------
+def serve(rfd: int = 0, wfd: int = 1) -> None:
+    """Helper main loop: one thread per request, replies written whole under a lock."""
+    lock = threading.Lock()
+
+    def handle(req: Dict[str, Any]) -> None:
+        try:
+            res = _execute(req["argv"], req.get("env"), req.get("cwd"),
+                           Budget(**(req.get("budget") or {})),
+                           int(req.get("tail") or TAIL_BYTES), posix_spawn=True)
+            rep = {"id": req["id"], **res}
+        except Exception as e:  # report, never die
+            rep = {"id": req.get("id"), "error": repr(e)}
+        with lock:
+            _write_frame(wfd, rep)
+
+    while True:
+        req = _read_frame(rfd)
+        if req is None:
+            return  # agent went away
+        threading.Thread(target=handle, args=(req,), daemon=True).start()
+
+
+def _read_exact(fd: int, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = os.read(fd, n - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return bytes(buf)
+
+
+def _write_frame(fd: int, obj: Dict[str, Any]) -> None:
+    body = json.dumps(obj).encode("utf-8")
+    data = _LEN.pack(len(body)) + body
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def _read_frame(fd: int) -> Optional[Dict[str, Any]]:
+    head = _read_exact(fd, _LEN.size)
+    if len(head) < _LEN.size:
+        return None
+    return json.loads(_read_exact(fd, _LEN.unpack(head)[0]))
+
+
+# --- agent side --------------------------------------------------------------------
+class SpawnServer:
+    def __init__(self, python: str = sys.executable):
+        # -S: no site-packages, the helper needs only the stdlib
+        self.proc = subprocess.Popen([python, "-S", os.path.abspath(__file__), "--serve"],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        self.owner = os.getpid()
+        self._wlock = threading.Lock()
+        self._plock = threading.Lock()
+        self._pending: Dict[int, List[Any]] = {}  # id -> [Event, reply]
+        self._next = 0
+        self.alive = True
+        threading.Thread(target=self._reader, name="spawnsrv-reader", daemon=True).start()
+
+    def _reader(self) -> None:
+        fd = self.proc.stdout.fileno()
+        while True:
+            try:
+                rep = _read_frame(fd)
+            except (OSError, ValueError):
+                rep = None
+            if rep is None:
+                break
+            with self._plock:
+                slot = self._pending.pop(rep.get("id"), None)
+            if slot is not None:
+                slot[1] = rep
+                slot[0].set()
+        self.alive = False
+        with self._plock:  # wake everyone still waiting
+            for slot in self._pending.values():
+                slot[0].set()
+            self._pending.clear()
+
+    def run(self, argv: List[str], env: Optional[Dict[str, str]] = None, cwd: Optional[str] = None,
+            budget: Optional[Budget] = None, tail: int = TAIL_BYTES) -> Dict[str, Any]:
+        """
+        Reply dict for one command. Raises OSError only if the request never reached the helper
+        (so falling back can't run a command twice); a helper dying mid-command is an rc -1 reply.
+        """
+        slot: List[Any] = [threading.Event(), None]
+        with self._plock:
+            if not self.alive:
+                raise BrokenPipeError("spawn server exited")
+            self._next += 1
+            rid = self._next
+            self._pending[rid] = slot
+        # the helper's own environment is a snapshot from its start: always send ours
+        req = {"id": rid, "argv": list(argv), "env": dict(os.environ) if env is None else env,
+               "cwd": cwd, "budget": dataclasses.asdict(budget or Budget()), "tail": tail}
+        try:
+            with self._wlock:
+                _write_frame(self.proc.stdin.fileno(), req)
+        except OSError:
+            with self._plock:
+                self._pending.pop(rid, None)
+            raise
+        slot[0].wait()
+        rep = slot[1]
+        if rep is None or "error" in rep:
+            why = "spawn server exited" if rep is None else f"spawn server error: {rep['error']}"
+            return {"rc": -1, "stdout": "", "stderr": why + "\n", "timed_out": False, "rusage": {}}
+        return rep
+
+    def close(self) -> None:
+        self.alive = False
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+_SERVER: Optional[SpawnServer] = None
+_START_LOCK = threading.Lock()
+
+
+def start() -> SpawnServer:
+    """The process-wide helper, started on first use (and again after a fork or crash)."""
+    global _SERVER
+    with _START_LOCK:
+        if _SERVER is None or not _SERVER.alive or _SERVER.owner != os.getpid():
+            _SERVER = SpawnServer()
+        return _SERVER
+
+
+def stop() -> None:
+    global _SERVER
+    with _START_LOCK:
+        if _SERVER is not None and _SERVER.owner == os.getpid():
+            _SERVER.close()
+        _SERVER = None
+
+
+def run(argv: List[str], env: Optional[Dict[str, str]] = None, cwd: Optional[str] = None,
+        budget: Optional[Budget] = None) -> Completed:
+    """Run argv under `budget` (default_budget() if None), output captured as text."""
+    budget = budget or default_budget()
+    if ENABLED:
+        try:
+            return Completed(list(argv), start().run(argv, env=env, cwd=cwd, budget=budget))
+        except OSError:
+            pass  # helper unavailable: spawn it ourselves
+    return Completed(list(argv), _execute(list(argv), env, cwd, budget, TAIL_BYTES))
+
+
+if __name__ == "__main__" and sys.argv[1:] == ["--serve"]:
+    serve()
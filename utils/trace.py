@@ -0,0 +1,170 @@
+# Lightweight tracing: nested spans for plan -> steps -> shell commands -> remote calls.
+#
+# Enable with LINOPS_TRACE=1 (or trace.enable()). Each span records wall time and thread CPU
+# time, and knows its parent via a contextvar. When a root span closes, its whole trace is
+# appended as one OTLP/JSON "resourceSpans" line to LINOPS_TRACE_FILE (default:
+# <audit dir>/traces.jsonl), which OpenTelemetry collectors and viewers can ingest.
+# Disabled, span() returns a shared no-op object: one flag check, no clocks, no allocation.
+
+import contextvars
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from utils import serialize
+from utils.redact import redact
+
+SERVICE_NAME = "linops"
+
+_ENABLED = os.getenv("LINOPS_TRACE", "0").lower() in ("1", "true", "yes")
+_EXPORT_PATH = os.getenv("LINOPS_TRACE_FILE") or os.path.join(
+    os.environ.get("LINOPS_AUDIT_DIR", "audit"), "traces.jsonl")
+
+_CURRENT: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar(
+    "linops_span", default=None)
+_EXPORT_LOCK = threading.Lock()
+
+
+def enabled() -> bool:
+    return _ENABLED
+
+
+def enable(path: Optional[str] = None) -> None:
+    global _ENABLED, _EXPORT_PATH
+    _ENABLED = True
+    if path:
+        _EXPORT_PATH = path
+
+
+def disable() -> None:
+    global _ENABLED
+    _ENABLED = False
+
+
+def _otlp_value(v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": redact(str(v))}
+
+
+class Span:
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent", "root", "start_unix_ns",
+                 "end_unix_ns", "_t0", "_c0", "wall_ns", "cpu_ns", "error", "_token", "_finished")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.parent: Optional[Span] = _CURRENT.get()
+        self.root: Span = self.parent.root if self.parent else self
+        self.trace_id = self.parent.trace_id if self.parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.wall_ns = 0
+        self.cpu_ns = 0
+        self.error: Optional[str] = None
+        self._finished: List[Span] = []  # only used on the root
+
+    def __enter__(self) -> "Span":
+        self._token = _CURRENT.set(self)
+        self.start_unix_ns = time.time_ns()
+        self._c0 = time.thread_time_ns()
+        self._t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.wall_ns = time.perf_counter_ns() - self._t0
+        self.cpu_ns = time.thread_time_ns() - self._c0
+        self.end_unix_ns = self.start_unix_ns + self.wall_ns
+        if exc is not None:
+            self.error = repr(exc)
+        _CURRENT.reset(self._token)
+        self.root._finished.append(self)
+        if self.root is self:
+            _export(self._finished)
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def timing(self) -> Dict[str, float]:
+        return {"wall_ms": round(self.wall_ns / 1e6, 3), "cpu_ms": round(self.cpu_ns / 1e6, 3)}
+
+    def to_otlp(self) -> Dict[str, Any]:
+        out = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_unix_ns),
+            "endTimeUnixNano": str(self.end_unix_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attrs.items()]
+            + [{"key": "cpu_time_ns", "value": {"intValue": str(self.cpu_ns)}}],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent:
+            out["parentSpanId"] = self.parent.span_id
+        return out
+
+
+class _NoopSpan:
+    __slots__ = ()
+    trace_id = None
+    span_id = None
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def set(self, **attrs: Any) -> None:
+        return None
+
+    def timing(self) -> Dict[str, float]:
+        return {}
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attrs: Any):
+    """Context manager for one unit of work; a no-op unless tracing is enabled."""
+    if not _ENABLED:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def current() -> Optional[Span]:
+    return _CURRENT.get() if _ENABLED else None
+
+
+def attach(result: Any, sp: Any, key: str = "timing") -> Any:
+    """Add sp.timing() to a result dict (only when tracing produced one)."""
+    if isinstance(result, dict):
+        t = sp.timing()
+        if t:
+            result[key] = t
+    return result
+
+
+def _export(spans: List[Span]) -> None:
+    payload = {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "linops.trace"},
+                            "spans": [s.to_otlp() for s in spans]}],
+        }]
+    }
+    line = serialize.dumps_bytes(payload, newline=True)
+    try:
+        d = os.path.dirname(_EXPORT_PATH)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with _EXPORT_LOCK, open(_EXPORT_PATH, "ab") as f:
+            f.write(line)
+    except OSError:
+        pass  # tracing must never break the operation being traced